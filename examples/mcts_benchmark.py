@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+'''
+mcts_benchmark.py: Search throughput (UCT iterations per second) of MCTS on GridWorldMDP and TaxiOOMDP.
+
+Usage:
+    python mcts_benchmark.py --time_budget 2 --workers 1 4
+'''
+
+# Python imports.
+from __future__ import print_function
+import argparse
+import random
+import time
+import numpy as np
+
+# Other imports.
+import srl_example_setup
+from simple_rl.tasks import GridWorldMDP, TaxiOOMDP
+from simple_rl.planning import MCTS
+
+def make_mdps():
+    taxi_passengers = [{"x":4, "y":3, "dest_x":2, "dest_y":2, "in_taxi":0}]
+    return [GridWorldMDP(10, 10, goal_locs=[(10, 10)], slip_prob=0.1),
+            TaxiOOMDP(5, 5, agent={"x":1, "y":1, "has_passenger":0}, walls=[], passengers=taxi_passengers, slip_prob=0.1)]
+
+def benchmark(mdp, time_budget, num_workers, num_rollouts_per_step):
+    '''
+    Returns:
+        (float): Iterations per second of a search of @time_budget seconds from the initial state.
+        (str): The action the search picked.
+    '''
+    mcts = MCTS(mdp, time_budget=time_budget, num_workers=num_workers, num_rollouts_per_step=num_rollouts_per_step)
+    try:
+        if num_workers > 1:
+            # Starts the worker processes outside of the timed search.
+            mcts.time_budget = 0.01
+            mcts.search(mdp.get_init_state())
+            mcts.time_budget = time_budget
+            mcts.reset_tree()
+
+        start = time.time()
+        action_visits, _ = mcts.search(mdp.get_init_state())
+        duration = time.time() - start
+    finally:
+        mcts.close()
+    # Every iteration adds one visit to the root.
+    return action_visits.sum() / duration, mcts.actions[int(np.argmax(action_visits))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--time_budget", type=float, default=2., help="Seconds per search")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="Numbers of search processes to compare")
+    parser.add_argument("--rollouts", type=int, default=10, help="Rollouts per expanded node")
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    for mdp in make_mdps():
+        for num_workers in args.workers:
+            throughput, action = benchmark(mdp, args.time_budget, num_workers, args.rollouts)
+            print("{}\tworkers: {}\titerations/s: {:.0f}\taction: {}".format(mdp, num_workers, throughput, action))
+
+if __name__ == "__main__":
+    main()
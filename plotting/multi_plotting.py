@@ -1,4 +1,8 @@
+import sys
+sys.path = [""] + sys.path
+
 import argparse
+import os
 import pickle
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
@@ -8,10 +12,19 @@ import pandas as pd
 import seaborn as sns
 from pathlib import Path
 
+from simple_rl.agents.func_approx.dsc.RunLogClass import load_run_variable
+from simple_rl.agents.func_approx.dsc.ResultsIndexClass import load_indexed_runs
+
 sns.set(color_codes=True)
 sns.set_style("white")
 
+# Run logs already read, by data dir (runs saved with --episodic_saves)
+RUN_LOGS = {}
+
 def load_data(file_name):
+	if not os.path.exists(file_name):
+		data_dir, pkl_file = os.path.split(file_name)
+		return load_run_variable(data_dir, os.path.splitext(pkl_file)[0], RUN_LOGS)
 	with open(file_name, 'rb') as f:
 		data = pickle.load(f)
 	return data
@@ -33,10 +46,13 @@ def get_all_old_data(old_run_dir, start, end):
 def get_multi_cur_data(run_dirs, start, end, is_old=False):
 	multi_cur_data = {}
 	for i, run_dir in enumerate(run_dirs):
-		cur_scores = get_all_cur_runs(run_dir, start, end, 'per_episode_scores.pkl')
-		args = get_all_cur_runs(run_dir, start, end, 'args.pkl')
-		num_options_history = get_all_cur_runs(run_dir, start, end, 'num_options_history.pkl')
-		temporal_full_chain_breaks = get_all_cur_runs(run_dir, start, end, 'temporal_full_chain_breaks.pkl')
+		# Learning curves come from the results index (new or changed runs are ingested first), not from the runs' pickles
+		index, experiment, runs = load_indexed_runs(run_dir, start, end)
+		cur_scores = np.array(index.get_series(experiment, 'per_episode_scores', seeds=range(start, end+1)))
+		args = np.array([run['args'] for run in runs])
+		num_options_history = np.array(index.get_series(experiment, 'num_options_history', seeds=range(start, end+1)))
+		temporal_full_chain_breaks = np.array([temporal for temporal, _ in index.get_chain_breaks(experiment, seeds=range(start, end+1))])
+		index.close()
 		
 		if is_old:
 			label = 'all_cur_old_data_{}'.format(i)
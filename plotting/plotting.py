@@ -1,4 +1,8 @@
+import sys
+sys.path = [""] + sys.path
+
 import argparse
+import os
 import pickle
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
@@ -10,6 +14,11 @@ from pathlib import Path
 import matplotlib.patheffects as pe
 import matplotlib.colors as mc
 
+from simple_rl.agents.func_approx.dsc.RunLogClass import load_run_variable
+from simple_rl.agents.func_approx.dsc.ClassifierStoreClass import rehydrate_option_data
+from simple_rl.agents.func_approx.dsc.MeshPredictionCacheClass import MeshPredictionCache
+from simple_rl.agents.func_approx.dsc.ResultsIndexClass import load_indexed_runs
+
 sns.set(color_codes=True)
 sns.set_style("white")
 
@@ -42,12 +51,38 @@ def make_meshgrid(x, y, h=.01):
                        np.arange(y_min, y_max, h))
 		return xx, yy
 
+# Run logs already read, by data dir (runs saved with --episodic_saves)
+RUN_LOGS = {}
+
 def load_data(file_name):
+	if not os.path.exists(file_name):
+		data_dir, pkl_file = os.path.split(file_name)
+		return load_run_variable(data_dir, os.path.splitext(pkl_file)[0], RUN_LOGS)
 	with open(file_name, 'rb') as f:
 		data = pickle.load(f)
 	return data
 
-def plot_boundary(x_mesh, y_mesh, clfs, colors, option_name, episode, experiment_name, alpha, img_name=None, goal=None, start=None):
+def load_option_data(data_dir, rehydrate=True):
+	option_data = load_data(data_dir + '/option_data.pkl')
+	if not rehydrate:
+		# Keep the classifier versions, for a MeshPredictionCache over the run's snapshots (see load_mesh_cache)
+		return option_data
+	try:
+		snapshots = load_data(data_dir + '/classifier_snapshots.pkl')
+	except (IOError, KeyError):
+		# Runs saved before the classifier store hold the sklearn classifiers directly
+		return option_data
+	return rehydrate_option_data(option_data, snapshots)
+
+def load_mesh_cache(data_dir):
+	"""MeshPredictionCache over the run's classifier snapshots, with the masks saved with the run."""
+	try:
+		snapshots = load_data(data_dir + '/classifier_snapshots.pkl')
+	except (IOError, KeyError):
+		snapshots = {}
+	return MeshPredictionCache(snapshots).load(data_dir)
+
+def plot_boundary(x_mesh, y_mesh, clfs, colors, option_name, episode, experiment_name, alpha, img_name=None, goal=None, start=None, mask_cache=None):
 	# Create plotting dir (if not created)
 	path = '{}/plots/clf_plots'.format(experiment_name)
 	Path(path).mkdir(exist_ok=True)
@@ -65,10 +100,9 @@ def plot_boundary(x_mesh, y_mesh, clfs, colors, option_name, episode, experiment
 	patches.append(s)
 
 	# Plot classifier boundaries
-	for (clf_name, clf), color in zip(clfs.items(), colors):
-		z = clf.predict(np.c_[x_mesh.ravel(), y_mesh.ravel()])
-		z = (z.reshape(x_mesh.shape) > 0).astype(int)
-		z = np.ma.masked_where(z == 0, z)
+	masks = (mask_cache if mask_cache is not None else MeshPredictionCache()).get_masks(clfs, x_mesh, y_mesh)
+	for (clf_name, mask), color in zip(masks.items(), colors):
+		z = np.ma.masked_where(~mask, mask.astype(int))
 		if 'pessimistic' in clf_name.lower():
 			cf = plt.contourf(x_mesh, y_mesh, z, colors=color, alpha=alpha, hatches='xxx')
 			patches.append(mpatches.Patch(color=color, label=clf_name, alpha=alpha, hatch='xxx'))
@@ -89,7 +123,10 @@ def plot_boundary(x_mesh, y_mesh, clfs, colors, option_name, episode, experiment
 	# TODO: remove
 	print("Figure {}/{}_{}.png saved!".format(path, option_name, episode))
 
-def plot_multi_boundaries(x_mesh, y_mesh, option_data, rgb_color_palette, experiment_name, alpha, plot_eps, title, img_name=None, img_alpha=1, goal=None, start=None, pes_plots=True):
+def plot_multi_boundaries(x_mesh, y_mesh, option_data, rgb_color_palette, experiment_name, alpha, plot_eps, title, img_name=None, img_alpha=1, goal=None, start=None, pes_plots=True, mask_cache=None):
+	if mask_cache is None:
+		mask_cache = MeshPredictionCache()
+
 	# Create plotting dir (if not created)
 	path = '{}/plots/clf_plots'.format(experiment_name)
 	Path(path).mkdir(exist_ok=True)
@@ -134,16 +171,14 @@ def plot_multi_boundaries(x_mesh, y_mesh, option_data, rgb_color_palette, experi
 				for (clf_name, clf) in clfs.items():
 					if 'pessimistic' in clf_name.lower():
 						if pes_plots:
-							z = clf.predict(np.c_[x_mesh.ravel(), y_mesh.ravel()])
-							z = (z.reshape(x_mesh.shape) > 0).astype(int)
-							z = np.ma.masked_where(z == 0, z)
+							mask = mask_cache.get_mask(clf, x_mesh, y_mesh)
+							z = np.ma.masked_where(~mask, mask.astype(int))
 							cf = plt.contourf(x_mesh, y_mesh, z, colors=dark_colors[i], alpha=alpha, hatches='xxx')
 							for collection in cf.collections:
 								collection.set_edgecolor(dark_colors[i])
 					else:
-						z = clf.predict(np.c_[x_mesh.ravel(), y_mesh.ravel()])
-						z = (z.reshape(x_mesh.shape) > 0).astype(int)
-						z = np.ma.masked_where(z == 0, z)
+						mask = mask_cache.get_mask(clf, x_mesh, y_mesh)
+						z = np.ma.masked_where(~mask, mask.astype(int))
 						cf = plt.contourf(x_mesh, y_mesh, z, colors=colors[i] , alpha=alpha-0.2)
 
 	g = plt.scatter(goal[0], goal[1], marker="*", color="y", s=80, path_effects=[pe.Stroke(linewidth=1, foreground='k'), pe.Normal()], label="Goal")
@@ -165,10 +200,9 @@ def plot_multi_boundaries(x_mesh, y_mesh, option_data, rgb_color_palette, experi
 	print("Figure {}/all_options_{}.png saved!".format(path, saved_eps))
 
 def get_all_cur_data(run_dir, start, end):
-	all_data = []
-	for i in range(start, end+1):
-		scores = load_data(run_dir + '/run_{}_all_data'.format(i) + '/per_episode_scores.pkl')
-		all_data.append(scores)
+	index, experiment, _ = load_indexed_runs(run_dir, start, end)
+	all_data = index.get_series(experiment, 'per_episode_scores', seeds=range(start, end+1))
+	index.close()
 	return np.array(all_data)
 
 def get_all_old_data(old_run_dir, start, end):
@@ -178,7 +212,7 @@ def get_all_old_data(old_run_dir, start, end):
 		all_old_runs.append(scores)
 	return np.array(all_old_runs)
 
-def generate_all_plots(run_dir, option_data, per_episode_scores, x_mesh, y_mesh, mdp_env_name, num_run, args, all_cur_data=None, all_old_data=None, multi_cur_data=None, img_dir=None, goal=None, start=None):
+def generate_all_plots(run_dir, option_data, per_episode_scores, x_mesh, y_mesh, mdp_env_name, num_run, args, all_cur_data=None, all_old_data=None, multi_cur_data=None, img_dir=None, goal=None, start=None, mask_cache=None):
 	sns.set_style("white")
 	
 	# Plot actual boundaries
@@ -202,7 +236,8 @@ def generate_all_plots(run_dir, option_data, per_episode_scores, x_mesh, y_mesh,
 	# 							alpha=0.5,
 	# 							img_name=img_dir,
 	# 							goal=goal,	
-	# 							start=start)
+	# 							start=start,
+	# 							mask_cache=mask_cache)
 
 	# Plot overlap boundaries
 	start_eps, end_eps, num_samples = 42, 43, 1
@@ -222,7 +257,8 @@ def generate_all_plots(run_dir, option_data, per_episode_scores, x_mesh, y_mesh,
 									img_alpha=0.95,
 									goal=goal,
 									start=start,
-									pes_plots=True)
+									pes_plots=True,
+									mask_cache=mask_cache)
 
 def export_to_text_file(data, file_dir, file_name):
 	with open(file_dir + '/' + file_name, 'w') as f:
@@ -235,7 +271,8 @@ def main(args):
 	img_dir = args.img_dir
 	
 	# Load variables
-	option_data = load_data(run_dir + '/' + data_dir + '/option_data.pkl')
+	option_data = load_option_data(run_dir + '/' + data_dir, rehydrate=False)
+	mask_cache = load_mesh_cache(run_dir + '/' + data_dir)
 	per_episode_scores = load_data(run_dir + '/' + data_dir + '/per_episode_scores.pkl')
 	mdp_env_name = load_data(run_dir + '/' + data_dir + '/mdp_env_name.pkl')
 	args = load_data(run_dir + '/' + data_dir + '/args.pkl')
@@ -268,7 +305,9 @@ def main(args):
 					   args=args,
 					   img_dir=img_dir,
 					   goal=goal_xy,
-					   start=start_xy)
+					   start=start_xy,
+					   mask_cache=mask_cache)
+	mask_cache.save(run_dir + '/' + data_dir)
 
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser()
@@ -56,8 +56,10 @@ try:
 except NameError:
    pass
 
-# Imports.
-import simple_rl.abstraction, simple_rl.agents, simple_rl.experiments, simple_rl.mdp, simple_rl.planning, simple_rl.tasks, simple_rl.utils
-import simple_rl.run_experiments
+# Imports (subpackages are imported the first time they are used, eg. simple_rl.tasks.GridWorldMDP).
+from simple_rl._version import __version__
+from simple_rl.utils.lazy_imports import lazy_attributes
 
-from simple_rl._version import __version__
\ No newline at end of file
+_LAZY_ATTRIBUTES = {name : "simple_rl." + name for name in ["abstraction", "agents", "experiments", "mdp", "planning", "tasks", "utils", "run_experiments"]}
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
\ No newline at end of file
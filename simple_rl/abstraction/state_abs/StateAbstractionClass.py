@@ -105,13 +105,13 @@ class StateAbstraction(object):
 
         # Move the phi into a cluster dictionary.
         cluster_dict = defaultdict(list)
-        for k, v in self._phi.iteritems():
+        for k, v in self._phi.items():
             # Cluster dict: v is abstract, key is ground.
             cluster_dict[v].append(k)
 
         # Move the phi into a cluster dictionary.
         other_cluster_dict = defaultdict(list)
-        for k, v in other_abs._phi.iteritems():
+        for k, v in other_abs._phi.items():
             other_cluster_dict[v].append(k)
 
 
@@ -2,6 +2,7 @@
 from __future__ import print_function
 import random
 from decimal import Decimal
+import numpy as np
 
 # Other imports.
 from simple_rl.tasks import FourRoomMDP
@@ -115,3 +116,41 @@ def _v_disc_approx_indicator(state_x, state_y, vi, actions, epsilon=0.0):
     bucket_y = int( (v_y / v_max) / epsilon)
 
     return bucket_x == bucket_y
+
+
+# -------------------------
+# -- Vectorized versions --
+# -------------------------
+
+# Each returns, from the (|S| x |A|) Q matrix, per state features (|S| x k) and a tolerance such that the indicator
+# holds for two states iff max_i |features(x)_i - features(y)_i| <= tolerance.
+
+def _q_eps_approx_features(q_matrix, epsilon=0.0):
+    return q_matrix, epsilon
+
+def _v_approx_features(q_matrix, epsilon=0.0):
+    return q_matrix.max(axis=1)[:, None], epsilon
+
+def _q_disc_approx_features(q_matrix, epsilon=0.0):
+    v_max = 1 #/ (1 - 0.95)
+
+    if epsilon == 0.0:
+        return q_matrix, 0.0
+
+    return np.trunc(q_matrix * (v_max / epsilon)), 0.0
+
+def _v_disc_approx_features(q_matrix, epsilon=0.0):
+    v_max = 1 / (1 - 0.95)
+
+    if epsilon == 0.0:
+        return _v_approx_features(q_matrix, epsilon=0)
+
+    return np.trunc((q_matrix.max(axis=1)[:, None] / v_max) / epsilon), 0.0
+
+# Indicator --> its vectorized version.
+VECTORIZED_INDICATORS = {
+    _q_eps_approx_indicator: _q_eps_approx_features,
+    _v_approx_indicator: _v_approx_features,
+    _q_disc_approx_indicator: _q_disc_approx_features,
+    _v_disc_approx_indicator: _v_disc_approx_features,
+}
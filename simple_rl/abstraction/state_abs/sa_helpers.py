@@ -3,6 +3,7 @@ from __future__ import print_function
 from collections import defaultdict
 import sys
 import random
+import numpy as np
 
 # Other imports.
 from simple_rl.planning.ValueIterationClass import ValueIteration
@@ -26,20 +27,20 @@ def merge_state_abs(list_of_sa, track_act_opt_pr=False):
 
     return merged
 
-def make_sa(mdp, indic_func=ind_funcs._q_eps_approx_indicator, state_class=State, epsilon=0.0, save=False, track_act_opt_pr=False):
+def make_sa(mdp, indic_func=ind_funcs._q_eps_approx_indicator, state_class=State, epsilon=0.0, save=False, track_act_opt_pr=False, num_workers=1):
     '''
     Args:
         mdp (MDP)
         state_class (Class)
         epsilon (float)
+        num_workers (int): Processes making the abstractions of an MDPDistribution (see make_multitask_sa).
 
     Summary:
         Creates and saves a state abstraction.
     '''
     print("  Making state abstraction... ")
-    q_equiv_sa = StateAbstraction(phi={}, track_act_opt_pr=track_act_opt_pr)
     if isinstance(mdp, MDPDistribution):
-        q_equiv_sa = make_multitask_sa(mdp, state_class=state_class, indic_func=indic_func, epsilon=epsilon, track_act_opt_pr=track_act_opt_pr)
+        q_equiv_sa = make_multitask_sa(mdp, state_class=state_class, indic_func=indic_func, epsilon=epsilon, track_act_opt_pr=track_act_opt_pr, num_workers=num_workers)
     else:
         q_equiv_sa = make_singletask_sa(mdp, state_class=state_class, indic_func=indic_func, epsilon=epsilon, track_act_opt_pr=track_act_opt_pr)
 
@@ -48,7 +49,7 @@ def make_sa(mdp, indic_func=ind_funcs._q_eps_approx_indicator, state_class=State
 
     return q_equiv_sa
 
-def make_multitask_sa(mdp_distr, state_class=State, indic_func=ind_funcs._q_eps_approx_indicator, epsilon=0.0, aa_single_act=True, track_act_opt_pr=False):
+def make_multitask_sa(mdp_distr, state_class=State, indic_func=ind_funcs._q_eps_approx_indicator, epsilon=0.0, aa_single_act=True, track_act_opt_pr=False, num_workers=1):
     '''
     Args:
         mdp_distr (MDPDistribution)
@@ -56,14 +57,21 @@ def make_multitask_sa(mdp_distr, state_class=State, indic_func=ind_funcs._q_eps_
         indicator_func (S x S --> {0,1})
         epsilon (float)
         aa_single_act (bool): If we should track optimal actions.
+        num_workers (int): Processes making the abstractions of the MDPs in parallel (@indic_func and the MDPs are
+            then pickled to them, so @indic_func has to be a module level function).
 
     Returns:
         (StateAbstraction)
     '''
-    sa_list = []
-    for mdp in mdp_distr.get_mdps():
-        sa = make_singletask_sa(mdp, indic_func, state_class, epsilon, aa_single_act=aa_single_act, prob_of_mdp=mdp_distr.get_prob_of_mdp(mdp), track_act_opt_pr=track_act_opt_pr)
-        sa_list += [sa]
+    mdps = list(mdp_distr.get_mdps())
+    args = [(mdp, indic_func, state_class, epsilon, aa_single_act, mdp_distr.get_prob_of_mdp(mdp), track_act_opt_pr) for mdp in mdps]
+    if num_workers > 1:
+        import multiprocessing as mp
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(mdps)), mp_context=mp.get_context("spawn")) as pool:
+            sa_list = list(pool.map(make_singletask_sa, *zip(*args)))
+    else:
+        sa_list = [make_singletask_sa(*mdp_args) for mdp_args in args]
 
     multitask_sa = merge_state_abs(sa_list, track_act_opt_pr=track_act_opt_pr)
 
@@ -76,9 +84,16 @@ def make_singletask_sa(mdp, indic_func, state_class, epsilon=0.0, aa_single_act=
         indic_func (S x S --> {0,1})
         state_class (Class)
         epsilon (float)
+        aa_single_act (bool), prob_of_mdp (float), track_act_opt_pr (bool): Unused, StateAbstraction does not track
+            optimal actions.
 
     Returns:
         (StateAbstraction)
+
+    Summary:
+        Every state not yet clustered, in order, starts a cluster with each state not yet clustered for which
+        @indic_func holds with it. The indicators of indicator_funcs.VECTORIZED_INDICATORS are checked on the Q
+        matrix, computed once; other ones are called per pair.
     '''
 
     print("\tRunning VI...",)
@@ -93,39 +108,18 @@ def make_singletask_sa(mdp, indic_func, state_class, epsilon=0.0, aa_single_act=
 
     print("\tMaking state abstraction...",)
     sys.stdout.flush()
-    sa = StateAbstraction(phi={}, state_class=state_class, track_act_opt_pr=track_act_opt_pr)
-    clusters = defaultdict(list)
-    num_states = len(vi.get_states())
-
-    actions = mdp.get_actions()
-    # Find state pairs that satisfy the condition.
-    for i, state_x in enumerate(vi.get_states()):
-        sys.stdout.flush()
-        clusters[state_x] = [state_x]
-
-        for state_y in vi.get_states()[i:]:
-            if not (state_x == state_y) and indic_func(state_x, state_y, vi, actions, epsilon=epsilon):
-                clusters[state_x].append(state_y)
-                clusters[state_y].append(state_x)
-
-    print("making clusters...",)
-    sys.stdout.flush()
-    
+    states, q_matrix = get_q_matrix(vi)
+    num_states = len(states)
+
+    if indic_func in ind_funcs.VECTORIZED_INDICATORS:
+        features, tolerance = ind_funcs.VECTORIZED_INDICATORS[indic_func](q_matrix, epsilon=epsilon)
+        clusters = _cluster_features(features, tolerance)
+    else:
+        clusters = _cluster_pairwise(states, indic_func, vi, mdp.get_actions(), epsilon)
+
     # Build SA.
-    for i, state in enumerate(clusters.keys()):
-        new_cluster = clusters[state]
-        sa.make_cluster(new_cluster)
-
-        # Destroy old so we don't double up.
-        for s in clusters[state]:
-            if s in clusters.keys():
-                clusters.pop(s)
-    
-    if aa_single_act:
-        # Put all optimal actions in a set associated with the ground state.
-        for ground_s in sa.get_ground_states():
-            a_star_set = set(vi.get_max_q_actions(ground_s))
-            sa.set_actions_state_opt_dict(ground_s, a_star_set, prob_of_mdp)
+    abstr_states = [state_class(data=c) for c in range(clusters.max() + 1)]
+    sa = StateAbstraction(phi=dict((s, abstr_states[c]) for s, c in zip(states, clusters.tolist())))
 
     print(" done.")
     print("\tGround States:", num_states)
@@ -134,6 +128,75 @@ def make_singletask_sa(mdp, indic_func, state_class, epsilon=0.0, aa_single_act=
 
     return sa
 
+def get_q_matrix(vi):
+    '''
+    Args:
+        vi (ValueIteration): Run.
+
+    Returns:
+        (list): The states of @vi.
+        (np.ndarray): Q(s, a) for those states, per action of @vi (|S| x |A|).
+    '''
+    if vi.q_matrix is not None:
+        return list(vi.index_states), vi.q_matrix
+    states = vi.get_states()
+    return states, np.array([[vi.get_q_value(s, a) for a in vi.actions] for s in states], dtype=float).reshape(len(states), len(vi.actions))
+
+def _cluster_features(features, tolerance):
+    '''
+    Args:
+        features (np.ndarray): Per state features (|S| x k).
+        tolerance (float)
+
+    Returns:
+        (np.ndarray): The cluster of each state: every state not yet clustered, in order, starts a cluster with each
+            state not yet clustered whose features are within @tolerance of its own (in max norm).
+    '''
+    num_states = len(features)
+    if tolerance == 0:
+        # Equality is transitive: the clusters are the distinct rows, numbered by first state.
+        _, first, clusters = np.unique(features, axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        renumber = np.empty_like(order)
+        renumber[order] = np.arange(len(order))
+        return renumber[clusters.ravel()]
+
+    # Only states whose first feature is within @tolerance can be, so those of each leader are a window of the states
+    # sorted by it (taken twice as wide, so rounding never drops one).
+    keys = features[:, 0]
+    by_key = np.argsort(keys, kind="stable")
+    sorted_keys = keys[by_key]
+    clusters = np.full(num_states, -1, dtype=np.int64)
+    num_clusters = 0
+    for x in range(num_states):
+        if clusters[x] >= 0:
+            continue
+        lo = np.searchsorted(sorted_keys, keys[x] - 2 * tolerance, side="left")
+        hi = np.searchsorted(sorted_keys, keys[x] + 2 * tolerance, side="right")
+        candidates = by_key[lo:hi]
+        candidates = candidates[clusters[candidates] < 0]
+        close = np.abs(features[candidates] - features[x]).max(axis=1) <= tolerance
+        clusters[candidates[close]] = num_clusters
+        num_clusters += 1
+    return clusters
+
+def _cluster_pairwise(states, indic_func, vi, actions, epsilon):
+    '''
+    Returns:
+        (np.ndarray): The clusters of _cluster_features, with @indic_func called on pairs of @states.
+    '''
+    clusters = np.full(len(states), -1, dtype=np.int64)
+    num_clusters = 0
+    for i, state_x in enumerate(states):
+        if clusters[i] >= 0:
+            continue
+        clusters[i] = num_clusters
+        for j in range(i + 1, len(states)):
+            if clusters[j] < 0 and indic_func(state_x, states[j], vi, actions, epsilon=epsilon):
+                clusters[j] = num_clusters
+        num_clusters += 1
+    return clusters
+
 def visualize_state_abstr_grid(grid_mdp, state_abstr, scr_width=720, scr_height=720):
     '''
     Args:
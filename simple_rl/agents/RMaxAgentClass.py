@@ -7,7 +7,7 @@ Notes:
 
 # Python imports.
 import random
-from collections import defaultdict
+import numpy as np
 
 # Local classes.
 from simple_rl.agents.AgentClass import Agent
@@ -15,6 +15,11 @@ from simple_rl.agents.AgentClass import Agent
 class RMaxAgent(Agent):
     '''
     Implementation for an R-Max Agent [Brafman and Tennenholtz 2003]
+
+    States are interned to indices as they are seen, and the first @s_a_threshold samples of each (s, a) are kept
+    as counts in arrays. Q is the @horizon step value iteration over the empirical model of the known (s, a)
+    (unknown ones are worth rmax, with no future), recomputed only when an (s, a) becomes known: in between, the
+    model does not change, so act reads the cached Q-values.
     '''
 
     def __init__(self, actions, gamma=0.95, horizon=4, s_a_threshold=1, name="RMax-h"):
@@ -23,6 +28,7 @@ class RMaxAgent(Agent):
         self.rmax = 1.0
         self.horizon = horizon
         self.s_a_threshold = s_a_threshold
+        self.action_index = dict((a, j) for j, a in enumerate(self.actions))
         self.reset()
 
     def reset(self):
@@ -30,18 +36,25 @@ class RMaxAgent(Agent):
         Summary:
             Resets the agent back to its tabula rasa config.
         '''
-        self.rewards = defaultdict(lambda : defaultdict(list)) # S --> A --> [r_1, ...]
-        self.transitions = defaultdict(lambda : defaultdict(lambda : defaultdict(int))) # S --> A --> S' --> counts
-        self.r_s_a_counts = defaultdict(lambda : defaultdict(int)) # S --> A --> #rs
-        self.t_s_a_counts = defaultdict(lambda : defaultdict(int)) # S --> A --> #ts
+        num_actions = len(self.actions)
+        self.state_index = {}
+        self.index_states = []
+        self.terminal = np.zeros(64, dtype=bool)
+        self.s_a_counts = np.zeros((64, num_actions), dtype=np.int64) # [s, a] --> #samples
+        self.reward_sums = np.zeros((64, num_actions)) # [s, a] --> r_1 + ...
+        self.transition_rows = [] # s * |A| + a, per sample
+        self.transition_cols = [] # s', per sample
+        self.num_known_sa = 0
+        self.q_table = np.zeros((0, num_actions))
         self.prev_state = None
         self.prev_action = None
 
     def get_num_known_sa(self):
-        return sum([self.is_known(s,a) for s,a in self.r_s_a_counts.keys()])
+        return self.num_known_sa
 
     def is_known(self, s, a):
-        return self.r_s_a_counts[s][a] >= self.s_a_threshold and self.t_s_a_counts[s][a] >= self.s_a_threshold
+        i = self.state_index.get(s)
+        return i is not None and self.s_a_counts[i, self.action_index[a]] >= self.s_a_threshold
 
     def act(self, state, reward):
         # Update given s, a, r, s' : self.prev_state, self.prev_action, reward, state
@@ -65,72 +78,127 @@ class RMaxAgent(Agent):
             next_state (State)
 
         Summary:
-            Updates T and R.
+            Updates T and R, and re-plans if (@state, @action) just became known.
         '''
-        if state != None and action != None:
-            if self.r_s_a_counts[state][action] <= self.s_a_threshold:
+        if state is not None and action is not None:
+            i, k, j = self._intern(state), self._intern(next_state), self.action_index[action]
+            if self.s_a_counts[i, j] < self.s_a_threshold:
                 # Add new data points if we haven't seen this s-a enough.
-                self.rewards[state][action] += [reward]
-                self.r_s_a_counts[state][action] += 1
+                self.reward_sums[i, j] += reward
+                self.transition_rows.append(i * len(self.actions) + j)
+                self.transition_cols.append(k)
+                self.s_a_counts[i, j] += 1
+
+                if self.s_a_counts[i, j] == self.s_a_threshold:
+                    self.num_known_sa += 1
+                    self.q_table = self._compute_q_table(self.horizon)
+
+    def _intern(self, state):
+        '''
+        Returns:
+            (int): The index of @state, added if new.
+        '''
+        i = self.state_index.get(state)
+        if i is None:
+            i = self.state_index[state] = len(self.index_states)
+            self.index_states.append(state)
+            if i == len(self.terminal):
+                # Double the arrays.
+                self.terminal = np.concatenate([self.terminal, np.zeros_like(self.terminal)])
+                self.s_a_counts = np.concatenate([self.s_a_counts, np.zeros_like(self.s_a_counts)])
+                self.reward_sums = np.concatenate([self.reward_sums, np.zeros_like(self.reward_sums)])
+            self.terminal[i] = state.is_terminal()
+        return i
+
+    def _compute_q_table(self, horizon):
+        '''
+        Args:
+            horizon (int): Steps of value iteration.
+
+        Returns:
+            (np.ndarray): Q_@horizon of every state seen so far (|S| x |A|), over the known model:
+                Q_0 = R, and Q_h(s, a) = R(s, a) + gamma * sum_s' T(s' | s, a) max_a' Q_h-1(s', a') for known (s, a) of
+                non terminal s.
+        '''
+        from scipy import sparse
 
-            if self.t_s_a_counts[state][action] <= self.s_a_threshold:
-                self.transitions[state][action][next_state] += 1
-                self.t_s_a_counts[state][action] += 1
+        num_states, num_actions = len(self.index_states), len(self.actions)
+        counts = self.s_a_counts[:num_states]
+        known = counts >= self.s_a_threshold
+        rewards = np.where(known, self.reward_sums[:num_states] / np.maximum(counts, 1), self.rmax)
+
+        # Known (s, a) have exactly @s_a_threshold samples, the others are left out.
+        rows, cols = np.array(self.transition_rows, dtype=np.int64), np.array(self.transition_cols, dtype=np.int64)
+        keep = known.ravel()[rows]
+        trans = sparse.csr_matrix((np.full(keep.sum(), 1. / self.s_a_threshold), (rows[keep], cols[keep])),
+                                  shape=(num_states * num_actions, num_states))
+        has_future = known & ~self.terminal[:num_states, None]
+
+        q_table = rewards
+        for h in range(horizon):
+            future = trans.dot(q_table.max(axis=1)).reshape(num_states, num_actions)
+            q_table = rewards + self.gamma * np.where(has_future, future, 0.)
+        return q_table
+
+    def _get_q_values(self, state, horizon=None):
+        '''
+        Args:
+            state (State)
+            horizon (int): Steps of value iteration (the cached @self.horizon ones by default).
+
+        Returns:
+            (np.ndarray): Q(@state, a) for every action.
+        '''
+        q_table = self.q_table if horizon is None or horizon == self.horizon else self._compute_q_table(horizon)
+        i = self.state_index.get(state)
+        if i is None or i >= len(q_table):
+            # Nothing known about @state (it was not seen when Q was computed).
+            return np.full(len(self.actions), self.rmax)
+        return q_table[i]
 
     def _compute_max_qval_action_pair(self, state, horizon=None):
         '''
         Args:
             state (State)
-            horizon (int): Indicates the level of recursion depth for computing Q.
+            horizon (int): Indicates the number of steps of value iteration for computing Q.
 
         Returns:
             (tuple) --> (float, str): where the float is the Qval, str is the action.
         '''
-        # If this is the first call, use the default horizon.
-        if horizon is None:
-            horizon = self.horizon
+        q_vals = self._get_q_values(state, horizon)
 
         # Grab random initial action in case all equal
         best_action = random.choice(self.actions)
-        max_q_val = self.get_q_value(state, best_action, horizon)
+        max_q_val = q_vals[self.action_index[best_action]]
 
         # Find best action (action w/ current max predicted Q value)
-        for action in self.actions:
-            q_s_a = self.get_q_value(state, action, horizon)
-            if q_s_a > max_q_val:
-                max_q_val = q_s_a
+        for j, action in enumerate(self.actions):
+            if q_vals[j] > max_q_val:
+                max_q_val = q_vals[j]
                 best_action = action
 
-        return max_q_val, best_action
+        return float(max_q_val), best_action
 
     def get_max_q_action(self, state, horizon=None):
         '''
         Args:
             state (State)
-            horizon (int): Indicates the level of recursion depth for computing Q.
+            horizon (int): Indicates the number of steps of value iteration for computing Q.
 
         Returns:
             (str): The string associated with the action with highest Q value.
         '''
-
-        # If this is the first call, use the default horizon.
-        if horizon is None:
-            horizon = self.horizon 
         return self._compute_max_qval_action_pair(state, horizon)[1]
 
     def get_max_q_value(self, state, horizon=None):
         '''
         Args:
             state (State)
-            horizon (int): Indicates the level of recursion depth for computing Q.
+            horizon (int): Indicates the number of steps of value iteration for computing Q.
 
         Returns:
             (float): The Q value of the best action in this state.
         '''
-
-        # If this is the first call, use the default horizon.
-        if horizon is None:
-            horizon = self.horizon 
         return self._compute_max_qval_action_pair(state, horizon)[0]
 
     def get_q_value(self, state, action, horizon=None):
@@ -138,52 +206,12 @@ class RMaxAgent(Agent):
         Args:
             state (State)
             action (str)
-            horizon (int): Indicates the level of recursion depth for computing Q.
+            horizon (int): Indicates the number of steps of value iteration for computing Q.
 
         Returns:
             (float)
         '''
-
-        # If this is the first call, use the default horizon.
-        if horizon is None:
-            horizon = self.horizon
-
-        if horizon <= 0 or state.is_terminal():
-            # If we're not looking any further.
-            return self._get_reward(state, action)
-
-        # Compute future return.
-        expected_future_return = self.gamma*self._compute_exp_future_return(state, action, horizon)
-        q_val = self._get_reward(state, action) + expected_future_return# self.q_func[(state, action)] = self._get_reward(state, action) + expected_future_return
-
-        return q_val
-
-    def _compute_exp_future_return(self, state, action, horizon=None):
-        '''
-        Args:
-            state (State)
-            action (str)
-            horizon (int): Recursion depth to compute Q
-
-        Return:
-            (float): Discounted expected future return from applying @action in @state.
-        '''
-
-        # If this is the first call, use the default horizon.
-        if horizon is None:
-            horizon = self.horizon
-
-        next_state_dict = self.transitions[state][action]
-
-        denominator = float(sum(next_state_dict.values()))
-        state_weights = defaultdict(float)
-        for next_state in next_state_dict.keys():
-            count = next_state_dict[next_state]
-            state_weights[next_state] = (count / denominator)
-
-        weighted_future_returns = [self.get_max_q_value(next_state, horizon-1) * state_weights[next_state] for next_state in next_state_dict.keys()]
-
-        return sum(weighted_future_returns)
+        return float(self._get_q_values(state, horizon)[self.action_index[action]])
 
     def _get_reward(self, state, action):
         '''
@@ -195,11 +223,11 @@ class RMaxAgent(Agent):
             Believed reward of executing @action in @state. If R(s,a) is unknown
             for this s,a pair, return self.rmax. Otherwise, return the MLE.
         '''
-
-        if self.r_s_a_counts[state][action] >= self.s_a_threshold:
+        i = self.state_index.get(state)
+        j = self.action_index[action]
+        if i is not None and self.s_a_counts[i, j] >= self.s_a_threshold:
             # Compute MLE if we've seen this s,a pair enough.
-            rewards_s_a = self.rewards[state][action]
-            return float(sum(rewards_s_a)) / len(rewards_s_a)
+            return self.reward_sums[i, j] / self.s_a_counts[i, j]
         else:
             # Otherwise return rmax.
             return self.rmax
@@ -9,19 +9,23 @@ Implementations of standard RL agents:
 	LinUCBAgentClass: Contextual Bandit Algorithm.
 '''
 
-# Grab agent classes.
-from simple_rl.agents.AgentClass import Agent
-from simple_rl.agents.FixedPolicyAgentClass import FixedPolicyAgent
-from simple_rl.agents.QLearningAgentClass import QLearningAgent
-from simple_rl.agents.DoubleQAgentClass import DoubleQAgent
-from simple_rl.agents.DelayedQAgentClass import DelayedQAgent
-from simple_rl.agents.RandomAgentClass import RandomAgent
-from simple_rl.agents.RMaxAgentClass import RMaxAgent
-from simple_rl.agents.func_approx.LinearQAgentClass import LinearQAgent
-try:
-	from simple_rl.agents.func_approx.DQNAgentClass import DQNAgent
-except ImportError:
-	print("Warning: Tensorflow not installed.")
-	pass
+# Other imports.
+from simple_rl.utils.lazy_imports import lazy_attributes
 
-from simple_rl.agents.bandits.LinUCBAgentClass import LinUCBAgent
\ No newline at end of file
+# Grab agent classes (each agent module is imported the first time its class is used).
+_LAZY_ATTRIBUTES = {
+	"Agent" : "simple_rl.agents.AgentClass",
+	"FixedPolicyAgent" : "simple_rl.agents.FixedPolicyAgentClass",
+	"QLearningAgent" : "simple_rl.agents.QLearningAgentClass",
+	"DoubleQAgent" : "simple_rl.agents.DoubleQAgentClass",
+	"DelayedQAgent" : "simple_rl.agents.DelayedQAgentClass",
+	"RandomAgent" : "simple_rl.agents.RandomAgentClass",
+	"RMaxAgent" : "simple_rl.agents.RMaxAgentClass",
+	"LinearQAgent" : "simple_rl.agents.func_approx.LinearQAgentClass",
+	# Requires Tensorflow: raises ImportError when used without it.
+	"DQNAgent" : "simple_rl.agents.func_approx.DQNAgentClass",
+	"LinUCBAgent" : "simple_rl.agents.bandits.LinUCBAgentClass",
+}
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
+__all__ = [name for name in _LAZY_ATTRIBUTES if name != "DQNAgent"]
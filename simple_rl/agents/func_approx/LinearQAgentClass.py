@@ -5,8 +5,8 @@ Contains implementation for a Q Learner with a Linear Function Approximator.
 '''
 
 # Python imports.
+import random
 import numpy as np
-import math
 
 # Other imports.
 from simple_rl.agents import Agent, QLearningAgent
@@ -14,19 +14,35 @@ from simple_rl.agents import Agent, QLearningAgent
 class LinearQAgent(QLearningAgent):
     '''
     QLearningAgent with a linear function approximator for the Q Function.
+
+    The weights are an (|A| x d) matrix, so the Q-values of every action in a state are one product with its
+    features, computed once per state (the features of the last two states seen are cached). With @replay_size > 0,
+    transitions go to a replay buffer of that size and each step updates on a batch of @batch_size of them.
     '''
 
-    def __init__(self, actions, num_features, rand_init=True, name="Linear-Q", alpha=0.2, gamma=0.99, epsilon=0.2, explore="uniform", rbf=False, anneal=True):
+    def __init__(self, actions, num_features, rand_init=True, name="Linear-Q", alpha=0.2, gamma=0.99, epsilon=0.2, explore="uniform", rbf=False, anneal=True, replay_size=0, batch_size=32):
         name = name + "-rbf" if rbf else name
         QLearningAgent.__init__(self, actions=list(actions), name=name, alpha=alpha, gamma=gamma, epsilon=epsilon, explore=explore, anneal=anneal)
         self.num_features = num_features
+        self.action_index = dict((a, j) for j, a in enumerate(self.actions))
         # Add a basis feature.
         if rand_init:
-            self.weights = np.random.random(self.num_features*len(self.actions))
+            self.weights = np.random.random((len(self.actions), self.num_features))
         else:
-            self.weights = np.zeros(self.num_features*len(self.actions))
+            self.weights = np.zeros((len(self.actions), self.num_features))
 
         self.rbf = rbf
+        self.replay_size = replay_size
+        self.batch_size = batch_size
+        self._reset_buffers()
+
+    def _reset_buffers(self):
+        self._feature_cache = [(None, None), (None, None)] # (state, features), most recent first.
+        self.replay_features = np.zeros((self.replay_size, self.num_features))
+        self.replay_actions = np.zeros(self.replay_size, dtype=np.int64)
+        self.replay_rewards = np.zeros(self.replay_size)
+        self.replay_next_features = np.zeros((self.replay_size, self.num_features))
+        self.num_transitions = 0
 
     def update(self, state, action, reward, next_state):
         '''
@@ -43,7 +59,30 @@ class LinearQAgent(QLearningAgent):
             # If this is the first state, initialize state-relevant data and return.
             self.prev_state = state
             return
-        self._update_weights(reward, next_state)
+
+        if self.replay_size > 0:
+            self._add_transition(state, action, reward, next_state)
+            self._update_weights_from_replay()
+        else:
+            self._update_weights(reward, next_state, state, action)
+
+    def _features(self, state):
+        '''
+        Args:
+            state (State)
+
+        Returns:
+            (numpy array): The (basis or rbf) features of @state, cached for the last two states.
+        '''
+        for cached_state, feats in self._feature_cache:
+            if cached_state is state:
+                return feats
+
+        feats = np.asarray(state.features(), dtype=float)
+        if self.rbf:
+            feats = _rbf(feats)
+        self._feature_cache = [(state, feats), self._feature_cache[0]]
+        return feats
 
     def _phi(self, state, action):
         '''
@@ -58,23 +97,18 @@ class LinearQAgent(QLearningAgent):
             The resulting feature vector multiplies the state vector by |A| (size of action space), and only the action passed in retains
             the original vector, all other values are set to 0.
         '''
-        result = np.zeros(self.num_features * len(self.actions))
-        act_index = self.actions.index(action)
-
-        basis_feats = state.features()
-
-        if self.rbf:
-            basis_feats = [_rbf(f) for f in basis_feats]
+        result = np.zeros((len(self.actions), self.num_features))
+        result[self.action_index[action]] = self._features(state)
 
-        result[act_index*self.num_features:(act_index + 1)*self.num_features] = basis_feats
+        return result.ravel()
 
-        return result
-
-    def _update_weights(self, reward, cur_state):
+    def _update_weights(self, reward, cur_state, prev_state=None, prev_action=None):
         '''
         Args:
             reward (float)
             cur_state (State)
+            prev_state (State): Defaults to self.prev_state.
+            prev_action (str): Defaults to self.prev_action.
 
         Summary:
             Updates according to:
@@ -86,19 +120,67 @@ class LinearQAgent(QLearningAgent):
 
             Where phi(s,a) maps the state action pair to a feature vector (see QLearningAgent._phi(s,a))
         '''
+        prev_state = self.prev_state if prev_state is None else prev_state
+        prev_action = self.prev_action if prev_action is None else prev_action
 
         # Compute temporal difference [Eq. 1]
-        max_q_cur_state = self.get_max_q_value(cur_state)
-        prev_q_val = self.get_q_value(self.prev_state, self.prev_action)
-        self.most_recent_loss = reward + self.gamma * max_q_cur_state - prev_q_val
+        max_q_cur_state = self.get_q_values(cur_state).max()
+        prev_feats = self._features(prev_state)
+        j = self.action_index[prev_action]
+        self.most_recent_loss = reward + self.gamma * max_q_cur_state - self.weights[j].dot(prev_feats)
+
+        # Sparsely update the weights (only the row of the action we used).
+        self.weights[j] += self.alpha * self.most_recent_loss * prev_feats
+
+    def _add_transition(self, state, action, reward, next_state):
+        i = self.num_transitions % self.replay_size
+        self.replay_features[i] = self._features(state)
+        self.replay_actions[i] = self.action_index[action]
+        self.replay_rewards[i] = reward
+        self.replay_next_features[i] = self._features(next_state)
+        self.num_transitions += 1
+
+    def _update_weights_from_replay(self):
+        '''
+        Summary:
+            One update of Eq. 1 averaged over @self.batch_size transitions sampled from the replay buffer (once it
+            holds that many).
+        '''
+        num_stored = min(self.num_transitions, self.replay_size)
+        if num_stored < self.batch_size:
+            return
 
-        # Update each weight
-        phi = self._phi(self.prev_state, self.prev_action)
-        active_feats_index = self.actions.index(self.prev_action) * self.num_features
+        batch = np.random.randint(num_stored, size=self.batch_size)
+        feats, actions = self.replay_features[batch], self.replay_actions[batch]
+        max_q_next = self.replay_next_features[batch].dot(self.weights.T).max(axis=1)
+        q_vals = np.einsum("ij,ij->i", feats, self.weights[actions])
+        deltas = self.replay_rewards[batch] + self.gamma * max_q_next - q_vals
+        self.most_recent_loss = deltas.mean()
 
-        # Sparsely update the weights (only update weights associated with the action we used).
-        for i in range(active_feats_index, active_feats_index + self.num_features):
-            self.weights[i] = self.weights[i] + self.alpha * phi[i] * self.most_recent_loss
+        # Rows of actions sampled more than once add up.
+        np.add.at(self.weights, actions, (self.alpha / self.batch_size) * deltas[:, None] * feats)
+
+    def get_q_values(self, state):
+        '''
+        Args:
+            state (State)
+
+        Returns:
+            (numpy array): Q(@state, a) for every action (in the order of self.actions).
+        '''
+        return self.weights.dot(self._features(state))
+
+    def _compute_max_qval_action_pair(self, state):
+        '''
+        Args:
+            state (State)
+
+        Returns:
+            (tuple) --> (float, str): where the float is the Qval, str is the action (random among equal ones).
+        '''
+        q_vals = self.get_q_values(state)
+        best_actions = np.flatnonzero(q_vals == q_vals.max())
+        return q_vals.max(), self.actions[random.choice(best_actions)]
 
     def get_q_value(self, state, action):
         '''
@@ -111,14 +193,27 @@ class LinearQAgent(QLearningAgent):
         '''
 
         # Return linear approximation of Q value
-        sa_feats = self._phi(state, action)
+        return self.weights[self.action_index[action]].dot(self._features(state))
+
+    def get_action_distr(self, state, beta=0.2):
+        '''
+        Args:
+            state (State)
+            beta (float): Softmax temperature parameter.
 
-        return np.dot(self.weights, sa_feats)
+        Returns:
+            (numpy array): The i-th float corresponds to the probability
+            mass associated with the i-th action (indexing into self.actions)
+        '''
+        q_vals = self.get_q_values(state)
+        exp_q_vals = np.exp(beta * (q_vals - q_vals.max()))
+        return exp_q_vals / exp_q_vals.sum()
 
     def reset(self):
-        self.weights = np.zeros(self.num_features*len(self.actions))
+        self.weights = np.zeros((len(self.actions), self.num_features))
+        self._reset_buffers()
         QLearningAgent.reset(self)
 
 
 def _rbf(x):
-    return math.exp(-(x)**2)
+    return np.exp(-np.square(x))
@@ -10,7 +10,6 @@ import pdb
 import torch
 import torch.optim as optim
 import torch.nn.functional as F
-from tensorboardX import SummaryWriter
 
 # Other imports.
 from simple_rl.agents.AgentClass import Agent
@@ -18,7 +17,8 @@ from simple_rl.agents.func_approx.ddpg.model import Actor, Critic, OrnsteinUhlen
 from simple_rl.agents.func_approx.ddpg.replay_buffer import ReplayBuffer
 from simple_rl.agents.func_approx.ddpg.hyperparameters import *
 from simple_rl.agents.func_approx.ddpg.utils import *
-from simple_rl.agents.func_approx.dsc.utils import render_sampled_value_function, visualize_next_state_reward_heat_map
+from simple_rl.utils.profiler import profiled
+from simple_rl.utils.metrics import MetricsWriter, GRADIENT_NORM_SAMPLE_RATES
 
 
 class DDPGAgent(Agent):
@@ -61,7 +61,11 @@ class DDPGAgent(Agent):
 
         # Tensorboard logging
         self.writer = None
-        if tensor_log: self.writer = writer if writer is not None else SummaryWriter()
+        if tensor_log:
+            if writer is None:
+                from tensorboardX import SummaryWriter
+                writer = MetricsWriter(SummaryWriter(), sample_rates=GRADIENT_NORM_SAMPLE_RATES)
+            self.writer = writer
 
         self.n_learning_iterations = 0
         self.n_acting_iterations = 0
@@ -98,6 +102,7 @@ class DDPGAgent(Agent):
             experiences = self.replay_buffer.sample(batch_size=self.batch_size)
             self._learn(experiences, GAMMA)
 
+    @profiled("ddpg_learn")
     def _learn(self, experiences, gamma):
         states, actions, rewards, next_states, dones = experiences
         states = torch.FloatTensor(states).to(self.device)
@@ -129,11 +134,12 @@ class DDPGAgent(Agent):
         # Tensorboard logging
         if self.writer is not None:
             self.n_learning_iterations = self.n_learning_iterations + 1
-            self.writer.add_scalar("{}_critic_loss".format(self.name), critic_loss.item(), self.n_learning_iterations)
-            self.writer.add_scalar("{}_actor_loss".format(self.name), actor_loss.item(), self.n_learning_iterations)
-            self.writer.add_scalar("{}_critic_grad_norm".format(self.name), compute_gradient_norm(self.critic), self.n_learning_iterations)
-            self.writer.add_scalar("{}_actor_grad_norm".format(self.name), compute_gradient_norm(self.actor), self.n_learning_iterations)
-            self.writer.add_scalar("{}_sampled_q_values".format(self.name), Q_expected.mean().item(), self.n_learning_iterations)
+            # Tensors (and lazily computed gradient norms) are only synced to the cpu when the metric is flushed
+            self.writer.add_scalar("{}_critic_loss".format(self.name), critic_loss.detach(), self.n_learning_iterations)
+            self.writer.add_scalar("{}_actor_loss".format(self.name), actor_loss.detach(), self.n_learning_iterations)
+            self.writer.add_scalar("{}_critic_grad_norm".format(self.name), lambda: gradient_norm(self.critic), self.n_learning_iterations)
+            self.writer.add_scalar("{}_actor_grad_norm".format(self.name), lambda: gradient_norm(self.actor), self.n_learning_iterations)
+            self.writer.add_scalar("{}_sampled_q_values".format(self.name), Q_expected.detach().mean(), self.n_learning_iterations)
             self.writer.add_scalar("{}_epsilon".format(self.name), self.epsilon, self.n_learning_iterations)
 
     def soft_update(self, local_model, target_model, tau):
@@ -159,10 +165,53 @@ class DDPGAgent(Agent):
         else:
             self.epsilon = max(0., self.epsilon - OPTION_LINEAR_EPS_DECAY)
 
+    def state_dict(self):
+        ''' Networks, optimizers, replay buffer and exploration state (for checkpoints). '''
+        return {"actor": self.actor.state_dict(),
+                "critic": self.critic.state_dict(),
+                "target_actor": self.target_actor.state_dict(),
+                "target_critic": self.target_critic.state_dict(),
+                "actor_optimizer": self.actor_optimizer.state_dict(),
+                "critic_optimizer": self.critic_optimizer.state_dict(),
+                "replay_buffer": self.replay_buffer.state_dict(),
+                "noise": self.noise.x_prev,
+                "epsilon": self.epsilon,
+                "n_learning_iterations": self.n_learning_iterations,
+                "n_acting_iterations": self.n_acting_iterations}
+
+    def load_state_dict(self, state_dict):
+        self.actor.load_state_dict(state_dict["actor"])
+        self.critic.load_state_dict(state_dict["critic"])
+        self.target_actor.load_state_dict(state_dict["target_actor"])
+        self.target_critic.load_state_dict(state_dict["target_critic"])
+        self.actor_optimizer.load_state_dict(state_dict["actor_optimizer"])
+        self.critic_optimizer.load_state_dict(state_dict["critic_optimizer"])
+        self.replay_buffer.load_state_dict(state_dict["replay_buffer"])
+        self.noise.x_prev = state_dict["noise"]
+        self.epsilon = state_dict["epsilon"]
+        self.n_learning_iterations = state_dict["n_learning_iterations"]
+        self.n_acting_iterations = state_dict["n_acting_iterations"]
+
     def get_value(self, state):
         action = self.actor.get_action(state)
         return self.critic.get_q_value(state, action)
 
+    def get_batched_values(self, states):
+        """
+        Args:
+            states (np.ndarray): (N, state_dim) matrix of states
+        Returns:
+            values (np.ndarray): Q(s, pi(s)) of each state, from one forward pass of the actor and the critic
+        """
+        states = torch.FloatTensor(states).to(self.device)
+        self.actor.eval()
+        self.critic.eval()
+        with torch.no_grad():
+            values = self.critic(states, self.actor(states))
+        self.actor.train()
+        self.critic.train()
+        return values.cpu().numpy().ravel()
+
     def get_qvalues(self, states, actions):
         self.critic.eval()
         with torch.no_grad():
@@ -226,6 +275,7 @@ def train(agent, mdp, episodes, steps):
             print('\rEpisode {}\tAverage Score: {:.2f}\tAverage Duration: {:.2f}\tEpsilon: {:.2f}'.format(
             episode, np.mean(last_10_scores), np.mean(last_10_durations), agent.epsilon))
 
+    from simple_rl.agents.func_approx.dsc.utils import visualize_next_state_reward_heat_map
     visualize_next_state_reward_heat_map(agent, args.episodes, args.experiment_name)
 
     return per_episode_scores, per_episode_durations
@@ -279,6 +329,8 @@ if __name__ == "__main__":
     agent_name = overall_mdp.env_name + "_global_ddpg_agent"
     ddpg_agent = DDPGAgent(state_dim, action_dim, args.seed, torch.device(args.device), tensor_log=args.log, name=agent_name)
     episodic_scores, episodic_durations = train(ddpg_agent, overall_mdp, args.episodes, args.steps)
+    if ddpg_agent.writer is not None:
+        ddpg_agent.writer.close()
 
     save_model(ddpg_agent, episode_number=args.episodes, best=False)
     save_all_scores(episodic_scores, episodic_durations, log_dir, args.seed)
@@ -1,27 +1,54 @@
 # Python imports.
-from collections import deque
 import random
 import numpy as np
 
 # Other imports.
 from simple_rl.agents.func_approx.ddpg.hyperparameters import BUFFER_SIZE, BATCH_SIZE
+from simple_rl.agents.func_approx.ddpg.replay_storage import TransitionStore, TransitionView
 
 class ReplayBuffer(object):
+    FIELDS = ("state", "action", "reward", "next_state", "terminal")
+
     def __init__(self, buffer_size=BUFFER_SIZE, name_buffer='', seed=0):
         self.buffer_size = buffer_size
         self.num_exp = 0
-        self.memory = deque(maxlen=buffer_size)
+        # Created on the first transition, once the state/action shapes are known
+        self.store = None
         self.name = name_buffer
 
         self.seed = seed
         random.seed(seed)
         np.random.seed(seed)
 
+    def _make_store(self, state_shape, action_shape):
+        fields = [("state", state_shape, np.float32), ("action", action_shape, np.float32), ("reward", (), np.float32),
+                  ("next_state", state_shape, np.float32), ("terminal", (), bool)]
+        self.store = TransitionStore(fields, self.buffer_size)
+
+    @property
+    def memory(self):
+        ''' (s, a, r, s', terminal) tuples, oldest first. '''
+        return TransitionView(self.store, lambda row: (row["state"], row["action"], float(row["reward"]),
+                                                       row["next_state"], bool(row["terminal"])))
+
+    def columns(self, *names):
+        '''
+        Args:
+            names (str): Fields to read, from ReplayBuffer.FIELDS (all of them if none are given).
+
+        Returns:
+            (dict): Field name -> array of the buffer's transitions, oldest first.
+        '''
+        if self.store is None:
+            return {name: np.empty(0) for name in (names or ReplayBuffer.FIELDS)}
+        return self.store.columns(names or None)
+
     def add(self, state, action, reward, next_state, terminal):
         assert isinstance(state, np.ndarray) and isinstance(action, np.ndarray) and \
                isinstance(reward, (int, float)) and isinstance(next_state, np.ndarray)
-        experience = state, action, reward, next_state, terminal
-        self.memory.append(experience)
+        if self.store is None:
+            self._make_store(np.shape(state), np.shape(action))
+        self.store.append(state=state, action=action, reward=reward, next_state=next_state, terminal=terminal)
         self.num_exp += 1
 
     def size(self):
@@ -31,15 +58,27 @@ class ReplayBuffer(object):
         return self.num_exp
 
     def sample(self, batch_size=BATCH_SIZE):
-        if self.num_exp < batch_size:
-            batch = random.sample(self.memory, self.num_exp)
-        else:
-            batch = random.sample(self.memory, batch_size)
+        batch = self.store.sample(batch_size)
+        return tuple(batch[field] for field in ReplayBuffer.FIELDS)
 
-        state, action, reward, next_state, terminal = map(np.stack, zip(*batch))
+    def state_dict(self):
+        '''
+        Returns:
+            (dict): The buffer's transitions as stacked float32/bool arrays (for checkpoints).
+        '''
+        state_dict = {"num_exp": self.num_exp}
+        if self.store is not None:
+            state_dict.update(self.store.state_dict())
+        return state_dict
 
-        return state, action, reward, next_state, terminal
+    def load_state_dict(self, state_dict):
+        self.clear()
+        if "state" in state_dict:
+            self._make_store(state_dict["state"].shape[1:], state_dict["action"].shape[1:])
+            self.store.load_state_dict(state_dict)
+        self.num_exp = state_dict["num_exp"]
 
     def clear(self):
-        self.memory = deque(maxlen=self.buffer_size)
+        if self.store is not None:
+            self.store.clear()
         self.num_exp = 0
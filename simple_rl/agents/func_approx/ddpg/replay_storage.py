@@ -0,0 +1,305 @@
+'''
+replay_storage.py: Columnar transition storage with an out-of-core tier.
+
+Each TransitionStore keeps its newest transitions in a hot window of NumPy
+arrays and, once the process-wide RAM budget is exceeded, spills the oldest
+hot rows to memory-mapped files (one per field, in the field's dtype).
+Sampling draws uniformly over both tiers. Without a budget nothing is ever
+spilled and the store is simply a ring of NumPy arrays.
+
+Usage:
+    from simple_rl.agents.func_approx.ddpg.replay_storage import configure_replay_storage
+    configure_replay_storage(ram_mb=2048, spill_dir="/scratch/replay")
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+import numpy as np
+
+class RAMBudget(object):
+    ''' Bytes of hot transitions allowed across every TransitionStore of the process. '''
+
+    def __init__(self, limit_bytes=None, spill_dir=None):
+        '''
+        Args:
+            limit_bytes (int): None means unlimited (stores never spill).
+            spill_dir (str): Where memory-mapped files go (a temporary directory if None).
+        '''
+        self.limit_bytes = limit_bytes
+        self.spill_dir = spill_dir
+        self.used_bytes = 0
+        self._stores = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._tmp_dir = None
+
+    def register(self, store):
+        self._stores.add(store)
+
+    def get_spill_dir(self):
+        if self.spill_dir is not None:
+            if not os.path.exists(self.spill_dir):
+                os.makedirs(self.spill_dir)
+            return self.spill_dir
+        if self._tmp_dir is None:
+            self._tmp_dir = tempfile.mkdtemp(prefix="replay_")
+            weakref.finalize(self, shutil.rmtree, self._tmp_dir, True)
+        return self._tmp_dir
+
+    def charge(self, nbytes):
+        ''' Accounts for @nbytes of new hot rows, spilling the largest hot windows while over budget. '''
+        with self._lock:
+            self.used_bytes += nbytes
+            if self.limit_bytes is None:
+                return
+            while self.used_bytes > self.limit_bytes:
+                stores = [store for store in self._stores if store.hot_size() > 0]
+                if len(stores) == 0:
+                    return
+                largest = max(stores, key=lambda store: store.hot_bytes())
+                self.used_bytes -= largest.spill()
+
+    def release(self, nbytes):
+        with self._lock:
+            self.used_bytes -= nbytes
+
+# Process-wide budget shared by all replay buffers.
+ram_budget = RAMBudget()
+
+def configure_replay_storage(ram_mb=None, spill_dir=None):
+    '''
+    Args:
+        ram_mb (float): Hot window budget for all replay buffers of the process, in MB (None = unlimited).
+        spill_dir (str): Directory for the memory-mapped cold tier.
+    '''
+    ram_budget.limit_bytes = None if ram_mb is None else int(ram_mb * 2 ** 20)
+    ram_budget.spill_dir = spill_dir
+
+class TransitionStore(object):
+    ''' Fixed-capacity FIFO of transitions, stored column by column. '''
+
+    # Fraction of the hot window moved to disk per spill.
+    SPILL_FRACTION = 0.25
+    MIN_HOT_CAPACITY = 1024
+
+    def __init__(self, fields, capacity, budget=ram_budget):
+        '''
+        Args:
+            fields (list): (name, shape, dtype) per column, eg. [("state", (6,), np.float32), ("reward", (), np.float32)].
+            capacity (int): Max number of transitions, the oldest are dropped beyond it.
+            budget (RAMBudget)
+        '''
+        self.fields = [(name, tuple(shape), np.dtype(dtype)) for name, shape, dtype in fields]
+        self.capacity = int(capacity)
+        self.budget = budget
+        self.row_nbytes = sum(int(np.prod(shape)) * dtype.itemsize for _, shape, dtype in self.fields)
+
+        # Logical index of every transition ever added; the live ones are [total - len(self), total)
+        self.total = 0
+        # The hot window is a ring: logical indices [hot_start, total) are the hot_count rows from
+        # row hot_begin of the arrays on, wrapping around their end
+        self.hot_start = 0
+        self.hot_begin = self.hot_count = 0
+        self.hot = self._allocate(min(self.MIN_HOT_CAPACITY, self.capacity))
+        # Cold tier: one memmap of `capacity` rows per field, logical index i lives at row i % capacity
+        self.cold = None
+        self.cold_files = []
+
+        budget.register(self)
+        # Bytes of hot rows charged to the budget, given back when the store is garbage collected
+        self._charged = [0]
+        weakref.finalize(self, TransitionStore._cleanup, budget, self.cold_files, self._charged)
+
+    @staticmethod
+    def _cleanup(budget, cold_files, charged):
+        budget.release(charged[0])
+        for file_name in cold_files:
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+    def _allocate(self, rows):
+        return {name: np.empty((rows,) + shape, dtype=dtype) for name, shape, dtype in self.fields}
+
+    def _hot_rows(self):
+        return len(self.hot[self.fields[0][0]])
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def hot_size(self):
+        return self.hot_count
+
+    def hot_bytes(self):
+        return self.hot_size() * self.row_nbytes
+
+    def _hot_slots(self, offsets):
+        ''' Array rows of the hot window rows at @offsets from its oldest row. '''
+        return (self.hot_begin + offsets) % self._hot_rows()
+
+    def _resize_hot(self, rows):
+        hot = self._allocate(rows)
+        slots = self._hot_slots(np.arange(self.hot_count))
+        for name in hot:
+            hot[name][:self.hot_count] = self.hot[name][slots]
+        self.hot = hot
+        self.hot_begin = 0
+
+    def _account(self, nbytes):
+        self._charged[0] += nbytes
+        if nbytes >= 0:
+            self.budget.charge(nbytes)
+        else:
+            self.budget.release(-nbytes)
+
+    def append(self, **values):
+        ''' Adds one transition (a value per field). '''
+        # At capacity the oldest transition goes: a hot one is dropped, a cold one is overwritten when its slot is reused
+        overflow = self.total + 1 - self.capacity - self.hot_start
+        if overflow > 0:
+            self.hot_begin = (self.hot_begin + overflow) % self._hot_rows()
+            self.hot_count -= overflow
+            self.hot_start += overflow
+            self._account(-overflow * self.row_nbytes)
+
+        # Only a window smaller than the capacity can be full here (at capacity the oldest row was just dropped)
+        hot_rows = self._hot_rows()
+        if self.hot_count == hot_rows:
+            self._resize_hot(min(hot_rows * 2, self.capacity))
+
+        slot = (self.hot_begin + self.hot_count) % self._hot_rows()
+        for name, _, _ in self.fields:
+            self.hot[name][slot] = values[name]
+        self.hot_count += 1
+        self.total += 1
+        self._account(self.row_nbytes)
+
+    def _open_cold(self):
+        spill_dir = self.budget.get_spill_dir()
+        self.cold = {}
+        for name, shape, dtype in self.fields:
+            fd, file_name = tempfile.mkstemp(dir=spill_dir, prefix="{}_".format(name), suffix=".{}".format(dtype.name))
+            os.close(fd)
+            self.cold_files.append(file_name)
+            self.cold[name] = np.memmap(file_name, dtype=dtype, mode="w+", shape=(self.capacity,) + shape)
+
+    def spill(self):
+        '''
+        Moves the oldest part of the hot window to the memory-mapped tier. Called by the RAMBudget.
+
+        Returns:
+            (int): Bytes of hot rows released.
+        '''
+        num_rows = max(1, int(self.hot_size() * self.SPILL_FRACTION))
+        if self.cold is None:
+            self._open_cold()
+
+        slots = np.arange(self.hot_start, self.hot_start + num_rows) % self.capacity
+        hot_slots = self._hot_slots(np.arange(num_rows))
+        for name, _, _ in self.fields:
+            self.cold[name][slots] = self.hot[name][hot_slots]
+        self.hot_begin = (self.hot_begin + num_rows) % self._hot_rows()
+        self.hot_count -= num_rows
+        self.hot_start += num_rows
+
+        # Give the memory back once the hot window has shrunk well below its allocation
+        hot_rows = self._hot_rows()
+        if self.hot_size() < hot_rows // 4 and hot_rows > self.MIN_HOT_CAPACITY:
+            self._resize_hot(max(self.MIN_HOT_CAPACITY, hot_rows // 2))
+
+        released = num_rows * self.row_nbytes
+        self._charged[0] -= released
+        return released
+
+    def get(self, indices, names=None):
+        '''
+        Args:
+            indices (np.ndarray): Logical transition indices (within the live window).
+            names (list): Fields to read (all of them if None).
+
+        Returns:
+            (dict): Field name -> array of the requested rows (in the fields' dtypes).
+        '''
+        indices = np.asarray(indices, dtype=np.int64)
+        in_hot = indices >= self.hot_start
+        hot_slots = self._hot_slots(indices[in_hot] - self.hot_start)
+        batch = {}
+        for name, shape, dtype in self.fields:
+            if names is not None and name not in names:
+                continue
+            column = np.empty((len(indices),) + shape, dtype=dtype)
+            column[in_hot] = self.hot[name][hot_slots]
+            if not in_hot.all():
+                column[~in_hot] = self.cold[name][indices[~in_hot] % self.capacity]
+            batch[name] = column
+        return batch
+
+    def sample(self, batch_size):
+        ''' Uniform sample over the live window (without replacement if it is smaller than @batch_size). '''
+        size = len(self)
+        if size <= batch_size:
+            offsets = np.random.permutation(size)
+        else:
+            offsets = np.random.randint(0, size, size=batch_size)
+        return self.get(self.total - size + offsets)
+
+    def __iter__(self):
+        ''' Transitions from oldest to newest, as dicts of rows. '''
+        chunk = 4096
+        for start in range(self.total - len(self), self.total, chunk):
+            batch = self.get(np.arange(start, min(start + chunk, self.total)))
+            for i in range(len(batch[self.fields[0][0]])):
+                yield {name: batch[name][i] for name, _, _ in self.fields}
+
+    def clear(self):
+        self._account(-self._charged[0])
+        self.total = self.hot_start = self.hot_begin = self.hot_count = 0
+        self.hot = self._allocate(min(self.MIN_HOT_CAPACITY, self.capacity))
+
+    def columns(self, names=None):
+        ''' Live transitions as one array per field (all fields if @names is None), oldest first. '''
+        return self.get(np.arange(self.total - len(self), self.total), names)
+
+    def state_dict(self):
+        ''' All live transitions as arrays, oldest first (for checkpoints/pickling). '''
+        return self.columns()
+
+    def load_state_dict(self, state_dict):
+        self.clear()
+        num_rows = min(len(state_dict[self.fields[0][0]]), self.capacity)
+        self.hot = self._allocate(max(num_rows, min(self.MIN_HOT_CAPACITY, self.capacity)))
+        for name, _, _ in self.fields:
+            self.hot[name][:num_rows] = state_dict[name][len(state_dict[name]) - num_rows:]
+        self.total = self.hot_count = num_rows
+        self._account(num_rows * self.row_nbytes)
+
+    def __getstate__(self):
+        # Memory maps and budgets are process-local: pickle the transitions themselves
+        return {"fields": self.fields, "capacity": self.capacity, "transitions": self.state_dict()}
+
+    def __setstate__(self, state):
+        self.__init__(state["fields"], state["capacity"])
+        self.load_state_dict(state["transitions"])
+
+class TransitionView(object):
+    ''' Read-only iterable over a TransitionStore that yields transitions in a buffer's own row format. '''
+
+    def __init__(self, store, make_row):
+        '''
+        Args:
+            store (TransitionStore): None while the buffer is still empty.
+            make_row (function): Maps a dict of field values to the buffer's transition type.
+        '''
+        self.store = store
+        self.make_row = make_row
+
+    def __len__(self):
+        return 0 if self.store is None else len(self.store)
+
+    def __iter__(self):
+        if self.store is None:
+            return iter([])
+        return (self.make_row(row) for row in self.store)
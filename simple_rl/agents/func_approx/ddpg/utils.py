@@ -1,4 +1,5 @@
 import os
+import tempfile
 import torch
 import pickle
 
@@ -64,6 +65,29 @@ def load_model(ddpg_agent, best=True):
     return episode, ddpg_agent
 
 
+def save_checkpoint(checkpoint, file_name):
+    ''' torch.save @checkpoint to a temporary file, then rename it over @file_name (never leaves a partial file). '''
+    dir_name = os.path.dirname(os.path.abspath(file_name))
+    fd, tmp_name = tempfile.mkstemp(dir=dir_name, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, file_name)
+    except:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+def load_checkpoint(file_name, device="cpu"):
+    # Checkpoints hold more than tensors (classifiers, states, schedules)
+    try:
+        return torch.load(file_name, map_location=device, weights_only=False)
+    except TypeError:
+        return torch.load(file_name, map_location=device)
+
+
 def compute_gradient_norm(model):
     total_norm = 0.
     for p in model.parameters():
@@ -73,6 +97,14 @@ def compute_gradient_norm(model):
     return total_norm
 
 
+def gradient_norm(model):
+    """ Same as compute_gradient_norm, but stays on device (no per-parameter .item() syncs). """
+    norms = [p.grad.detach().norm(2) for p in model.parameters() if p.grad is not None]
+    if len(norms) == 0:
+        return torch.zeros(())
+    return torch.norm(torch.stack(norms), 2)
+
+
 def create_log_dir(experiment_name):
     path = os.path.join(os.getcwd(), experiment_name)
     try:
@@ -1,14 +1,9 @@
 import numpy as np
 import random
 from collections import namedtuple, deque
-import matplotlib.pyplot as plt
-import seaborn as sns
-sns.set()
 import pdb
 from copy import deepcopy
-import shutil
 import os
-import time
 import argparse
 import pickle
 
@@ -17,10 +12,12 @@ import torch.optim as optim
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from tensorboardX import SummaryWriter
 
 from simple_rl.agents.AgentClass import Agent
-from simple_rl.agents.func_approx.ddpg.utils import compute_gradient_norm
+from simple_rl.agents.func_approx.ddpg.utils import gradient_norm
+from simple_rl.agents.func_approx.ddpg.replay_storage import TransitionStore, TransitionView
+from simple_rl.utils.profiler import profiled
+from simple_rl.utils.metrics import MetricsWriter, GRADIENT_NORM_SAMPLE_RATES
 
 ## Hyperparameters
 BUFFER_SIZE = int(1e6)  # replay buffer size
@@ -184,7 +181,10 @@ class DQNAgent(Agent):
         self.num_epsilon_updates = 0
 
         if self.tensor_log:
-            self.writer = SummaryWriter() if writer is None else writer
+            if writer is None:
+                from tensorboardX import SummaryWriter
+                writer = MetricsWriter(SummaryWriter(), sample_rates=GRADIENT_NORM_SAMPLE_RATES)
+            self.writer = writer
 
         print("Creating {} with lr={}, ddqn={}, and buffer_sz={}".format(name, self.learning_rate,
                                                                                self.use_ddqn, BUFFER_SIZE))
@@ -286,6 +286,17 @@ class DQNAgent(Agent):
 
         return np.max(action_values.cpu().data.numpy())
 
+    def get_batched_values(self, states):
+        """
+        Args:
+            states (np.ndarray): (N, state_dim) matrix of states
+        Returns:
+            values (np.ndarray): max Q-value over the permissible actions/options of each state (see get_value)
+        """
+        states = torch.from_numpy(states).float().to(self.device)
+        action_values = self.get_batched_qvalues(states)
+        return torch.max(action_values, dim=1)[0].cpu().numpy()
+
     def get_qvalue(self, state, action_idx):
         if not torch.is_tensor(state):
             state = torch.from_numpy(state).float().unsqueeze(0).to(self.device)
@@ -363,6 +374,7 @@ class DQNAgent(Agent):
                     self.writer.add_scalar("NumPositiveTransitions", self.replay_buffer.positive_transitions[-1], self.num_updates)
                 self.num_updates += 1
 
+    @profiled("dqn_learn")
     def _learn(self, experiences, gamma):
         """
         Update value parameters using given batch of experience tuples.
@@ -418,10 +430,10 @@ class DQNAgent(Agent):
         self.optimizer.step()
 
         if self.tensor_log:
-            self.writer.add_scalar("DQN-Loss", loss.item(), self.num_updates)
-            self.writer.add_scalar("DQN-AverageTargetQvalue", Q_targets.mean().item(), self.num_updates)
-            self.writer.add_scalar("DQN-AverageQValue", Q_expected.mean().item(), self.num_updates)
-            self.writer.add_scalar("DQN-GradientNorm", compute_gradient_norm(self.policy_network), self.num_updates)
+            self.writer.add_scalar("DQN-Loss", loss.detach(), self.num_updates)
+            self.writer.add_scalar("DQN-AverageTargetQvalue", Q_targets.detach().mean(), self.num_updates)
+            self.writer.add_scalar("DQN-AverageQValue", Q_expected.detach().mean(), self.num_updates)
+            self.writer.add_scalar("DQN-GradientNorm", lambda: gradient_norm(self.policy_network), self.num_updates)
 
         # ------------------- update target network ------------------- #
         self.soft_update(self.policy_network, self.target_network, TAU)
@@ -444,8 +456,36 @@ class DQNAgent(Agent):
         if self.tensor_log:
             self.writer.add_scalar("DQN-Epsilon", self.epsilon, self.num_epsilon_updates)
 
+    def state_dict(self):
+        """Networks, optimizer, replay buffer and exploration state (for checkpoints)."""
+        return {"policy_network": self.policy_network.state_dict(),
+                "target_network": self.target_network.state_dict(),
+                "optimizer": self.optimizer.state_dict(),
+                "replay_buffer": self.replay_buffer.state_dict(),
+                "epsilon_schedule": self.epsilon_schedule,
+                "epsilon": self.epsilon,
+                "learning_rate": self.learning_rate,
+                "t_step": self.t_step,
+                "num_executions": self.num_executions,
+                "num_updates": self.num_updates,
+                "num_epsilon_updates": self.num_epsilon_updates}
+
+    def load_state_dict(self, state_dict):
+        self.policy_network.load_state_dict(state_dict["policy_network"])
+        self.target_network.load_state_dict(state_dict["target_network"])
+        self.optimizer.load_state_dict(state_dict["optimizer"])
+        self.replay_buffer.load_state_dict(state_dict["replay_buffer"])
+        self.epsilon_schedule = state_dict["epsilon_schedule"]
+        self.epsilon = state_dict["epsilon"]
+        self.learning_rate = state_dict["learning_rate"]
+        self.t_step = state_dict["t_step"]
+        self.num_executions = state_dict["num_executions"]
+        self.num_updates = state_dict["num_updates"]
+        self.num_epsilon_updates = state_dict["num_epsilon_updates"]
+
 class ReplayBuffer:
     """Fixed-size buffer to store experience tuples."""
+    FIELDS = ("state", "action", "reward", "next_state", "done", "num_steps")
 
     def __init__(self, action_size, buffer_size, batch_size, seed, device):
         """
@@ -458,7 +498,9 @@ class ReplayBuffer:
             device (torch.device): cpu / cuda:0 / cuda:1
         """
         self.action_size = action_size
-        self.memory = deque(maxlen=buffer_size)
+        self.buffer_size = buffer_size
+        # Created on the first experience, once the state shape is known
+        self.store = None
         self.batch_size = batch_size
         self.experience = namedtuple("Experience", field_names=["state", "action", "reward", "next_state", "done", "num_steps"])
         self.seed = random.seed(seed)
@@ -466,6 +508,28 @@ class ReplayBuffer:
 
         self.positive_transitions = []
 
+    def _make_store(self, state_shape):
+        fields = [("state", state_shape, np.float32), ("action", (), np.int64), ("reward", (), np.float32),
+                  ("next_state", state_shape, np.float32), ("done", (), bool), ("num_steps", (), np.int32)]
+        self.store = TransitionStore(fields, self.buffer_size)
+
+    @property
+    def memory(self):
+        """Experience namedtuples, oldest first."""
+        return TransitionView(self.store, lambda row: self.experience(row["state"], int(row["action"]), float(row["reward"]),
+                                                                      row["next_state"], bool(row["done"]), int(row["num_steps"])))
+
+    def columns(self, *names):
+        """
+        Args:
+            names (str): Fields to read, from ReplayBuffer.FIELDS (all of them if none are given).
+        Returns:
+            (dict): Field name -> array of the buffer's experiences, oldest first
+        """
+        if self.store is None:
+            return {name: np.empty(0) for name in (names or ReplayBuffer.FIELDS)}
+        return self.store.columns(names or None)
+
     def add(self, state, action, reward, next_state, done, num_steps):
         """
         Add new experience to memory.
@@ -477,30 +541,46 @@ class ReplayBuffer:
             done (bool)
             num_steps (int): number of steps taken by the action/option to terminate
         """
-        e = self.experience(state, action, reward, next_state, done, num_steps)
-        self.memory.append(e)
+        if self.store is None:
+            self._make_store(np.shape(state))
+        self.store.append(state=state, action=action, reward=reward, next_state=next_state, done=done, num_steps=num_steps)
 
     def sample(self, batch_size=None):
         """Randomly sample a batch of experiences from memory."""
         size = self.batch_size if batch_size is None else batch_size
-        experiences = random.sample(self.memory, k=size)
+        batch = self.store.sample(size)
 
         # Log the number of times we see a non-negative reward (should be sparse)
-        num_positive_transitions = sum([exp.reward >= 0 for exp in experiences])
+        num_positive_transitions = int((batch["reward"] >= 0).sum())
         self.positive_transitions.append(num_positive_transitions)
 
-        states = torch.from_numpy(np.vstack([e.state for e in experiences if e is not None])).float().to(self.device)
-        actions = torch.from_numpy(np.vstack([e.action for e in experiences if e is not None])).long().to(self.device)
-        rewards = torch.from_numpy(np.vstack([e.reward for e in experiences if e is not None])).float().to(self.device)
-        next_states = torch.from_numpy(np.vstack([e.next_state for e in experiences if e is not None])).float().to(self.device)
-        dones = torch.from_numpy(np.vstack([e.done for e in experiences if e is not None]).astype(np.uint8)).float().to(self.device)
-        steps = torch.from_numpy(np.vstack([e.num_steps for e in experiences if e is not None])).float().to(self.device)
+        states = torch.from_numpy(batch["state"]).float().to(self.device)
+        actions = torch.from_numpy(batch["action"]).unsqueeze(1).long().to(self.device)
+        rewards = torch.from_numpy(batch["reward"]).unsqueeze(1).float().to(self.device)
+        next_states = torch.from_numpy(batch["next_state"]).float().to(self.device)
+        dones = torch.from_numpy(batch["done"].astype(np.uint8)).unsqueeze(1).float().to(self.device)
+        steps = torch.from_numpy(batch["num_steps"]).unsqueeze(1).float().to(self.device)
 
         return states, actions, rewards, next_states, dones, steps
 
     def __len__(self):
         """Return the current size of internal memory."""
-        return len(self.memory)
+        return 0 if self.store is None else len(self.store)
+
+    def state_dict(self):
+        """Experiences as stacked arrays, one per field (for checkpoints)."""
+        state_dict = {"positive_transitions": np.array(self.positive_transitions, dtype=np.int32)}
+        if self.store is not None:
+            state_dict.update(self.store.state_dict())
+        return state_dict
+
+    def load_state_dict(self, state_dict):
+        if self.store is not None:
+            self.store.clear()
+        if "state" in state_dict:
+            self._make_store(state_dict["state"].shape[1:])
+            self.store.load_state_dict(state_dict)
+        self.positive_transitions = state_dict["positive_transitions"].tolist()
 
 def train(agent, mdp, episodes, steps):
     per_episode_scores = []
@@ -583,4 +663,6 @@ if __name__ == '__main__':
                           trained_options=[], seed=args.seed,
                           name="GlobalDDQN", lr=learning_rate, tensor_log=False, use_double_dqn=True)
     ddqn_episode_scores = train(ddqn_agent, overall_mdp, args.episodes, args.steps)
+    if ddqn_agent.tensor_log:
+        ddqn_agent.writer.close()
     save_all_scores(args.experiment_name, logdir, args.seed, ddqn_episode_scores)
@@ -0,0 +1,130 @@
+# Python imports.
+from __future__ import print_function
+import weakref
+import numpy as np
+
+
+class ClassifierSnapshot(object):
+	"""Prediction-only copy of a fitted RBF `SVC`/`OneClassSVM`.
+
+	Keeps the support vectors, dual coefficients, intercept and gamma as float32 arrays, which is all
+	that decision_function needs:
+		decision_function(x) = sum_i dual_coef[i] * exp(-gamma * ||x - sv_i||^2) + intercept
+	"""
+
+	# Rows of X per kernel block, bounds the (rows x n_support_vectors) kernel matrix on large meshes
+	CHUNK_SIZE = 4096
+
+	def __init__(self, clf):
+		"""
+		Args:
+			clf (svm.SVC or svm.OneClassSVM): fitted, rbf kernel
+		"""
+		self.kind = type(clf).__name__
+		self.support_vectors = np.asarray(clf.support_vectors_, dtype=np.float32)
+		self.dual_coef = np.asarray(clf.dual_coef_, dtype=np.float32).ravel()
+		self.intercept = np.float32(clf.intercept_[0])
+		self.gamma = np.float32(clf._gamma)
+		# Only SVC has labels, OneClassSVM predicts +1 (inlier) / -1 (outlier)
+		self.classes = np.array(clf.classes_) if hasattr(clf, "classes_") else np.array([-1, 1])
+
+	@staticmethod
+	def supports(clf):
+		return type(clf).__name__ in ("SVC", "OneClassSVM") and clf.kernel == "rbf" and len(getattr(clf, "classes_", [-1, 1])) == 2
+
+	def decision_function(self, X):
+		X = np.asarray(X, dtype=np.float64)
+		if X.ndim == 1:
+			X = X.reshape(1, -1)
+		sv = self.support_vectors.astype(np.float64)
+		sv_sq_norms = (sv ** 2).sum(axis=1)
+		decisions = np.empty(X.shape[0])
+		for start in range(0, X.shape[0], ClassifierSnapshot.CHUNK_SIZE):
+			x = X[start:start + ClassifierSnapshot.CHUNK_SIZE]
+			sq_dists = (x ** 2).sum(axis=1)[:, None] + sv_sq_norms[None, :] - 2. * x.dot(sv.T)
+			kernel = np.exp(-float(self.gamma) * np.maximum(sq_dists, 0.))
+			decisions[start:start + len(x)] = kernel.dot(self.dual_coef) + self.intercept
+		return decisions
+
+	def predict(self, X):
+		return self.classes[(self.decision_function(X) > 0).astype(int)]
+
+
+class ClassifierStore(object):
+	"""Stores each fitted classifier once, as a ClassifierSnapshot, under an integer version.
+
+	Options refit by building new classifier objects, so object identity is the classifier version:
+	episodes without a refit map to the version already stored. Classifiers that cannot be reduced
+	(eg. EllipticEnvelope from the old training code) are stored as they are.
+	"""
+
+	def __init__(self):
+		self.snapshots = {}
+		# Live classifier -> version, weak so the store never keeps a replaced classifier alive
+		self.versions = weakref.WeakKeyDictionary()
+
+	def __len__(self):
+		return len(self.snapshots)
+
+	def __getstate__(self):
+		# Weak references cannot be pickled; the versions of restored live classifiers are set again with set_version
+		return {'snapshots' : self.snapshots}
+
+	def __setstate__(self, state):
+		self.snapshots = state['snapshots']
+		self.versions = weakref.WeakKeyDictionary()
+
+	def add(self, clf):
+		"""
+		Args:
+			clf: fitted classifier (or None)
+
+		Returns:
+			version (int): key of the classifier's snapshot in self.snapshots (None for None)
+		"""
+		if clf is None:
+			return None
+		if clf in self.versions:
+			return self.versions[clf]
+
+		version = len(self.snapshots)
+		self.snapshots[version] = ClassifierSnapshot(clf) if ClassifierSnapshot.supports(clf) else clf
+		self.versions[clf] = version
+		return version
+
+	def get_version(self, clf):
+		"""Version of the live classifier `clf`, None if it was never added (or is None)."""
+		if clf is None:
+			return None
+		return self.versions.get(clf)
+
+	def set_version(self, clf, version):
+		"""Map the live classifier `clf` to its already stored `version` (eg. after both were restored from a checkpoint)."""
+		if clf is not None:
+			self.versions[clf] = version
+
+	def snapshots_since(self, num_versions):
+		"""Snapshots added after the first `num_versions` ones."""
+		return {version : self.snapshots[version] for version in range(num_versions, len(self.snapshots))}
+
+
+def rehydrate_clfs_bounds(clfs_bounds, snapshots):
+	"""Replace classifier versions in a `clfs_bounds` dict (clf name -> version) with their predictors."""
+	if snapshots is None:
+		return clfs_bounds
+	return {clf_name : snapshots[clf] if isinstance(clf, (int, np.integer)) else clf for clf_name, clf in clfs_bounds.items()}
+
+
+def rehydrate_option_data(option_data, snapshots):
+	"""
+	Args:
+		option_data (dict): option name -> episode -> {'clfs_bounds' : {clf name : version}}
+		snapshots (dict): version -> ClassifierSnapshot, as saved under 'classifier_snapshots'
+
+	Returns:
+		option_data with every version replaced by an object with predict/decision_function
+		(runs saved before the store already hold the sklearn classifiers and are returned unchanged)
+	"""
+	return {option_name : {episode : dict(episode_data, clfs_bounds=rehydrate_clfs_bounds(episode_data['clfs_bounds'], snapshots))
+						   for episode, episode_data in option.items()}
+			for option_name, option in option_data.items()}
@@ -0,0 +1,251 @@
+# Python imports.
+from __future__ import print_function
+import multiprocessing as mp
+import pickle
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+import numpy as np
+import torch
+
+# Other imports.
+from simple_rl.agents.func_approx.dsc.OptionClass import Option
+from simple_rl.agents.func_approx.ddpg.model import Actor
+from simple_rl.agents.func_approx.dqn.DQNAgentClass import DQNAgent, QNetwork
+
+
+def run_evaluation_episode(mdp, trained_options, agent_over_options, max_steps, seed=None, render=False):
+	"""Execute options when possible and then atomic actions, picking them with the evaluation epsilon.
+
+	Args:
+		mdp (MDP)
+		trained_options (list): options indexed by the outputs of agent_over_options
+		agent_over_options (DQNAgent)
+		max_steps (int)
+		seed (int): reseeds the random generators before the reset, which fixes the start state (None leaves them)
+		render (bool)
+
+	Returns:
+		overall_reward (float): score accumulated over the course of the episode
+		num_steps (int)
+		option_trajectories (list): one list of (option idx, State) per option execution
+	"""
+	if seed is not None:
+		random.seed(seed)
+		np.random.seed(seed)
+		torch.manual_seed(seed)
+	mdp.reset()
+	state = deepcopy(mdp.init_state)
+	overall_reward = 0.
+	mdp.render = render
+	num_steps = 0
+	option_trajectories = []
+
+	while not state.is_terminal() and num_steps < max_steps:
+		selected_option = trained_options[agent_over_options.act(state.features(), train_mode=False)]
+
+		option_reward, next_state, num_steps, option_state_trajectory = selected_option.trained_option_execution(mdp, num_steps)
+		overall_reward += option_reward
+
+		# option_state_trajectory is a list of (o, s) tuples
+		option_trajectories.append(option_state_trajectory)
+
+		state = next_state
+
+	return overall_reward, num_steps, option_trajectories
+
+
+def make_evaluation_snapshot(trained_options, agent_over_options):
+	"""Frozen copy of the options and the policy over options, as pickled bytes taken at call time.
+
+	Args:
+		trained_options (list)
+		agent_over_options (DQNAgent)
+
+	Returns:
+		(bytes): loaded by load_evaluation_snapshot
+	"""
+	# Parents decide where their children terminate, so untrained ancestors come along too
+	options = []
+	for option in trained_options:
+		while option is not None and option not in options:
+			options.append(option)
+			option = option.parent
+
+	policy_network = agent_over_options.policy_network.state_dict()
+	snapshot = {'options' : [option.evaluation_state_dict() for option in options],
+				'trained_options' : [option.name for option in trained_options],
+				'agent_over_options' : {'state_size' : agent_over_options.state_size,
+										'evaluation_epsilon' : agent_over_options.evaluation_epsilon,
+										'policy_network' : {name : tensor.detach().cpu() for name, tensor in policy_network.items()}}}
+	return pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class FrozenSolver(object):
+	"""Greedy policy of an option's solver, with the act() signature trained_option_execution uses."""
+
+	def __init__(self, network, discrete_actions):
+		"""
+		Args:
+			network (Actor/QNetwork): actor of a DDPGAgent or policy network of a DQNAgent
+			discrete_actions (bool)
+		"""
+		self.network = network
+		self.discrete_actions = discrete_actions
+		self.network.eval()
+
+	def act(self, state, evaluation_mode=True):
+		if self.discrete_actions:
+			with torch.no_grad():
+				action_values = self.network(torch.from_numpy(np.asarray(state)).float().unsqueeze(0))
+			return int(torch.argmax(action_values, dim=1)[0])
+		with torch.no_grad():
+			return np.clip(self.network.get_action(state), -1., 1.)
+
+
+def load_evaluation_snapshot(snapshot, mdp, agent_over_options=None):
+	"""Rebuild the options and policy over options of a snapshot to run in `mdp`.
+
+	Args:
+		snapshot (bytes): as returned by make_evaluation_snapshot
+		mdp (MDP): the evaluating process' own instance of the domain
+		agent_over_options (DQNAgent): reused (with new weights) when it already has the snapshot's number of outputs
+
+	Returns:
+		trained_options (list)
+		agent_over_options (DQNAgent)
+	"""
+	snapshot = pickle.loads(snapshot)
+	state_size, action_size = mdp.state_space_size(), mdp.action_space_size()
+
+	options = {}
+	for option_state in snapshot['options']:
+		# Only what the evaluation reads is restored; solvers are frozen networks on the CPU
+		option = Option.__new__(Option)
+		vars(option).update(option_state['attributes'])
+		option.overall_mdp = mdp
+		option.writer = None
+		option.device = torch.device("cpu")
+		option.global_solver = None
+		if option.discrete_actions:
+			network = QNetwork(state_size, action_size, option.seed)
+		else:
+			network = Actor(state_size, action_size)
+		network.load_state_dict(option_state['policy'])
+		option.solver = FrozenSolver(network, option.discrete_actions)
+		options[option.name] = option
+	for option_state in snapshot['options']:
+		parent = option_state['parent']
+		options[option_state['attributes']['name']].parent = None if parent is None else options[parent]
+
+	trained_options = [options[name] for name in snapshot['trained_options']]
+	policy = snapshot['agent_over_options']
+	if agent_over_options is None or agent_over_options.action_size != len(trained_options):
+		agent_over_options = DQNAgent(policy['state_size'], len(trained_options), trained_options, seed=0,
+									  device=torch.device("cpu"), name="GlobalDQN (evaluation)",
+									  evaluation_epsilon=policy['evaluation_epsilon'])
+	agent_over_options.trained_options = trained_options
+	agent_over_options.evaluation_epsilon = policy['evaluation_epsilon']
+	agent_over_options.policy_network.load_state_dict(policy['policy_network'])
+	return trained_options, agent_over_options
+
+
+# State of an evaluation process: its MDP and the last snapshot it loaded
+_evaluator = {}
+
+def _init_evaluator(mdp_factory, max_steps):
+	# Several evaluators share the machine with the trainer, one thread each
+	torch.set_num_threads(1)
+	_evaluator['mdp'] = mdp_factory()
+	_evaluator['max_steps'] = max_steps
+	_evaluator['snapshot_id'] = None
+	_evaluator['agent_over_options'] = None
+
+def _evaluate(snapshot_id, snapshot, seed):
+	if _evaluator['snapshot_id'] != snapshot_id:
+		_evaluator['trained_options'], _evaluator['agent_over_options'] = load_evaluation_snapshot(
+			snapshot, _evaluator['mdp'], _evaluator['agent_over_options'])
+		_evaluator['snapshot_id'] = snapshot_id
+	score, num_steps, _ = run_evaluation_episode(_evaluator['mdp'], _evaluator['trained_options'],
+												 _evaluator['agent_over_options'], _evaluator['max_steps'], seed=seed)
+	return score, num_steps
+
+
+class EvaluationWorker(object):
+	"""
+	Evaluates the policy over options in background processes, each with its own instance of the MDP.
+
+	submit() freezes the options and agent_over_options (see make_evaluation_snapshot) and queues one evaluation
+	episode per seed; the seeds fix the start states, so every evaluation uses the same ones.
+	The episodes of an evaluation run in parallel over the processes, and training never waits for them:
+	poll() returns the evaluations that have finished, in submission order. When more than `max_pending`
+	evaluations are outstanding, new ones are dropped instead of queued.
+	"""
+
+	def __init__(self, mdp_factory, max_steps, num_workers=1, num_episodes=1, seed=0, max_pending=4):
+		"""
+		Args:
+			mdp_factory (callable): picklable, builds the MDP in each process (e.g. functools.partial(PointMazeMDP, seed=0))
+			max_steps (int): steps allowed per evaluation episode
+			num_workers (int): evaluation processes
+			num_episodes (int): episodes (and start states) per evaluation
+			seed (int): seed of the first episode, the others use the following ones
+			max_pending (int): evaluations allowed to wait before new ones are dropped
+		"""
+		self.seeds = [seed + i for i in range(num_episodes)]
+		self.max_pending = max_pending
+		self.pending = deque()	# (episode, futures)
+		self.num_submitted = 0
+		self.num_dropped = 0
+		self.num_failed = 0
+
+		# Spawn (not fork) so the evaluators never inherit torch/CUDA state from the trainer
+		self.pool = ProcessPoolExecutor(max_workers=num_workers, mp_context=mp.get_context("spawn"),
+										initializer=_init_evaluator, initargs=(mdp_factory, max_steps))
+
+	def submit(self, episode, trained_options, agent_over_options):
+		"""Queue an evaluation of the current options for training `episode` without waiting for it."""
+		self.num_submitted += 1
+		if len(self.pending) >= self.max_pending:
+			self.num_dropped += 1
+			return
+		snapshot = make_evaluation_snapshot(trained_options, agent_over_options)
+		try:
+			futures = [self.pool.submit(_evaluate, self.num_submitted, snapshot, seed) for seed in self.seeds]
+		except RuntimeError as e:	# the pool broke (an evaluator died) or was shut down
+			print("|-> EvaluationWorker: could not submit evaluation of episode {} ({})".format(episode, e))
+			self.num_failed += 1
+			return
+		self.pending.append((episode, futures))
+
+	def poll(self, wait=False):
+		"""
+		Args:
+			wait (bool): whether to wait for every pending evaluation
+
+		Returns:
+			(list): (episode, scores, durations) of the finished evaluations, in submission order
+		"""
+		results = []
+		while len(self.pending) > 0:
+			episode, futures = self.pending[0]
+			if not wait and not all(future.done() for future in futures):
+				break
+			self.pending.popleft()
+			try:
+				scores, durations = zip(*[future.result() for future in futures])
+			except Exception as e:
+				print("|-> EvaluationWorker: evaluation of episode {} failed ({!r})".format(episode, e))
+				self.num_failed += 1
+				continue
+			results.append((episode, list(scores), list(durations)))
+		return results
+
+	def close(self):
+		"""Wait for the pending evaluations and stop the evaluators. Returns their results (see poll)."""
+		results = self.poll(wait=True)
+		self.pool.shutdown(wait=True)
+		print("|-> EvaluationWorker: {} of {} evaluations done ({} dropped, {} failed)".format(
+			self.num_submitted - self.num_dropped - self.num_failed, self.num_submitted, self.num_dropped, self.num_failed))
+		return results
@@ -0,0 +1,112 @@
+# Python imports.
+from __future__ import print_function
+import os
+import tempfile
+import weakref
+import numpy as np
+
+
+class MeshPredictionCache(object):
+	"""Memoized initiation-set masks of classifiers on plotting meshes.
+
+	A classifier stored in a ClassifierStore never changes once fitted, so its mask on a given mesh is
+	computed once and reused by every plot of every episode that still holds that classifier version.
+	Masks are kept bit-packed (one bit per mesh point, 1300x1300 HD mesh -> ~206 KB) under
+	(classifier version, mesh key) and can be saved next to the run as `mesh_masks.npz`, so offline
+	plotting of a finished run only pays for contouring.
+
+	Classifiers that are not versions in `snapshots` (eg. runs saved before the classifier store) are
+	memoized per object for the lifetime of the cache, but not saved.
+	"""
+
+	FILE_NAME = "mesh_masks.npz"
+
+	def __init__(self, snapshots=None):
+		"""
+		Args:
+			snapshots (dict): version -> predictor, eg. ClassifierStore.snapshots (shared, not copied)
+		"""
+		self.snapshots = snapshots if snapshots is not None else {}
+		self.masks = {}		# (version, mesh key) -> packed mask
+		self.object_masks = weakref.WeakKeyDictionary()		# unversioned classifier -> mesh key -> packed mask
+		self.num_hits = 0
+		self.num_misses = 0
+
+	def __len__(self):
+		return len(self.masks)
+
+	@staticmethod
+	def mesh_key(x_mesh, y_mesh):
+		"""Spec of a regular meshgrid: its shape and corner coordinates."""
+		return "{}x{}_{:.6g}_{:.6g}_{:.6g}_{:.6g}".format(x_mesh.shape[0], x_mesh.shape[1], x_mesh.min(), x_mesh.max(),
+														   y_mesh.min(), y_mesh.max())
+
+	@staticmethod
+	def _predict(clf, x_mesh, y_mesh):
+		mask = clf.predict(np.c_[x_mesh.ravel(), y_mesh.ravel()]) > 0
+		return np.packbits(mask)
+
+	def get_mask(self, clf, x_mesh, y_mesh, mesh_key=None):
+		"""
+		Args:
+			clf: classifier version in self.snapshots, or a fitted classifier
+			x_mesh (np.ndarray)
+			y_mesh (np.ndarray)
+			mesh_key (str): MeshPredictionCache.mesh_key(x_mesh, y_mesh), when already known
+
+		Returns:
+			mask (np.ndarray): boolean, with the mesh's shape, True where clf predicts the positive class
+		"""
+		if mesh_key is None:
+			mesh_key = MeshPredictionCache.mesh_key(x_mesh, y_mesh)
+
+		if isinstance(clf, (int, np.integer)):
+			masks, key, predictor = self.masks, (int(clf), mesh_key), self.snapshots[clf]
+		else:
+			masks, key, predictor = self.object_masks.setdefault(clf, {}), mesh_key, clf
+
+		packed = masks.get(key)
+		if packed is None:
+			self.num_misses += 1
+			packed = masks[key] = MeshPredictionCache._predict(predictor, x_mesh, y_mesh)
+		else:
+			self.num_hits += 1
+		return np.unpackbits(packed, count=x_mesh.size).reshape(x_mesh.shape).astype(bool)
+
+	def get_masks(self, clfs_bounds, x_mesh, y_mesh):
+		"""
+		Args:
+			clfs_bounds (dict): clf name -> version or classifier
+
+		Returns:
+			(dict): clf name -> boolean mask with the mesh's shape
+		"""
+		mesh_key = MeshPredictionCache.mesh_key(x_mesh, y_mesh)
+		return {clf_name : self.get_mask(clf, x_mesh, y_mesh, mesh_key) for clf_name, clf in clfs_bounds.items()}
+
+	def save(self, data_dir):
+		"""Write the versioned masks to `{data_dir}/mesh_masks.npz`, keeping masks already saved there by other processes."""
+		if len(self.masks) == 0:
+			return
+		path = os.path.join(data_dir, MeshPredictionCache.FILE_NAME)
+		arrays = MeshPredictionCache._read(path)
+		arrays.update({"{}@{}".format(version, mesh_key) : packed for (version, mesh_key), packed in self.masks.items()})
+
+		fd, tmp_name = tempfile.mkstemp(dir=data_dir, prefix=".tmp_", suffix=".npz")
+		with os.fdopen(fd, "wb") as f:
+			np.savez(f, **arrays)
+		os.replace(tmp_name, path)
+
+	def load(self, data_dir):
+		"""Add the masks saved in `{data_dir}/mesh_masks.npz` (if any) to the cache."""
+		for name, packed in MeshPredictionCache._read(os.path.join(data_dir, MeshPredictionCache.FILE_NAME)).items():
+			version, mesh_key = name.split("@", 1)
+			self.masks.setdefault((int(version), mesh_key), packed)
+		return self
+
+	@staticmethod
+	def _read(path):
+		if not os.path.exists(path):
+			return {}
+		with np.load(path) as data:
+			return {name : data[name] for name in data.files}
@@ -7,37 +7,26 @@ from copy import deepcopy
 import torch
 from pathlib import Path
 
-from sklearn import svm
-from sklearn.covariance import EllipticEnvelope
 import itertools
-from scipy.spatial import distance
-
-# TODO: additional imports 
-from sklearn.calibration import CalibratedClassifierCV
-from sklearn.linear_model import LogisticRegressionCV as LRCV
-from sklearn.model_selection import train_test_split
-
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
-import matplotlib.patches as mpatches
-import matplotlib.cm as cm
-import seaborn as sns
-import pandas as pd
-
-# sns.set(color_codes=True)
-sns.set_style("white")
-
-# Debugging imports
-import inspect
 
 # Other imports.
 from simple_rl.mdp.StateClass import State
 from simple_rl.agents.func_approx.ddpg.DDPGAgentClass import DDPGAgent
 from simple_rl.agents.func_approx.dqn.DQNAgentClass import DQNAgent
 from simple_rl.agents.func_approx.dsc.utils import Experience
+from simple_rl.utils.profiler import profiler, profiled
 
 class Option(object):
 
+	# Live objects that are rebuilt (or relinked) rather than saved in checkpoints
+	UNSAVED_ATTRIBUTES = ("overall_mdp", "writer", "device", "solver", "global_solver", "parent")
+	# What is_init_true, is_term_true and trained_option_execution read, frozen for evaluation workers
+	EVALUATION_ATTRIBUTES = ("name", "option_idx", "seed", "episode", "use_old", "discrete_actions", "max_steps", "timeout",
+							 "num_goal_hits", "num_subgoal_hits_required", "initiation_period",
+							 "initiation_classifier", "optimistic_classifier", "pessimistic_classifier")
+	# Classifiers versioned in SkillChaining's ClassifierStore
+	CLASSIFIER_ATTRIBUTES = ("initiation_classifier", "optimistic_classifier", "pessimistic_classifier")
+
 	def __init__(self, overall_mdp, name, global_solver, lr_actor, lr_critic, lr_dqn, ddpg_batch_size, classifier_type="ocsvm",
 				 subgoal_reward=0., max_steps=20000, seed=0, parent=None, num_subgoal_hits_required=3, buffer_length=20,
 				 dense_reward=False, enable_timeout=True, timeout=100, initiation_period=2,
@@ -197,6 +186,58 @@ class Option(object):
 	def update_episode(self, episode):
 		self.episode = episode
 
+	def state_dict(self, classifier_store=None):
+		"""
+		Everything needed to restore this option in a new process (see SkillChaining.save_checkpoint).
+		Args:
+			classifier_store (ClassifierStore): store whose versions of this option's classifiers are saved too
+		Returns:
+			(dict): solver state, parent option name, classifier versions and all other attributes except the mdp, writer and device
+		"""
+		attributes = {name : value for name, value in vars(self).items() if name not in Option.UNSAVED_ATTRIBUTES}
+		state_dict = {'attributes' : attributes,
+					  'parent' : None if self.parent is None else self.parent.name,
+					  'solver' : self.solver.state_dict(),
+					  'classifier_versions' : {}}
+		if classifier_store is not None:
+			for name in Option.CLASSIFIER_ATTRIBUTES:
+				version = classifier_store.get_version(getattr(self, name))
+				if version is not None:
+					state_dict['classifier_versions'][name] = version
+		# The global solver belongs to the global option, the others only hold a reference to it
+		if self.name == "global_option":
+			state_dict['global_solver'] = self.global_solver.state_dict()
+		return state_dict
+
+	def load_state_dict(self, state_dict, options, classifier_store=None):
+		"""
+		Args:
+			state_dict (dict): as returned by state_dict()
+			options (dict): option name -> Option, used to relink the parent
+			classifier_store (ClassifierStore): restored store, told the saved versions of the restored classifiers
+				so that they are not stored again
+		"""
+		for name, value in state_dict['attributes'].items():
+			setattr(self, name, value)
+		if classifier_store is not None:
+			for name, version in state_dict.get('classifier_versions', {}).items():
+				classifier_store.set_version(getattr(self, name), version)
+		self.parent = None if state_dict['parent'] is None else options[state_dict['parent']]
+		self.solver.load_state_dict(state_dict['solver'])
+		if 'global_solver' in state_dict:
+			self.global_solver.load_state_dict(state_dict['global_solver'])
+
+	def evaluation_state_dict(self):
+		"""
+		What executing this option greedily needs in another process (see EvaluationWorker).
+		Returns:
+			(dict): EVALUATION_ATTRIBUTES, parent option name and a CPU copy of the solver's policy network
+		"""
+		network = self.solver.policy_network if self.discrete_actions else self.solver.actor
+		return {'attributes' : {name : getattr(self, name) for name in Option.EVALUATION_ATTRIBUTES},
+				'parent' : None if self.parent is None else self.parent.name,
+				'policy' : {name : tensor.detach().cpu().clone() for name, tensor in network.state_dict().items()}}
+
 	def get_training_phase(self):
 		if self.num_goal_hits < self.num_subgoal_hits_required:
 			return "gestation"
@@ -213,13 +254,14 @@ class Option(object):
 			my_param.data.copy_(global_param.data)
 
 		# Not using off_policy_update() because we have numpy arrays not state objects here
-		for state, action, reward, next_state, done, _ in self.global_solver.replay_buffer.memory:
+		transitions = self.global_solver.replay_buffer.columns("state", "action", "next_state", "done")
+		for state, action, next_state, done in zip(transitions["state"], transitions["action"], transitions["next_state"], transitions["done"]):
 			if self.is_init_true(state):
 				if self.is_term_true(next_state):
-					self.solver.step(state, action, self.subgoal_reward, next_state, True, -1)
+					self.solver.step(state, int(action), self.subgoal_reward, next_state, True, -1)
 				else:
 					subgoal_reward = self.get_subgoal_reward(next_state)
-					self.solver.step(state, action, subgoal_reward, next_state, done, -1)
+					self.solver.step(state, int(action), subgoal_reward, next_state, bool(done), -1)
 
 	def initialize_with_global_ddpg(self):		
 		for my_param, global_param in zip(self.solver.actor.parameters(), self.global_solver.actor.parameters()):
@@ -232,13 +274,14 @@ class Option(object):
 			my_param.data.copy_(global_param.data)
 
 		# Not using off_policy_update() because we have numpy arrays not state objects here
-		for state, action, reward, next_state, done in self.global_solver.replay_buffer.memory:
+		transitions = self.global_solver.replay_buffer.columns("state", "action", "next_state", "terminal")
+		for state, action, next_state, done in zip(transitions["state"], transitions["action"], transitions["next_state"], transitions["terminal"]):
 			if self.is_init_true(state):
 				if self.is_term_true(next_state):
 					self.solver.step(state, action, self.subgoal_reward, next_state, True)
 				else:
 					subgoal_reward = self.get_subgoal_reward(next_state)
-					self.solver.step(state, action, subgoal_reward, next_state, done)
+					self.solver.step(state, action, subgoal_reward, next_state, bool(done))
 
 	def batched_is_init_true(self, state_matrix):
 		if self.name == "global_option":
@@ -380,6 +423,7 @@ class Option(object):
 
 	# TODO: old
 	def train_one_class_svm(self):
+		from sklearn import svm
 		assert len(self.positive_examples) == self.num_subgoal_hits_required, "Expected init data to be a list of lists"
 		self.X = positive_feature_matrix = self.construct_feature_matrix(self.positive_examples)
 
@@ -389,6 +433,7 @@ class Option(object):
 
 	# TODO: old
 	def train_elliptic_envelope_classifier(self):
+		from sklearn.covariance import EllipticEnvelope
 		assert len(self.positive_examples) == self.num_subgoal_hits_required, "Expected init data to be a list of lists"
 		positive_feature_matrix = self.construct_feature_matrix(self.positive_examples)
 
@@ -397,6 +442,7 @@ class Option(object):
 
 	# TODO: old
 	def train_two_class_classifier(self):
+		from sklearn import svm
 		positive_feature_matrix = self.construct_feature_matrix(self.positive_examples)
 		if self.negative_examples == []:
 			self.negative_examples.append(self.get_neg_examples(1)) # TODO: edge case where there's no negative samples, just add 1 at random
@@ -561,6 +607,7 @@ class Option(object):
 				subgoal_reward = self.get_subgoal_reward(s_prime)
 				self.solver.step(s.features(), a, subgoal_reward, s_prime.features(), False)
 
+	@profiled("execute_option_in_mdp")
 	def execute_option_in_mdp(self, mdp, step_number, episode=None):
 		"""
 		Option main control loop.
@@ -592,7 +639,8 @@ class Option(object):
 				else:
 					action = self.solver.act(state.features(), evaluation_mode=False)
 
-				reward, next_state = mdp.execute_agent_action(action, option_idx=self.option_idx)
+				with profiler.phase("mdp_step", self.name):
+					reward, next_state = mdp.execute_agent_action(action, option_idx=self.option_idx)
 
 				self.update_option_solver(state, action, reward, next_state)
 
@@ -650,6 +698,7 @@ class Option(object):
 
 		raise Warning("Wanted to execute {}, but initiation condition not met".format(self.name))
 
+	@profiled("refine_option_classifiers")
 	def refine_option_classifiers(self, visited_states, start_state, final_state, num_steps,
                                       outer_step_number, episode=None):
 		if self.is_term_true(final_state):  # success
@@ -685,16 +734,15 @@ class Option(object):
 	def get_rand_global_states(self, k):
 		"""Gets random k states from the global replay buffer."""
 		# Replay buffer entry: (state, action, reward, next_state, terminal)
-		exp = random.sample(list(self.global_solver.replay_buffer.memory), k)
-		states = np.array([row[0] for row in exp])
+		all_states = self.global_solver.replay_buffer.columns("state")["state"]
+		states = all_states[random.sample(range(len(all_states)), k)]
 		assert states.shape[1] == len(self.overall_mdp.init_state.features()), "OptionClass::get_rand_global_samples: Wrong size of state"
 		return states
 
 	# TODO: utilities
 	def get_all_global_states(self):
 		"""Get the entire global replay buffer."""
-		exp_states = [row[0] for row in list(self.global_solver.replay_buffer.memory)]
-		states = np.array(exp_states)
+		states = self.global_solver.replay_buffer.columns("state")["state"]
 		assert states.shape[1] == len(self.overall_mdp.init_state.features()), "OptionClass::get_all_global_samples: Wrong size of state"
 		return states
 
@@ -710,7 +758,9 @@ class Option(object):
 			return np.array(self.get_rand_global_states(k)[:,:2])
 
 	# TODO: train robust initiation set classifiers
+	@profiled("train_initiation_classifiers")
 	def train_initiation_classifiers(self):
+		from sklearn import svm
 		# create input and labels
 		positive_feature_matrix = self.construct_feature_matrix(self.positive_examples)
 		positive_labels = [1] * positive_feature_matrix.shape[0]
@@ -0,0 +1,291 @@
+# Python imports.
+from __future__ import print_function
+import multiprocessing as mp
+import os
+import queue
+import threading
+from collections import deque
+from pathlib import Path
+import numpy as np
+
+from simple_rl.agents.func_approx.dsc.MeshPredictionCacheClass import MeshPredictionCache
+
+
+def get_option_masks(option_data, episode, x_mesh, y_mesh, snapshots=None, mask_cache=None):
+	"""Initiation masks on the mesh of every classifier stored for `episode`.
+
+	Args:
+		option_data (dict): option name -> episode -> {'clfs_bounds' : {clf name : clf or version}}
+		episode (int): episode whose classifiers are evaluated
+		x_mesh (np.ndarray)
+		y_mesh (np.ndarray)
+		snapshots (dict): version -> ClassifierSnapshot, when option_data holds ClassifierStore versions
+		mask_cache (MeshPredictionCache): reused across calls so unchanged classifiers are predicted once
+
+	Returns:
+		List of (color index, option name, {clf name : boolean mask with the mesh's shape})
+	"""
+	if mask_cache is None:
+		mask_cache = MeshPredictionCache(snapshots)
+	option_masks = []
+	for i, (option_name, option) in enumerate(option_data.items()):
+		if episode in option:
+			option_masks.append((i, option_name, mask_cache.get_masks(option[episode]['clfs_bounds'], x_mesh, y_mesh)))
+	return option_masks
+
+
+def adjust_lightness(color, amount=0.5):
+	import colorsys
+	import matplotlib.colors as mc
+	try:
+		c = mc.cnames[color]
+	except:
+		c = color
+	c = colorsys.rgb_to_hls(*mc.to_rgb(c))
+	return colorsys.hls_to_rgb(c[0], max(0, min(1, amount * c[1])), c[2])
+
+
+def draw_multi_boundaries(x_mesh, y_mesh, option_masks, rgb_color_palette, experiment_name, alpha, plot_eps, img_name=None, img_alpha=1, goal=None, start=None):
+	"""Contour precomputed initiation set masks of all options into `{experiment_name}/plots/clf_plots/all_options_{plot_eps}.png`.
+
+	Args:
+		option_masks (list): as returned by get_option_masks
+	"""
+	import matplotlib.pyplot as plt
+	import matplotlib.patches as mpatches
+	import matplotlib.patheffects as pe
+	import matplotlib.colors as mc
+
+	# Create plotting dir (if not created)
+	path = '{}/plots/clf_plots'.format(experiment_name)
+	Path(path).mkdir(exist_ok=True)
+
+	if img_name:
+		back_img = plt.imread(img_name)
+		plt.imshow(back_img, extent=[x_mesh.min(), x_mesh.max(), y_mesh.min(), y_mesh.max()], alpha=img_alpha)
+
+	patches = []
+
+	# Gray classifier key
+	default_colors = ['lightgrey', 'grey']
+	if len(option_masks) > 0:
+		_, _, masks = option_masks[0]
+		for clf_name, color in zip(masks.keys(), default_colors):
+			if 'pessimistic' in clf_name.lower():
+				patches.append(mpatches.Patch(color=color, label='{}'.format(clf_name), alpha=alpha, hatch='xxx'))
+			else:
+				patches.append(mpatches.Patch(color=color, label='{}'.format(clf_name), alpha=alpha))
+
+	# Plot all options
+	colors = [mc.to_hex(rgb) for rgb in rgb_color_palette]
+	dark_colors = [mc.to_hex(adjust_lightness(color, amount=0.5)) for color in colors]
+
+	for i, option_name, masks in option_masks:
+		patches.append(mpatches.Patch(color=colors[i], label='{}'.format(option_name), alpha=alpha))
+
+		# Plot classifier boundaries
+		for clf_name, mask in masks.items():
+			z = np.ma.masked_where(~mask, mask.astype(int))
+			if 'pessimistic' in clf_name.lower():
+				cf = plt.contourf(x_mesh, y_mesh, z, colors=dark_colors[i], alpha=alpha, hatches='xxx')
+				for collection in getattr(cf, 'collections', [cf]):
+					collection.set_edgecolor(dark_colors[i])
+			else:
+				cf = plt.contourf(x_mesh, y_mesh, z, colors=colors[i], alpha=alpha)
+
+	g = plt.scatter(goal[0], goal[1], marker="*", color="y", s=80, path_effects=[pe.Stroke(linewidth=1, foreground='k'), pe.Normal()], label="Goal")
+	patches.append(g)
+
+	s = plt.scatter(start[0], start[1], marker="X", color="k", label="Start")
+	patches.append(s)
+
+	plt.xticks(())
+	plt.yticks(())
+	plt.title("All Options' Sets")
+	plt.legend(handles=patches,
+				bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+
+	# Save plots
+	saved_eps = plot_eps if len(option_masks) > 0 else None
+	plt.savefig("{}/all_options_{}.png".format(path, saved_eps), bbox_inches='tight', edgecolor='black', format='png')
+	plt.close()
+
+	print("|-> Figure {}/all_options_{}.png saved!".format(path, saved_eps))
+
+
+def draw_learning_curves(experiment_name, env_name, data):
+	import matplotlib.pyplot as plt
+
+	# Create plotting dir (if not created)
+	path = '{}/plots/learning_curves'.format(experiment_name)
+	Path(path).mkdir(exist_ok=True)
+
+	plt.plot(data, label=experiment_name)
+
+	plt.title("{}".format(env_name))
+	plt.ylabel("Rewards")
+	plt.xlabel("Episodes")
+	plt.legend(title="Tests", bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+
+	# Save plots
+	plt.savefig("{}/learning_curve.png".format(path), bbox_inches='tight', edgecolor='black', format='png')
+	plt.close()
+
+	print("|-> Figure {}/learning_curve.png saved!".format(path))
+
+
+def _run_plotting_worker(frames, config):
+	"""Worker process main loop: draw frames until the None sentinel arrives."""
+	import matplotlib
+	matplotlib.use("Agg")
+	import seaborn as sns
+	sns.set_style("white")
+	rgb_color_palette = sns.color_palette('deep')
+	mask_cache = MeshPredictionCache()
+
+	while True:
+		frame = frames.get()
+		if frame is None:
+			break
+		try:
+			mask_cache.snapshots.update(frame['snapshots'])
+			option_masks = [(color_idx, option_name, mask_cache.get_masks(clfs_bounds, config['x_mesh'], config['y_mesh']))
+							for color_idx, option_name, clfs_bounds in frame['clfs']]
+
+			draw_multi_boundaries(x_mesh=config['x_mesh'],
+								  y_mesh=config['y_mesh'],
+								  option_masks=option_masks,
+								  rgb_color_palette=rgb_color_palette,
+								  experiment_name=config['log_dir'],
+								  alpha=0.7,
+								  plot_eps=frame['episode'],
+								  img_name=config['img_name'],
+								  img_alpha=0.9,
+								  goal=config['goal'],
+								  start=config['start'])
+			draw_learning_curves(config['log_dir'], config['env_name'], frame['scores'])
+		except Exception as e:
+			print("PlottingWorker: failed to plot episode {}: {}".format(frame['episode'], e))
+
+	if config['mask_cache_dir'] is not None:
+		os.makedirs(config['mask_cache_dir'], exist_ok=True)
+		mask_cache.save(config['mask_cache_dir'])
+
+
+class PlottingWorker(object):
+	"""Draws episodic plots in a separate process so training never waits on matplotlib.
+
+	Frames are compact snapshots of one episode: the ClassifierStore versions of the classifiers in use at
+	that episode with their ClassifierSnapshots (support vectors and coefficients, not the sklearn objects
+	or the whole option_data history), plus the score curve.
+	The worker keeps the mesh masks of the classifier versions it has seen (see MeshPredictionCache),
+	so a frame only costs predictions for the classifiers refit since the last plotted one.
+	The frame queue is bounded; when the worker falls behind the oldest pending frame is dropped.
+	Every frame carries the full score curve, so dropping frames only skips boundary plots.
+	If the worker process dies, the remaining frames are dropped and training carries on.
+	"""
+
+	# Seconds between liveness checks of the worker while handing it a frame
+	PUT_TIMEOUT = 1.
+
+	def __init__(self, log_dir, x_mesh, y_mesh, env_name, img_name=None, goal=None, start=None, max_pending=2, mask_cache_dir=None):
+		"""
+		Args:
+			log_dir (str): run directory, plots go to `{log_dir}/plots`
+			x_mesh (np.ndarray)
+			y_mesh (np.ndarray)
+			env_name (str)
+			img_name (str): background image of the domain
+			goal (np.ndarray)
+			start (np.ndarray)
+			max_pending (int): frames allowed to wait before stale ones are dropped
+			mask_cache_dir (str): directory the worker saves its mesh masks to when it exits (not saved if None)
+		"""
+		self.num_submitted = 0
+		self.num_dropped = 0
+
+		config = {'log_dir' : log_dir, 'x_mesh' : x_mesh, 'y_mesh' : y_mesh, 'env_name' : env_name,
+				  'img_name' : img_name, 'goal' : goal, 'start' : start, 'mask_cache_dir' : mask_cache_dir}
+
+		# Pending frames live in a bounded deque on the trainer side (appending to a full deque drops the oldest);
+		# a feeder thread hands them to the worker one at a time
+		self.pending = deque(maxlen=max_pending)
+		self.pending_cv = threading.Condition()
+		self.closed = False
+		self.worker_died = False
+
+		# Spawn (not fork) so the worker never inherits torch/CUDA state from the trainer
+		ctx = mp.get_context("spawn")
+		self.frames = ctx.Queue(maxsize=1)
+		self.process = ctx.Process(target=_run_plotting_worker, args=(self.frames, config), name="PlottingWorker")
+		self.process.daemon = True
+		self.process.start()
+
+		self.feeder = threading.Thread(target=self._feed, name="PlottingWorkerFeeder")
+		self.feeder.daemon = True
+		self.feeder.start()
+
+	@staticmethod
+	def make_frame(option_data, episode, per_episode_scores, snapshots=None):
+		"""Snapshot of what plot_episodic_plots draws for `episode`."""
+		# An option's color is its index in option_data, which keeps colors stable across frames
+		clfs = [(i, option_name, dict(option[episode]['clfs_bounds']))
+				for i, (option_name, option) in enumerate(option_data.items()) if episode in option]
+		# Frames can be dropped, so each one carries the snapshots of every version it uses
+		versions = set(clf for _, _, clfs_bounds in clfs for clf in clfs_bounds.values() if isinstance(clf, (int, np.integer)))
+		frame_snapshots = {version : snapshots[version] for version in versions} if snapshots is not None else {}
+		return {'episode' : episode, 'clfs' : clfs, 'snapshots' : frame_snapshots, 'scores' : list(per_episode_scores)}
+
+	def submit(self, frame):
+		"""Queue a frame without blocking; drops the oldest pending frame if the worker is behind."""
+		with self.pending_cv:
+			self.num_submitted += 1
+			if self.worker_died:
+				self.num_dropped += 1
+				return
+			if len(self.pending) == self.pending.maxlen:
+				self.num_dropped += 1
+			self.pending.append(frame)
+			self.pending_cv.notify()
+
+	def _feed(self):
+		while True:
+			with self.pending_cv:
+				while len(self.pending) == 0 and not self.closed:
+					self.pending_cv.wait()
+				if len(self.pending) == 0:
+					break
+				frame = self.pending.popleft()
+			# Blocks while the worker is busy, which is what lets frames go stale in self.pending
+			if not self._put(frame):
+				with self.pending_cv:
+					self.worker_died = True
+					self.num_dropped += 1 + len(self.pending)
+					self.pending.clear()
+				print("PlottingWorker: worker process exited (code {}), dropping the remaining frames".format(self.process.exitcode))
+				return
+		self._put(None)
+
+	def _put(self, frame):
+		"""Hand `frame` to the worker, waiting while it is busy. Returns False if the worker process died."""
+		while self.process.is_alive():
+			try:
+				self.frames.put(frame, timeout=PlottingWorker.PUT_TIMEOUT)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def close(self, timeout=600.):
+		"""Let the worker finish pending frames and exit (it is terminated if it has not after `timeout` seconds)."""
+		with self.pending_cv:
+			self.closed = True
+			self.pending_cv.notify()
+		self.feeder.join(timeout)
+		self.process.join(timeout)
+		if self.process.is_alive():
+			print("|-> PlottingWorker: still busy after {}s, terminating it".format(timeout))
+			self.process.terminate()
+			self.process.join(PlottingWorker.PUT_TIMEOUT)
+		print("|-> PlottingWorker: plotted {} of {} episodes ({} stale frames dropped)".format(
+			self.num_submitted - self.num_dropped, self.num_submitted, self.num_dropped))
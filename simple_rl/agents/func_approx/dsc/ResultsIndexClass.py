@@ -0,0 +1,241 @@
+# Python imports.
+from __future__ import print_function
+import os
+import re
+import glob
+import json
+import sqlite3
+import argparse
+import tempfile
+import datetime
+import numpy as np
+
+# Other imports.
+from simple_rl.agents.func_approx.dsc.RunLogClass import RunLog, load_run_variable
+from simple_rl.agents.func_approx.dsc.MeshPredictionCacheClass import MeshPredictionCache
+
+
+class ResultsIndex(object):
+	"""Index of the learning-curve data of every SkillChaining run under a root directory (eg. `runs/`).
+
+	`{root}/results.sqlite` has one row per (experiment, seed) with the run's args and summary numbers, and
+	each run's series (scores, durations, validation scores, number of options, chain breaks) sit in a NumPy
+	sidecar, `{data_dir}/results.npz`. Comparing runs then reads a few small arrays per run instead of
+	unpickling its classifiers and option data.
+
+	Runs are ingested by SkillChaining when they finish, or afterwards with
+		python simple_rl/agents/func_approx/dsc/ResultsIndexClass.py runs/<experiment> ...
+	Ingesting is a no-op for runs whose saved files have not changed since they were last indexed.
+	"""
+
+	DB_NAME = "results.sqlite"
+	SIDECAR_NAME = "results.npz"
+
+	# List-valued all_data variables stored as float arrays in the sidecar
+	SERIES = ("per_episode_scores", "episodic_durations", "validation_scores", "validation_episodes", "num_options_history")
+
+	def __init__(self, root="runs"):
+		"""
+		Args:
+			root (str): directory holding the experiment directories (`{root}/{experiment}/run_{seed}_all_data`)
+		"""
+		self.root = root
+		if not os.path.exists(root):
+			os.makedirs(root)
+		# Concurrent runs of a sweep all write to the same database, wait for each other's writes
+		self.connection = sqlite3.connect(os.path.join(root, ResultsIndex.DB_NAME), timeout=60.)
+		with self.connection:
+			self.connection.execute("""CREATE TABLE IF NOT EXISTS runs (
+				experiment TEXT NOT NULL,
+				seed INTEGER NOT NULL,
+				data_dir TEXT NOT NULL,
+				env_name TEXT,
+				args TEXT,
+				num_episodes INTEGER,
+				final_score REAL,
+				mean_score REAL,
+				num_options INTEGER,
+				source_stamp INTEGER,
+				ingested TEXT,
+				PRIMARY KEY (experiment, seed))""")
+
+	def close(self):
+		self.connection.close()
+
+	@staticmethod
+	def source_stamp(data_dir):
+		"""Latest modification time (ns) of the files a run saved, to tell whether its index entry is stale."""
+		stamp = 0
+		for directory in (data_dir, os.path.join(data_dir, RunLog.DIR_NAME)):
+			if os.path.isdir(directory):
+				for entry in os.scandir(directory):
+					# Plot caches written next to the run do not change its results
+					if entry.is_file() and entry.name not in (ResultsIndex.SIDECAR_NAME, MeshPredictionCache.FILE_NAME):
+						stamp = max(stamp, entry.stat().st_mtime_ns)
+		return stamp
+
+	def ingest_run(self, data_dir, experiment=None, seed=None, force=False):
+		"""
+		Args:
+			data_dir (str): a `run_{seed}_all_data` directory
+			experiment (str): defaults to the name of the directory holding data_dir
+			seed (int): defaults to the seed in data_dir's name
+			force (bool): re-read the run even if its files did not change
+
+		Returns:
+			(bool): whether the run was (re)ingested
+		"""
+		data_dir = os.path.abspath(data_dir)
+		if experiment is None:
+			experiment = os.path.basename(os.path.dirname(data_dir))
+		if seed is None:
+			seed = int(re.match(r"run_(\d+)_all_data", os.path.basename(data_dir)).group(1))
+
+		stamp = ResultsIndex.source_stamp(data_dir)
+		row = self.connection.execute("SELECT source_stamp FROM runs WHERE experiment = ? AND seed = ?", (experiment, seed)).fetchone()
+		if not force and row is not None and row[0] == stamp and os.path.exists(os.path.join(data_dir, ResultsIndex.SIDECAR_NAME)):
+			return False
+
+		# A run log is loaded whole once and shared by the variables below
+		run_logs = {}
+		def load(var_name, default=None):
+			try:
+				return load_run_variable(data_dir, var_name, run_logs)
+			except (IOError, KeyError):
+				return default
+
+		arrays = {var_name : np.asarray(load(var_name, []), dtype=np.float64) for var_name in ResultsIndex.SERIES}
+
+		temporal_breaks = load('temporal_full_chain_breaks', {})
+		episodes = sorted(temporal_breaks)
+		arrays['temporal_full_chain_breaks_episodes'] = np.array(episodes, dtype=np.int64)
+		arrays['temporal_full_chain_breaks_counts'] = np.array([temporal_breaks[episode] for episode in episodes], dtype=np.int64)
+
+		full_breaks = load('full_chain_breaks', {})
+		option_names = sorted(full_breaks)
+		rows = [(i, episode, count) for i, option_name in enumerate(option_names) for episode, count in sorted(full_breaks[option_name].items())]
+		arrays['full_chain_breaks_options'] = np.array(option_names, dtype=str)
+		arrays['full_chain_breaks'] = np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+		fd, tmp_name = tempfile.mkstemp(dir=data_dir, prefix=".tmp_", suffix=".npz")
+		with os.fdopen(fd, "wb") as f:
+			np.savez(f, **arrays)
+		os.replace(tmp_name, os.path.join(data_dir, ResultsIndex.SIDECAR_NAME))
+
+		args = load('args')
+		scores = arrays['per_episode_scores']
+		num_options = arrays['num_options_history']
+		with self.connection:
+			self.connection.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+									(experiment, seed, data_dir, load('mdp_env_name'),
+									 json.dumps(vars(args), default=str) if args is not None else None,
+									 len(scores), float(scores[-1]) if len(scores) > 0 else None,
+									 float(scores.mean()) if len(scores) > 0 else None,
+									 int(num_options[-1]) if len(num_options) > 0 else None,
+									 stamp, datetime.datetime.now().isoformat()))
+		return True
+
+	def ingest(self, run_dir, force=False):
+		"""Ingest every saved `run_{seed}_all_data` directory of the experiment directory `run_dir`.
+
+		Returns:
+			(int): number of runs (re)ingested
+		"""
+		num_ingested = 0
+		for data_dir in sorted(glob.glob(os.path.join(run_dir, "run_*_all_data"))):
+			if RunLog.exists(data_dir) or os.path.exists(os.path.join(data_dir, "per_episode_scores.pkl")):
+				num_ingested += self.ingest_run(data_dir, force=force)
+		return num_ingested
+
+	def experiments(self):
+		return [row[0] for row in self.connection.execute("SELECT DISTINCT experiment FROM runs ORDER BY experiment")]
+
+	def get_runs(self, experiment, seeds=None):
+		"""
+		Args:
+			experiment (str)
+			seeds (list): restrict to these seeds (all of the experiment's by default)
+
+		Returns:
+			(list): one dict per run, by seed, with the run's `args` as an argparse.Namespace
+		"""
+		columns = ("experiment", "seed", "data_dir", "env_name", "args", "num_episodes", "final_score", "mean_score", "num_options")
+		runs = []
+		for row in self.connection.execute("SELECT {} FROM runs WHERE experiment = ? ORDER BY seed".format(", ".join(columns)), (experiment,)):
+			run = dict(zip(columns, row))
+			if seeds is None or run["seed"] in seeds:
+				run["args"] = argparse.Namespace(**json.loads(run["args"])) if run["args"] is not None else None
+				runs.append(run)
+		return runs
+
+	@staticmethod
+	def load_sidecar(run):
+		with np.load(os.path.join(run["data_dir"], ResultsIndex.SIDECAR_NAME)) as data:
+			return {key : data[key] for key in data.files}
+
+	def get_series(self, experiment, var_name, seeds=None):
+		"""
+		Args:
+			experiment (str)
+			var_name (str): one of ResultsIndex.SERIES
+			seeds (list)
+
+		Returns:
+			(list): the series of each run, by seed
+		"""
+		return [ResultsIndex.load_sidecar(run)[var_name] for run in self.get_runs(experiment, seeds)]
+
+	def get_chain_breaks(self, experiment, seeds=None):
+		"""
+		Returns:
+			(list): per run, by seed, (temporal_full_chain_breaks, full_chain_breaks) in the dict layout SkillChaining saves
+		"""
+		chain_breaks = []
+		for run in self.get_runs(experiment, seeds):
+			data = ResultsIndex.load_sidecar(run)
+			temporal = dict(zip(data['temporal_full_chain_breaks_episodes'].tolist(), data['temporal_full_chain_breaks_counts'].tolist()))
+			full = {}
+			for option_idx, episode, count in data['full_chain_breaks'].tolist():
+				full.setdefault(str(data['full_chain_breaks_options'][option_idx]), {})[episode] = count
+			chain_breaks.append((temporal, full))
+		return chain_breaks
+
+
+def load_indexed_runs(run_dir, start, end):
+	"""Ingest the experiment directory `run_dir` (only new or changed runs are read) and return the index and its runs.
+
+	Args:
+		run_dir (str): `{root}/{experiment}`
+		start (int): first seed
+		end (int): last seed (inclusive)
+
+	Returns:
+		(ResultsIndex, str, list): the index of run_dir's parent directory, the experiment name and its runs with seeds in [start, end]
+
+	Raises:
+		IOError: if a seed in [start, end] has no saved data, as reading its pickles would
+	"""
+	run_dir = os.path.normpath(run_dir)
+	index = ResultsIndex(os.path.dirname(os.path.abspath(run_dir)))
+	index.ingest(run_dir)
+	experiment = os.path.basename(run_dir)
+	runs = index.get_runs(experiment, seeds=range(start, end + 1))
+	missing_seeds = sorted(set(range(start, end + 1)) - set(run["seed"] for run in runs))
+	if missing_seeds:
+		index.close()
+		raise IOError("No saved data in {} for seeds {}".format(run_dir, missing_seeds))
+	return index, experiment, runs
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument("run_dirs", nargs="+", type=str, help="experiment directories (eg. runs/<experiment_name>)")
+	parser.add_argument("--force", type=bool, help="Re-ingest runs even if unchanged", default=False)
+	args = parser.parse_args()
+
+	for run_dir in args.run_dirs:
+		run_dir = os.path.normpath(run_dir)
+		index = ResultsIndex(os.path.dirname(os.path.abspath(run_dir)))
+		num_ingested = index.ingest(run_dir, force=args.force)
+		print("|-> {}: {} runs ingested, {} runs indexed".format(run_dir, num_ingested, len(index.get_runs(os.path.basename(run_dir)))))
+		index.close()
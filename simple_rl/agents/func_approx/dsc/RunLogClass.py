@@ -0,0 +1,132 @@
+# Python imports.
+from __future__ import print_function
+import os
+import glob
+import pickle
+import tempfile
+
+# Other imports.
+from simple_rl.agents.func_approx.dsc.TrajectoryLogClass import load_trajectories
+
+
+def atomic_pickle_dump(data, file_name):
+	"""Pickle `data` to a temporary file next to `file_name`, then rename it into place.
+
+	A reader (or a killed run) only ever sees the old file or the complete new one.
+	"""
+	dir_name = os.path.dirname(os.path.abspath(file_name))
+	fd, tmp_name = tempfile.mkstemp(dir=dir_name, prefix=".tmp_", suffix=".pkl")
+	try:
+		with os.fdopen(fd, "wb") as f:
+			pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp_name, file_name)
+	except:
+		if os.path.exists(tmp_name):
+			os.remove(tmp_name)
+		raise
+
+
+def merge_delta(all_data, delta):
+	"""Fold one episode's delta into `all_data`: lists are extended, dicts merged recursively, anything else replaced."""
+	for key, value in delta.items():
+		if isinstance(value, list) and isinstance(all_data.get(key), list):
+			all_data[key].extend(value)
+		elif isinstance(value, dict) and isinstance(all_data.get(key), dict):
+			merge_delta(all_data[key], value)
+		else:
+			all_data[key] = value
+	return all_data
+
+
+class RunLog(object):
+	"""Append-only log of a SkillChaining run.
+
+	Layout of `{data_dir}/run_log/`:
+		header.pkl            values fixed for the whole run (args, meshes, goal/start, ...)
+		episode_000000.pkl    what changed during each episode (scores, new classifier snapshots, trajectory rows, ...)
+		final.pkl             values only known at the end of the run (final skill chain, HD meshes)
+
+	Trajectories are streamed separately to `{data_dir}/trajectories/` (see TrajectoryRecorder) and loaded
+	back as 'trajectory_data'.
+
+	Every file is written once, atomically, so the cost of saving an episode does not grow with the run and
+	a killed run still leaves a readable log. `RunLog.load` folds the files back into the `all_data` dict
+	that SkillChaining.save_all_data pickles.
+	"""
+
+	DIR_NAME = "run_log"
+
+	def __init__(self, data_dir):
+		"""
+		Args:
+			data_dir (str): the run's `run_{seed}_all_data` directory
+		"""
+		self.log_dir = os.path.join(data_dir, RunLog.DIR_NAME)
+		if not os.path.exists(self.log_dir):
+			os.makedirs(self.log_dir)
+
+	def write_header(self, header):
+		atomic_pickle_dump(header, os.path.join(self.log_dir, "header.pkl"))
+
+	def append_episode(self, episode, delta):
+		"""
+		Args:
+			episode (int)
+			delta (dict): all_data keys -> what was added during `episode` (see merge_delta)
+		"""
+		atomic_pickle_dump(delta, os.path.join(self.log_dir, "episode_{:06d}.pkl".format(episode)))
+
+	def write_final(self, final):
+		atomic_pickle_dump(final, os.path.join(self.log_dir, "final.pkl"))
+
+	@staticmethod
+	def exists(data_dir):
+		return os.path.exists(os.path.join(data_dir, RunLog.DIR_NAME, "header.pkl"))
+
+	@staticmethod
+	def load(data_dir):
+		"""
+		Args:
+			data_dir (str): the run's `run_{seed}_all_data` directory
+
+		Returns:
+			all_data (dict): same keys as the per-variable pickles written by SkillChaining.save_all_data
+		"""
+		log_dir = os.path.join(data_dir, RunLog.DIR_NAME)
+		with open(os.path.join(log_dir, "header.pkl"), "rb") as f:
+			all_data = pickle.load(f)
+
+		for episode_file in sorted(glob.glob(os.path.join(log_dir, "episode_*.pkl"))):
+			with open(episode_file, "rb") as f:
+				merge_delta(all_data, pickle.load(f))
+
+		all_data['trajectory_data'] = load_trajectories(os.path.join(data_dir, "trajectories"))
+
+		final_file = os.path.join(log_dir, "final.pkl")
+		if os.path.exists(final_file):
+			with open(final_file, "rb") as f:
+				all_data.update(pickle.load(f))
+
+		return all_data
+
+
+def load_run_variable(data_dir, var_name, all_data_cache=None):
+	"""Read one all_data variable of a run, from its run log if it has one, else from `{var_name}.pkl`.
+
+	Args:
+		data_dir (str): the run's `run_{seed}_all_data` directory
+		var_name (str): eg. 'per_episode_scores', 'option_data'
+		all_data_cache (dict): optional dict used to memoize loaded run logs by data_dir
+	"""
+	pkl_file = os.path.join(data_dir, var_name + ".pkl")
+	if RunLog.exists(data_dir) and not os.path.exists(pkl_file):
+		if all_data_cache is None:
+			return RunLog.load(data_dir)[var_name]
+		if data_dir not in all_data_cache:
+			all_data_cache[data_dir] = RunLog.load(data_dir)
+		return all_data_cache[data_dir][var_name]
+
+	with open(pkl_file, "rb") as f:
+		return pickle.load(f)
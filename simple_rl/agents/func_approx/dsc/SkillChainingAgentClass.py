@@ -8,34 +8,51 @@ from collections import deque, defaultdict
 from copy import deepcopy
 import pdb
 import argparse
+import functools
 import os
 import random
 import numpy as np
-from tensorboardX import SummaryWriter
 import torch
-import pandas as pd
 from pathlib import Path
-import seaborn as sns
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import matplotlib.cm as cm
-import matplotlib.patheffects as pe
-import matplotlib.colors as mc
 
 # Other imports.
 from simple_rl.mdp.StateClass import State
 from simple_rl.agents.func_approx.dsc.OptionClass import Option
+from simple_rl.agents.func_approx.dsc.PlottingWorkerClass import PlottingWorker, get_option_masks, draw_multi_boundaries, draw_learning_curves
+from simple_rl.agents.func_approx.dsc.EvaluationWorkerClass import EvaluationWorker, run_evaluation_episode
+from simple_rl.agents.func_approx.dsc.RunLogClass import RunLog
+from simple_rl.agents.func_approx.dsc.ClassifierStoreClass import ClassifierStore
+from simple_rl.agents.func_approx.dsc.MeshPredictionCacheClass import MeshPredictionCache
+from simple_rl.agents.func_approx.dsc.TrajectoryLogClass import TrajectoryRecorder
+from simple_rl.agents.func_approx.dsc.ResultsIndexClass import ResultsIndex
 from simple_rl.agents.func_approx.dsc.utils import *
 from simple_rl.agents.func_approx.ddpg.utils import *
+from simple_rl.agents.func_approx.ddpg.replay_storage import configure_replay_storage
 from simple_rl.agents.func_approx.dqn.DQNAgentClass import DQNAgent
+from simple_rl.utils.profiler import profiler, profiled
+from simple_rl.utils.metrics import MetricsWriter, CSVBackend, GRADIENT_NORM_SAMPLE_RATES
+
+# Per-step diagnostics are kept 1-in-N; per-update and per-episode metrics are kept every time
+METRIC_SAMPLE_RATES = dict({"*_action_*" : 20, "*_state_*" : 20, "*_noise_*" : 20, "*_taken" : 20, "*_q_value" : 10},
+						   **GRADIENT_NORM_SAMPLE_RATES)
 
 
 class SkillChaining(object):
+
+	# Saved as is in checkpoints (options, agents and RNGs are handled separately)
+	CHECKPOINT_ATTRIBUTES = ('episode', 'num_options', 'validation_scores', 'validation_episodes', 'num_options_history', 'global_execution_states',
+							 'temporal_chain_breaks', 'option_chain_breaks', 'goal_chain_breaks', 'full_chain_breaks',
+							 'temporal_full_chain_breaks', 'full_chain_fix_option', 'option_data', 'classifier_store',
+							 'trajectory_recorder', 'run_log_lengths', 'run_log_num_snapshots')
+	# defaultdicts of lists, saved as plain dicts
+	CHECKPOINT_DEBUG_ATTRIBUTES = ('num_option_executions', 'option_rewards', 'option_qvalues')
 	def __init__(self, mdp, max_steps, lr_actor, lr_critic, lr_dqn, ddpg_batch_size, device, max_num_options=np.inf,
 				 subgoal_reward=0., enable_option_timeout=True, buffer_length=20, num_subgoal_hits_required=3,
 				 classifier_type="ocsvm", init_q=None, generate_plots=False, episodic_plots=False, use_full_smdp_update=False,
 				 log_dir="", seed=0, tensor_log=False, opt_nu=0.5, pes_nu=0.5, experiment_name=None, num_run=0, discrete_actions=False,
-				 use_old=False, episodic_saves=False, args=None, use_chain_fix=False):
+				 use_old=False, episodic_saves=False, args=None, use_chain_fix=False, profile=False,
+				 metrics_backend="tensorboard", metrics_flush_secs=30., checkpoint_every=0, resume=False,
+				 mdp_factory=None, eval_every=100, eval_episodes=1, eval_workers=1):
 		"""
 		Args:
 			mdp (MDP): Underlying domain we have to solve
@@ -61,9 +78,18 @@ class SkillChaining(object):
 			num_run (int): Number of the current run.
 			discrete_actions (bool): Whether or not actions are discrete
 			use_old (bool): Whether or not to use previous DSC methods
-			episodic_saves (bool): Whether to save all data per episode
+			episodic_saves (bool): Whether to append each episode's data to the run log (see RunLog)
 			args (argparse.ArgumentParser().parse_args())
 			use_chain_fix (bool)
+			profile (bool): Whether to time hot paths and log a per-episode breakdown
+			metrics_backend (str): tensorboard/csv sink used when tensor_log is enabled
+			metrics_flush_secs (float): how often buffered metrics are flushed to the sink
+			checkpoint_every (int): episodes between training checkpoints (0 disables them)
+			resume (bool): whether to continue from this run's checkpoint, if there is one
+			mdp_factory (callable): picklable, builds another instance of mdp for evaluation processes (None evaluates inline)
+			eval_every (int): episodes between evaluations of the policy over options (0 disables them)
+			eval_episodes (int): episodes (from as many start states) per evaluation
+			eval_workers (int): evaluation processes (0 evaluates inline, blocking training)
 )
 		"""
 		self.mdp = mdp
@@ -98,17 +124,35 @@ class SkillChaining(object):
 		self.args = args
 		self.use_chain_fix = use_chain_fix
 		self.episode = 0
+		self.profile = profile
+		profiler.enable(profile)
+		self.checkpoint_every = checkpoint_every
+		self.resume = resume
+		self.checkpoint_file = log_dir + '/run_{}_all_data/checkpoint.pt'.format(seed)
+		self.mdp_factory = mdp_factory
+		self.eval_every = eval_every
+		self.eval_episodes = eval_episodes
+		self.eval_workers = eval_workers
 
 		# TODO: changed log dir
 		tensor_name = "logs/{}_{}".format(args.experiment_name, seed)
-		self.writer = SummaryWriter(tensor_name) if tensor_log else None
+		self.writer = None
+		if tensor_log:
+			if metrics_backend == "csv":
+				backend = CSVBackend(tensor_name)
+			else:
+				from tensorboardX import SummaryWriter
+				backend = SummaryWriter(tensor_name)
+			self.writer = MetricsWriter(backend, flush_secs=metrics_flush_secs, sample_rates=METRIC_SAMPLE_RATES)
 
 		print("Initializing skill chaining with option_timeout={}, seed={}\n".format(self.enable_option_timeout, seed))
 
 		random.seed(seed)
 		np.random.seed(seed)
 
-		self.validation_scores = []
+		self.validation_scores = []	# mean score of each evaluation
+		self.validation_episodes = []	# training episode each evaluation was taken at
+		self.evaluation_worker = None
 
 		# This option has an initiation set that is true everywhere and is allowed to operate on atomic timescale only
 		if self.discrete_actions:	# TODO discrete solver toggle
@@ -201,11 +245,22 @@ class SkillChaining(object):
 		self.y_mesh = None
 		self.x_mesh_hd = None
 		self.y_mesh_hd = None
-		self.option_data = {}
+		self.option_data = {}	# option name -> episode -> {'clfs_bounds' : {clf name : version in self.classifier_store}}
+		self.classifier_store = ClassifierStore()
+		self.mesh_cache = MeshPredictionCache(self.classifier_store.snapshots)	# masks of stored classifier versions on plotting meshes
 		self.goal_xy = np.array(self.mdp.goal_position)
 		self.start_xy = np.array(self.start_state[:2])
 		self.options_chain_breaks = {}
-		self.trajectory_data = {}
+		self.plotting_worker = None
+
+		# Positions visited by option executions; streamed to disk episode by episode with episodic saves
+		trajectory_dir = log_dir + '/run_{}_all_data/trajectories'.format(seed) if episodic_saves else None
+		self.trajectory_recorder = TrajectoryRecorder(out_dir=trajectory_dir)
+
+		# Append-only run log written by episodic saves (and how much of each list it already holds)
+		self.run_log = None
+		self.run_log_lengths = {'validation_scores' : 0, 'validation_episodes' : 0, 'num_options_history' : 0}
+		self.run_log_num_snapshots = 0
 
 		# TODO: add environment image for plotting
 		if "maze" in self.mdp.env_name:
@@ -376,22 +431,14 @@ class SkillChaining(object):
 		return selected_option
 
 	# TODO: utilites
-	def log_trajectories(self, episode, idx, name, option_transitions):
+	def log_trajectories(self, episode, step_number, idx, name, option_transitions):
 		# NOTE: option_transitions (list): list of (s, a, r, s') tuples
 		
 		# Extract x, y positions from s'
-		transitions = [row[-1][:2]for row in option_transitions]
-		
-		traj = []
-		for i in range(len(transitions)):
-			x, y = transitions[i]
-			traj.append([idx, name, x, y])
-	
-		if episode not in self.trajectory_data:
-			self.trajectory_data[episode] = traj
-		else:
-			self.trajectory_data[episode] = self.trajectory_data[episode] + traj 
+		positions = [row[-1][:2] for row in option_transitions]
+		self.trajectory_recorder.record(episode, step_number, idx, name, positions)
 
+	@profiled("take_action")
 	def take_action(self, state, step_number, episode_option_executions, episode=None):
 		"""
 		Either take a primitive action from `state` or execute a closed-loop option policy.
@@ -431,6 +478,7 @@ class SkillChaining(object):
 
 		# TODO: log trajectories
 		self.log_trajectories(episode,
+							  step_number,
 							  selected_option.option_idx,
 							  selected_option.name, 
 							  option_transitions)
@@ -470,7 +518,7 @@ class SkillChaining(object):
 
 	# TODO: utilities
 	def get_all_global_states(self):
-		return np.array([row[0] for row in list(self.global_option.solver.replay_buffer.memory)])
+		return self.global_option.solver.replay_buffer.columns("state")["state"]
 
 	# TODO: utilities
 	def get_mesh_positions(self):
@@ -660,6 +708,7 @@ class SkillChaining(object):
 	# TODO: utilities
 	def adjust_lightness(self, color, amount=0.5):
 		import colorsys
+		import matplotlib.colors as mc
 		try:
 			c = mc.cnames[color]
 		except:
@@ -669,6 +718,10 @@ class SkillChaining(object):
 
 	# TODO: utilities
 	def plot_boundary(self, x_mesh, y_mesh, clfs, colors, option_name, episode, experiment_name, alpha, img_name=None, img_alpha=1, goal=None, start=None):
+		import matplotlib.patches as mpatches
+		import matplotlib.patheffects as pe
+		plt = get_pyplot()
+
 		# Create plotting dir (if not created)
 		path = '{}/plots/clf_plots'.format(experiment_name)
 		Path(path).mkdir(exist_ok=True)
@@ -685,11 +738,10 @@ class SkillChaining(object):
 		s = plt.scatter(start[0], start[1], marker="X", color="k", label="Start")
 		patches.append(s)
 
-		# Plot classifier boundaries
-		for (clf_name, clf), color in zip(clfs.items(), colors):
-			z = clf.predict(np.c_[x_mesh.ravel(), y_mesh.ravel()])
-			z = (z.reshape(x_mesh.shape) > 0).astype(int)
-			z = np.ma.masked_where(z == 0, z)
+		# Plot classifier boundaries (clfs may hold classifier versions of self.classifier_store)
+		masks = self.mesh_cache.get_masks(clfs, x_mesh, y_mesh)
+		for (clf_name, mask), color in zip(masks.items(), colors):
+			z = np.ma.masked_where(~mask, mask.astype(int))
 
 			if 'pessimistic' in clf_name.lower():
 				cf = plt.contourf(x_mesh, y_mesh, z, colors=color, alpha=alpha, hatches='xxx')
@@ -712,78 +764,16 @@ class SkillChaining(object):
 		print("|-> Figure {}/{}_{}.png saved!".format(path, option_name, episode))
 
 	def plot_multi_boundaries(self, x_mesh, y_mesh, option_data, rgb_color_palette, experiment_name, alpha, plot_eps, img_name=None, img_alpha=1, goal=None, start=None):
-		# Create plotting dir (if not created)
-		path = '{}/plots/clf_plots'.format(experiment_name)
-		Path(path).mkdir(exist_ok=True)
-
-		if img_name:
-			back_img = plt.imread(img_name)
-			plt.imshow(back_img, extent=[x_mesh.min(), x_mesh.max(), y_mesh.min(), y_mesh.max()], alpha=img_alpha)
-
-		patches = []
-
-		# Gray classifier key
-		default_colors = ['lightgrey', 'grey']
-		once = False
-		for i, (option_name, option) in enumerate(option_data.items()):
-			if not once:
-				for episode, episode_data in option.items():
-					once = True
-					clfs = episode_data['clfs_bounds']
-					if episode == plot_eps:
-						saved_eps = episode
-						for (clf_name, clf), color in zip(clfs.items(), default_colors):
-							if 'pessimistic' in clf_name.lower():
-								pass
-								patches.append(mpatches.Patch(color=color, label='{}'.format(clf_name), alpha=alpha, hatch='xxx'))
-							else:
-								patches.append(mpatches.Patch(color=color, label='{}'.format(clf_name), alpha=alpha))
-
-		# Plot all options
-		saved_eps = None
-		colors =[mc.to_hex(rgb) for rgb in rgb_color_palette]
-		dark_colors = [mc.to_hex(self.adjust_lightness(color, amount=0.5)) for color in colors]
-
-		for i, (option_name, option) in enumerate(option_data.items()):
-			for episode, episode_data in option.items():
-				clfs = episode_data['clfs_bounds']
-				# plot boundaries of classifiers
-				if episode == plot_eps:
-					saved_eps = episode
-					patches.append(mpatches.Patch(color=colors[i], label='{}'.format(option_name), alpha=alpha))
-
-					# Plot classifier boundaries
-					for (clf_name, clf) in clfs.items():
-						z = clf.predict(np.c_[x_mesh.ravel(), y_mesh.ravel()])
-						z = (z.reshape(x_mesh.shape) > 0).astype(int)
-						z = np.ma.masked_where(z == 0, z)
-						if 'pessimistic' in clf_name.lower():
-							cf = plt.contourf(x_mesh, y_mesh, z, colors=dark_colors[i], alpha=alpha, hatches='xxx')
-							for collection in cf.collections:
-								collection.set_edgecolor(dark_colors[i])
-						else:
-							cf = plt.contourf(x_mesh, y_mesh, z, colors=colors[i] , alpha=alpha)
-
-		g = plt.scatter(goal[0], goal[1], marker="*", color="y", s=80, path_effects=[pe.Stroke(linewidth=1, foreground='k'), pe.Normal()], label="Goal")
-		patches.append(g)
-			
-		s = plt.scatter(start[0], start[1], marker="X", color="k", label="Start")
-		patches.append(s)
-
-		plt.xticks(())
-		plt.yticks(())
-		plt.title("All Options' Sets")
-		plt.legend(handles=patches, 
-					bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
-		
-		# Save plots
-		plt.savefig("{}/all_options_{}.png".format(path, saved_eps),bbox_inches='tight', edgecolor='black', format='png', quality=100)
-		plt.close()
-
-		print("|-> Figure {}/all_options_{}.png saved!".format(path, saved_eps))
+		option_masks = get_option_masks(option_data, plot_eps, x_mesh, y_mesh, mask_cache=self.mesh_cache)
+		draw_multi_boundaries(x_mesh, y_mesh, option_masks, rgb_color_palette, experiment_name, alpha, plot_eps,
+							  img_name=img_name, img_alpha=img_alpha, goal=goal, start=start)
 
 	# TODO: utilities
 	def plot_trajectory(self, x_mesh, y_mesh, trajectory_data, episode, experiment_name, rgb_color_palette, alpha=1, img_name=None, img_alpha=1, goal=None, start=None):
+		import matplotlib.patheffects as pe
+		import matplotlib.colors as mc
+		plt = get_pyplot()
+
 		# Create plotting dir (if not created)
 		path = '{}/plots/trajectories'.format(experiment_name)
 		Path(path).mkdir(exist_ok=True)
@@ -801,13 +791,14 @@ class SkillChaining(object):
 
 		colors = [mc.to_hex(rgb) for rgb in rgb_color_palette]
 
-		# Plot trajectories
-		seen_options = []
-		for option_idx, option_name, x, y in trajectory_data[episode]:
-			dot = plt.scatter(x, y, color=colors[option_idx], alpha=alpha, label=option_name)
-			if option_name not in seen_options:
+		# Plot trajectories (trajectory_data holds TrajectoryRecorder columns)
+		in_episode = trajectory_data['episode'] == episode
+		for name_id, option_name in enumerate(trajectory_data['names']):
+			rows = in_episode & (trajectory_data['name_id'] == name_id)
+			if rows.any():
+				option_idx = trajectory_data['option_idx'][rows][0]
+				dot = plt.scatter(trajectory_data['x'][rows], trajectory_data['y'][rows], color=colors[option_idx], alpha=alpha, label=option_name)
 				patches.append(dot)
-			seen_options.append(option_name)
 
 		plt.xticks(())
 		plt.yticks(())
@@ -824,25 +815,10 @@ class SkillChaining(object):
 
 	# TODO: utilities
 	def plot_learning_curves(self, experiment_name, data):
-		# Create plotting dir (if not created)
-		path = '{}/plots/learning_curves'.format(experiment_name)
-		Path(path).mkdir(exist_ok=True)
-		
-		plt.plot(data, label=experiment_name)
-			
-		plt.title("{}".format(self.mdp.env_name))
-		plt.ylabel("Rewards")
-		plt.xlabel("Episodes")
-		plt.legend(title="Tests", bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
-
-		# Save plots
-		plt.savefig("{}/learning_curve.png".format(path), bbox_inches='tight', edgecolor='black', format='png', quality=100)
-		plt.close()
-
-		# TODO: remove
-		print("|-> Figure {}/learning_curve.png saved!".format(path))
+		draw_learning_curves(experiment_name, self.mdp.env_name, data)
 
 	# TODO: export option data
+	@profiled("save_all_data")
 	def save_all_data(self, logdir, args, episodic_scores, episodic_durations):
 		data_dir = logdir + '/run_{}_all_data'.format(self.seed)
 		Path(data_dir).mkdir(exist_ok=True)
@@ -850,6 +826,7 @@ class SkillChaining(object):
 		all_data = {}
 		all_data['args'] = args
 		all_data['option_data'] = self.option_data
+		all_data['classifier_snapshots'] = self.classifier_store.snapshots
 		all_data['x_mesh'] = self.x_mesh
 		all_data['y_mesh'] = self.y_mesh
 		all_data['x_mesh_hd'] = self.x_mesh_hd
@@ -860,6 +837,7 @@ class SkillChaining(object):
 		all_data['episodic_durations'] = episodic_durations
 		all_data['pretrained'] = args.pretrained
 		all_data['validation_scores'] = self.validation_scores
+		all_data['validation_episodes'] = self.validation_episodes
 		all_data['num_options_history'] = self.num_options_history
 		all_data['temporal_chain_breaks'] = self.temporal_chain_breaks
 		all_data['option_chain_breaks'] = self.option_chain_breaks
@@ -869,12 +847,186 @@ class SkillChaining(object):
 		all_data['temporal_full_chain_breaks'] = self.temporal_full_chain_breaks
 		all_data['goal_xy'] = self.goal_xy
 		all_data['start_xy'] = self.start_xy
-		all_data['trajectory_data'] = self.trajectory_data
+		all_data['trajectory_data'] = self.trajectory_recorder.as_arrays()
 
 		for var_name, data in all_data.items():
 			with open(data_dir + '/' + var_name + '.pkl', 'wb+') as f:
 				pickle.dump(data, f)
 
+	# TODO: export per episode data
+	@profiled("save_episode_data")
+	def save_episode_data(self, logdir, args, episode, episodic_scores, episodic_durations):
+		"""
+		Append what changed during `episode` to the run log instead of re-pickling everything (see RunLog).
+		Args:
+			logdir (str)
+			args (argparse.Namespace)
+			episode (int)
+			episodic_scores (list)
+			episodic_durations (list)
+		"""
+		if self.run_log is None:
+			data_dir = logdir + '/run_{}_all_data'.format(self.seed)
+			Path(data_dir).mkdir(exist_ok=True)
+			self.run_log = RunLog(data_dir)
+
+			header = {}
+			header['args'] = args
+			header['option_data'] = {}
+			header['classifier_snapshots'] = {}
+			header['x_mesh'] = self.x_mesh
+			header['y_mesh'] = self.y_mesh
+			header['x_mesh_hd'] = None
+			header['y_mesh_hd'] = None
+			header['experiment_name'] = self.experiment_name
+			header['per_episode_scores'] = []
+			header['mdp_env_name'] = self.mdp.env_name
+			header['episodic_durations'] = []
+			header['pretrained'] = args.pretrained
+			header['validation_scores'] = []
+			header['validation_episodes'] = []
+			header['num_options_history'] = []
+			header['temporal_chain_breaks'] = {}
+			header['option_chain_breaks'] = {}
+			header['goal_chain_breaks'] = {}
+			header['final_skill_chain'] = None
+			header['full_chain_breaks'] = {}
+			header['temporal_full_chain_breaks'] = {}
+			header['goal_xy'] = self.goal_xy
+			header['start_xy'] = self.start_xy
+			self.run_log.write_header(header)
+
+		delta = {}
+		delta['per_episode_scores'] = episodic_scores[-1:]
+		delta['episodic_durations'] = episodic_durations[-1:]
+		delta['option_data'] = {option_name : {episode : option[episode]}
+								for option_name, option in self.option_data.items() if episode in option}
+		delta['classifier_snapshots'] = self.classifier_store.snapshots_since(self.run_log_num_snapshots)
+		self.run_log_num_snapshots = len(self.classifier_store)
+		delta['full_chain_breaks'] = {option_name : {episode : breaks[episode]}
+									  for option_name, breaks in self.full_chain_breaks.items() if episode in breaks}
+		if episode in self.temporal_full_chain_breaks:
+			delta['temporal_full_chain_breaks'] = {episode : self.temporal_full_chain_breaks[episode]}
+
+		for var_name, length in self.run_log_lengths.items():
+			data = getattr(self, var_name)
+			delta[var_name] = data[length:]
+			self.run_log_lengths[var_name] = len(data)
+
+		self.run_log.append_episode(episode, delta)
+
+	def save_final_data(self):
+		"""Close the run log with the values only known once training is over."""
+		final = {}
+		final['x_mesh_hd'] = self.x_mesh_hd
+		final['y_mesh_hd'] = self.y_mesh_hd
+		final['temporal_chain_breaks'] = self.temporal_chain_breaks
+		final['option_chain_breaks'] = self.option_chain_breaks
+		final['goal_chain_breaks'] = self.goal_chain_breaks
+		final['final_skill_chain'] = self.final_skill_chain
+		# Evaluations can finish after the last episode was logged
+		final['validation_scores'] = self.validation_scores
+		final['validation_episodes'] = self.validation_episodes
+		self.run_log.write_final(final)
+
+	def index_results(self):
+		"""Add the run's learning curves to the results index of its experiments directory (see ResultsIndex)."""
+		results_index = ResultsIndex(os.path.dirname(os.path.abspath(self.log_dir)))
+		results_index.ingest_run(self.log_dir + '/run_{}_all_data'.format(self.seed), seed=self.seed)
+		results_index.close()
+
+	def save_profile(self, episode):
+		"""Log this episode's time breakdown and write the full time series next to the run's pickles."""
+		rows = profiler.end_episode(episode)
+		print(profiler.format_table(rows))
+
+		data_dir = self.log_dir + '/run_{}_all_data'.format(self.seed)
+		Path(data_dir).mkdir(exist_ok=True)
+		profiler.write(data_dir)
+
+	def save_checkpoint(self, per_episode_scores, per_episode_durations):
+		"""
+		Write everything needed to continue training after self.episode to self.checkpoint_file (atomically).
+		Args:
+			per_episode_scores (list)
+			per_episode_durations (list)
+		"""
+		Path(os.path.dirname(self.checkpoint_file)).mkdir(exist_ok=True)
+
+		# Evaluations still running would be lost on resume
+		self.merge_evaluations(wait=True)
+
+		all_options = list(self.trained_options)
+		if self.untrained_option not in all_options:
+			all_options.append(self.untrained_option)
+
+		checkpoint = {}
+		checkpoint['options'] = [option.state_dict(self.classifier_store) for option in all_options]
+		checkpoint['trained_options'] = [option.name for option in self.trained_options]
+		checkpoint['untrained_option'] = self.untrained_option.name
+		checkpoint['agent_over_options'] = self.agent_over_options.state_dict()
+		checkpoint['attributes'] = {name : getattr(self, name) for name in SkillChaining.CHECKPOINT_ATTRIBUTES}
+		checkpoint['debug_attributes'] = {name : dict(getattr(self, name)) for name in SkillChaining.CHECKPOINT_DEBUG_ATTRIBUTES}
+		checkpoint['per_episode_scores'] = per_episode_scores
+		checkpoint['per_episode_durations'] = per_episode_durations
+		checkpoint['rng'] = {'python' : random.getstate(),
+							 'numpy' : np.random.get_state(),
+							 'torch' : torch.get_rng_state(),
+							 'cuda' : torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None}
+
+		save_checkpoint(checkpoint, self.checkpoint_file)
+		print("|-> Checkpoint {} saved (next episode: {})".format(self.checkpoint_file, self.episode))
+
+	def load_checkpoint(self):
+		"""
+		Restore the state written by save_checkpoint.
+		Returns:
+			per_episode_scores (list)
+			per_episode_durations (list)
+		"""
+		checkpoint = load_checkpoint(self.checkpoint_file, self.device)
+
+		# Rebuild the options first so that parents can be relinked by name
+		options = {self.global_option.name : self.global_option}
+		for option_state in checkpoint['options']:
+			attributes = option_state['attributes']
+			if attributes['name'] not in options:
+				options[attributes['name']] = self.create_option(None, attributes['option_idx'], type='(checkpoint) ')
+		# The restored classifiers are the ones the restored store already holds snapshots of
+		classifier_store = checkpoint['attributes']['classifier_store']
+		for option_state in checkpoint['options']:
+			options[option_state['attributes']['name']].load_state_dict(option_state, options, classifier_store)
+
+		self.trained_options = [options[name] for name in checkpoint['trained_options']]
+		self.untrained_option = options[checkpoint['untrained_option']]
+
+		# The policy over options has one output per trained option
+		self.agent_over_options = DQNAgent(self.agent_over_options.state_size, len(self.trained_options), self.trained_options,
+										   seed=self.seed, name=self.agent_over_options.name,
+										   eps_start=self.agent_over_options.epsilon,
+										   tensor_log=self.agent_over_options.tensor_log,
+										   use_double_dqn=self.agent_over_options.use_ddqn,
+										   lr=self.agent_over_options.learning_rate,
+										   writer=self.writer, device=self.device)
+		self.agent_over_options.load_state_dict(checkpoint['agent_over_options'])
+
+		for name, value in checkpoint['attributes'].items():
+			setattr(self, name, value)
+		self.mesh_cache = MeshPredictionCache(self.classifier_store.snapshots)
+		for name, value in checkpoint['debug_attributes'].items():
+			setattr(self, name, defaultdict(lambda : [], value))
+
+		# Last, since building options and agents reseeds the generators
+		rng = checkpoint['rng']
+		random.setstate(rng['python'])
+		np.random.set_state(rng['numpy'])
+		torch.set_rng_state(rng['torch'])
+		if rng['cuda'] is not None and torch.cuda.is_available():
+			torch.cuda.set_rng_state_all(rng['cuda'])
+
+		print("|-> Resumed from {} at episode {}".format(self.checkpoint_file, self.episode))
+		return checkpoint['per_episode_scores'], checkpoint['per_episode_durations']
+
 	# TODO: intermediate processing for plots
 	def run_plot_processing(self, episode):
 		for option in self.trained_options:
@@ -885,6 +1037,9 @@ class SkillChaining(object):
 				else:
 					clfs_bounds = {'Optimistic initiation set':option.optimistic_classifier, 'Pessimistic initiation set':option.pessimistic_classifier}
 
+				# Keep versions, not live classifiers: each fit is snapshotted once and unchanged episodes share it
+				clfs_bounds = {clf_name : self.classifier_store.add(clf) for clf_name, clf in clfs_bounds.items()}
+
 				# Per episode data
 				if option.name not in self.option_data:
 					episode_data = {}
@@ -894,31 +1049,17 @@ class SkillChaining(object):
 					self.option_data[option.name][episode] = {'clfs_bounds' : clfs_bounds}
 
 	# TODO: main plotting class for episodic plots
+	@profiled("plot_episodic_plots")
 	def plot_episodic_plots(self, episode, per_episode_scores):
-		sns.set_style("white")
-		rgb_color_palette = sns.color_palette('deep')
-
-		# plot all options' boundaries
-		self.plot_multi_boundaries(x_mesh=self.x_mesh,
-									y_mesh=self.y_mesh,
-									option_data=self.option_data,
-									rgb_color_palette=rgb_color_palette,
-									experiment_name=self.log_dir,
-									alpha=0.7,
-									plot_eps=episode,
-									img_name='images/treasure_game_domain.png',
-									img_alpha=0.9,
-									goal=self.goal_xy,
-									start=self.start_xy)
-		
-		# plot learning curves
-		self.plot_learning_curves(self.log_dir, per_episode_scores)
+		# Boundaries and learning curves are drawn by the plotting worker process
+		self.plotting_worker.submit(PlottingWorker.make_frame(self.option_data, episode, per_episode_scores,
+																   self.classifier_store.snapshots))
 
 		# plot trajectories
 		# rgb_color_palette = [(0,0,0)] + rgb_color_palette
 		# self.plot_trajectory(x_mesh=self.x_mesh,
 		# 					 y_mesh=self.y_mesh,
-		# 					 trajectory_data=self.trajectory_data,
+		# 					 trajectory_data=self.trajectory_recorder.as_arrays(episode),
 		# 					 episode=episode,
 		# 					 experiment_name=self.log_dir,
 		# 					 rgb_color_palette=rgb_color_palette,
@@ -940,8 +1081,13 @@ class SkillChaining(object):
 		# For logging purposes
 		per_episode_scores = []
 		per_episode_durations = []
-		last_10_scores = deque(maxlen=10)
-		last_10_durations = deque(maxlen=10)
+		if self.resume:
+			if os.path.exists(self.checkpoint_file):
+				per_episode_scores, per_episode_durations = self.load_checkpoint()
+			else:
+				print("|-> No checkpoint at {}, starting from scratch".format(self.checkpoint_file))
+		last_10_scores = deque(per_episode_scores, maxlen=10)
+		last_10_durations = deque(per_episode_durations, maxlen=10)
 
 		# TODO: create plotting directory
 		if self.episodic_plots or self.generate_plots:
@@ -959,8 +1105,23 @@ class SkillChaining(object):
 		
 		self.x_mesh, self.y_mesh = self.make_meshgrid(width_coord, height_coord, h=0.1)	# for predictions
 
-		for episode in range(num_episodes):
+		if self.episodic_plots:
+			self.plotting_worker = PlottingWorker(log_dir=self.log_dir,
+												  x_mesh=self.x_mesh,
+												  y_mesh=self.y_mesh,
+												  env_name=self.mdp.env_name,
+												  img_name='images/treasure_game_domain.png',
+												  goal=self.goal_xy,
+												  start=self.start_xy,
+												  mask_cache_dir=self.log_dir + '/run_{}_all_data'.format(self.seed))
+
+		if self.eval_every > 0 and self.eval_workers > 0 and self.mdp_factory is not None:
+			self.evaluation_worker = EvaluationWorker(self.mdp_factory, self.max_steps, num_workers=self.eval_workers,
+													  num_episodes=self.eval_episodes, seed=self.seed)
+
+		for episode in range(self.episode, num_episodes):
 			print("|-> episode: {}".format(episode))	# TODO: remove
+			profiler.start_episode()
 			self.mdp.reset()
 			score = 0.
 			step_number = 0
@@ -1047,18 +1208,41 @@ class SkillChaining(object):
 
 			# TODO: save data per episode
 			if self.episodic_saves:
-				self.save_all_data(self.log_dir, self.args, per_episode_scores, per_episode_durations)
+				self.save_episode_data(self.log_dir, self.args, episode, per_episode_scores, per_episode_durations)
+
+			self.trajectory_recorder.end_episode(episode)
+
+			if self.profile:
+				self.save_profile(episode)
 
 			# TODO: update episode count of trained options
 			self.update_options_episode(episode)
 			self.episode += 1
 
+			if self.checkpoint_every > 0 and self.episode % self.checkpoint_every == 0:
+				self.save_checkpoint(per_episode_scores, per_episode_durations)
+
 		# TODO: post run assignments
 		self.final_skill_chain = [str(option.name) for option in self.get_skill_chain()]
 		self.x_mesh_hd, self.y_mesh_hd = self.make_meshgrid(width_coord, height_coord, h=0.01)	# save HD mesh for plotting
 
+		if self.evaluation_worker is not None:
+			self.merge_evaluations(wait=True)
+			self.evaluation_worker.close()
+
 		print("Saving all data...")
-		self.save_all_data(self.log_dir, self.args, per_episode_scores, per_episode_durations)
+		if self.run_log is not None:
+			self.save_final_data()
+		else:
+			self.save_all_data(self.log_dir, self.args, per_episode_scores, per_episode_durations)
+		self.mesh_cache.save(self.log_dir + '/run_{}_all_data'.format(self.seed))
+		self.index_results()
+
+		if self.writer is not None:
+			self.writer.close()
+
+		if self.plotting_worker is not None:
+			self.plotting_worker.close()
 
 		return per_episode_scores, per_episode_durations
 
@@ -1072,10 +1256,9 @@ class SkillChaining(object):
 		if self.writer is not None:
 			self.writer.add_scalar("Episodic scores", last_10_scores[-1], episode)
 
-		if episode > 0 and episode % 100 == 0:
-			eval_score = self.trained_forward_pass(render=False)
-			self.validation_scores.append(eval_score)
-			# print("\rEpisode {}\tValidation Score: {:.2f}".format(episode, eval_score))
+		self.merge_evaluations()
+		if self.eval_every > 0 and episode > 0 and episode % self.eval_every == 0:
+			self.evaluate(episode)
 
 		if self.generate_plots and episode % 10 == 0:
 			render_sampled_value_function(self.global_option.solver, episode, args.experiment_name)
@@ -1086,6 +1269,27 @@ class SkillChaining(object):
 				self.writer.add_scalar("{}_executions".format(trained_option.name),
 									   episode_option_executions[trained_option.name], episode)
 
+	@profiled("evaluate")
+	def evaluate(self, episode):
+		"""Evaluate the policy over options at the end of `episode`, in the background when there is an evaluation worker."""
+		if self.evaluation_worker is not None:
+			self.evaluation_worker.submit(episode, self.trained_options, self.agent_over_options)
+		else:
+			self.record_evaluation(episode, [self.trained_forward_pass(render=False)[0] for _ in range(self.eval_episodes)])
+
+	def merge_evaluations(self, wait=False):
+		"""Record the evaluations the evaluation worker has finished (all pending ones if `wait`)."""
+		if self.evaluation_worker is not None:
+			for episode, scores, _ in self.evaluation_worker.poll(wait):
+				self.record_evaluation(episode, scores)
+
+	def record_evaluation(self, episode, scores):
+		self.validation_scores.append(float(np.mean(scores)))
+		self.validation_episodes.append(episode)
+		print("|-> Validation score after episode {}: {:.2f} (over {} episodes)".format(episode, np.mean(scores), len(scores)))
+		if self.writer is not None:
+			self.writer.add_scalar("Validation score", np.mean(scores), episode)
+
 	def save_all_models(self):
 		for option in self.trained_options: # type: Option
 			save_model(option.solver, args.episodes, best=False)
@@ -1114,6 +1318,7 @@ class SkillChaining(object):
 			pickle.dump(self.num_options_history, _f)
 
 	def perform_experiments(self):
+		plt = get_pyplot()
 		for option in self.trained_options:
 			visualize_dqn_replay_buffer(option.solver, args.experiment_name)
 
@@ -1139,25 +1344,10 @@ class SkillChaining(object):
 		Called when skill chaining has finished training: execute options when possible and then atomic actions
 		Returns:
 			overall_reward (float): score accumulated over the course of the episode.
+			option_trajectories (list): one list of (option idx, State) per option execution
 		"""
-		self.mdp.reset()
-		state = deepcopy(self.mdp.init_state)
-		overall_reward = 0.
-		self.mdp.render = render
-		num_steps = 0
-		option_trajectories = []
-
-		while not state.is_terminal() and num_steps < self.max_steps:
-			selected_option = self.act(state)
-
-			option_reward, next_state, num_steps, option_state_trajectory = selected_option.trained_option_execution(self.mdp, num_steps)
-			overall_reward += option_reward
-
-			# option_state_trajectory is a list of (o, s) tuples
-			option_trajectories.append(option_state_trajectory)
-
-			state = next_state
-
+		overall_reward, _, option_trajectories = run_evaluation_episode(self.mdp, self.trained_options, self.agent_over_options,
+																	   self.max_steps, render=render)
 		return overall_reward, option_trajectories
 
 # TODO: restructured
@@ -1198,34 +1388,49 @@ if __name__ == '__main__':
 	parser.add_argument("--discrete_actions", type=bool, help="Whether or not actions are discrete", default=False)
 	parser.add_argument("--lr_dqn", type=float, help="DQN learning rate", default=1e-4)
 	parser.add_argument("--use_old", type=bool, help="Whether to use older DSC methods", default=False)
-	parser.add_argument("--episodic_saves", type=bool, help="Save all data per episode", default=False)
+	parser.add_argument("--episodic_saves", type=bool, help="Append each episode's data to the run log", default=False)
 	parser.add_argument("--use_chain_fix", type=bool, help="Whether or not to use chain fixing method", default=False)
+	parser.add_argument("--profile", type=bool, help="Log per-episode wall time of each training phase", default=False)
+	parser.add_argument("--metrics_backend", type=str, help="tensorboard/csv sink for --tensor_log metrics", default="tensorboard")
+	parser.add_argument("--metrics_flush_secs", type=float, help="Seconds between background metric flushes", default=30.)
+	parser.add_argument("--checkpoint_every", type=int, help="Episodes between training checkpoints (0 = never)", default=0)
+	parser.add_argument("--resume", type=bool, help="Resume from the run's last checkpoint", default=False)
+	parser.add_argument("--replay_ram_mb", type=float, help="RAM budget (MB) shared by all replay buffers before they spill to disk", default=None)
+	parser.add_argument("--replay_spill_dir", type=str, help="Directory for spilled replay transitions (default: a temp dir)", default=None)
+	parser.add_argument("--eval_every", type=int, help="Episodes between evaluations of the policy over options (0 = never)", default=100)
+	parser.add_argument("--eval_episodes", type=int, help="Episodes (start states) per evaluation", default=1)
+	parser.add_argument("--eval_workers", type=int, help="Background evaluation processes (0 = evaluate inline)", default=1)
 	args = parser.parse_args()
 
 	if "reacher" in args.env.lower():
 		from simple_rl.tasks.fixed_reacher.FixedReacherMDPClass import FixedReacherMDP
-		overall_mdp = FixedReacherMDP(seed=args.seed, dense_reward=args.dense_reward, render=args.render)
+		mdp_factory = functools.partial(FixedReacherMDP, seed=args.seed, dense_reward=args.dense_reward, render=False)
+		overall_mdp = mdp_factory(render=args.render)
 		state_dim = overall_mdp.init_state.features().shape[0]
 		action_dim = overall_mdp.env.action_space.shape[0]
 	elif "maze" in args.env.lower():
 		from simple_rl.tasks.point_maze.PointMazeMDPClass import PointMazeMDP
-		overall_mdp = PointMazeMDP(dense_reward=args.dense_reward, seed=args.seed, render=args.render)
+		mdp_factory = functools.partial(PointMazeMDP, dense_reward=args.dense_reward, seed=args.seed, render=False)
+		overall_mdp = mdp_factory(render=args.render)
 		state_dim = 6
 		action_dim = 2
 	elif "point" in args.env.lower():
 		from simple_rl.tasks.point_env.PointEnvMDPClass import PointEnvMDP
-		overall_mdp = PointEnvMDP(control_cost=args.control_cost, render=args.render)
+		mdp_factory = functools.partial(PointEnvMDP, control_cost=args.control_cost, render=False)
+		overall_mdp = mdp_factory(render=args.render)
 		state_dim = 4
 		action_dim = 2
 	elif "treasure" in args.env.lower():	# TODO: new treasure game domain
 		from simple_rl.tasks.treasure_game.TreasureGameMDPClass import TreasureGameMDP
-		overall_mdp = TreasureGameMDP(seed=args.seed, dense_reward=args.dense_reward, render=args.render)
+		mdp_factory = functools.partial(TreasureGameMDP, seed=args.seed, dense_reward=args.dense_reward, render=False)
+		overall_mdp = mdp_factory(render=args.render)
 		state_dim = overall_mdp.init_state.features().shape[0]
 		action_dim = overall_mdp.env.action_space.n
 		overall_mdp.env.seed(args.seed)
 	else:
 		from simple_rl.tasks.gym.GymMDPClass import GymMDP
-		overall_mdp = GymMDP(args.env, render=args.render)
+		mdp_factory = functools.partial(GymMDP, args.env, render=False)
+		overall_mdp = mdp_factory(render=args.render)
 		state_dim = overall_mdp.env.observation_space.shape[0]
 		action_dim = overall_mdp.env.action_space.n
 		overall_mdp.env.seed(args.seed)
@@ -1247,13 +1452,18 @@ if __name__ == '__main__':
 
 	q0 = 0. if args.init_q == "zero" else None
 
+	configure_replay_storage(ram_mb=args.replay_ram_mb, spill_dir=args.replay_spill_dir)
+
 	chainer = SkillChaining(overall_mdp, args.steps, args.lr_a, args.lr_c, args.lr_dqn, args.ddpg_batch_size,
 							seed=args.seed, subgoal_reward=args.subgoal_reward,
 							log_dir=logdir, num_subgoal_hits_required=args.num_subgoal_hits,
 							enable_option_timeout=args.option_timeout, init_q=q0, use_full_smdp_update=args.use_smdp_update,
 							generate_plots=args.generate_plots, episodic_plots=args.episodic_plots, tensor_log=args.tensor_log, device=args.device,
 							opt_nu=args.opt_nu, pes_nu=args.pes_nu, experiment_name=args.experiment_name, num_run=args.num_run, discrete_actions=args.discrete_actions,
-							use_old=args.use_old, episodic_saves=args.episodic_saves, args=args, use_chain_fix=args.use_chain_fix)
+							use_old=args.use_old, episodic_saves=args.episodic_saves, args=args, use_chain_fix=args.use_chain_fix,
+							profile=args.profile, metrics_backend=args.metrics_backend, metrics_flush_secs=args.metrics_flush_secs,
+							checkpoint_every=args.checkpoint_every, resume=args.resume, mdp_factory=mdp_factory,
+							eval_every=args.eval_every, eval_episodes=args.eval_episodes, eval_workers=args.eval_workers)
 	episodic_scores, episodic_durations = chainer.skill_chaining(args.episodes, args.steps)
 
 	# TODO: print final run info
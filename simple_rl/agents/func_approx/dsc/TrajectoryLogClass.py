@@ -0,0 +1,128 @@
+# Python imports.
+from __future__ import print_function
+import os
+import glob
+import tempfile
+import numpy as np
+
+
+class TrajectoryRecorder(object):
+	"""Columnar log of the (x, y) positions visited while executing options.
+
+	Rows are appended into growable NumPy columns (amortized O(1) per row) instead of Python lists,
+	and option names are interned once into `self.names` so every row only stores an integer id.
+
+	With `out_dir`, each completed episode is flushed to `{out_dir}/episode_NNNNNN.npz` by end_episode
+	and dropped from memory, so resident memory is bounded by one episode. Without it, every episode
+	is kept in memory (as_arrays returns the whole run).
+	"""
+
+	COLUMNS = (("episode", np.int32), ("step", np.int32), ("option_idx", np.int32), ("name_id", np.int16),
+			   ("x", np.float32), ("y", np.float32))
+
+	def __init__(self, out_dir=None, initial_capacity=4096):
+		"""
+		Args:
+			out_dir (str): directory completed episodes are streamed to (None keeps them in memory)
+			initial_capacity (int): rows allocated up front, doubled whenever full
+		"""
+		self.out_dir = out_dir
+		if out_dir is not None and not os.path.exists(out_dir):
+			os.makedirs(out_dir)
+
+		self.names = []
+		self.name_ids = {}
+		self.size = 0
+		self.columns = {column : np.empty(initial_capacity, dtype=dtype) for column, dtype in TrajectoryRecorder.COLUMNS}
+
+	def __len__(self):
+		return self.size
+
+	def intern(self, name):
+		if name not in self.name_ids:
+			self.name_ids[name] = len(self.names)
+			self.names.append(name)
+		return self.name_ids[name]
+
+	def _reserve(self, num_rows):
+		capacity = len(self.columns["x"])
+		if self.size + num_rows <= capacity:
+			return
+		while capacity < self.size + num_rows:
+			capacity *= 2
+		for column, data in self.columns.items():
+			grown = np.empty(capacity, dtype=data.dtype)
+			grown[:self.size] = data[:self.size]
+			self.columns[column] = grown
+
+	def record(self, episode, step_number, option_idx, name, positions):
+		"""
+		Args:
+			episode (int)
+			step_number (int): step of the episode the first position was reached at
+			option_idx (int)
+			name (str): option name
+			positions (np.ndarray): (n, 2) array of (x, y) positions, in execution order
+		"""
+		positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+		num_rows = len(positions)
+		if num_rows == 0:
+			return
+
+		self._reserve(num_rows)
+		rows = slice(self.size, self.size + num_rows)
+		self.columns["episode"][rows] = episode
+		self.columns["step"][rows] = np.arange(step_number, step_number + num_rows)
+		self.columns["option_idx"][rows] = option_idx
+		self.columns["name_id"][rows] = self.intern(name)
+		self.columns["x"][rows] = positions[:, 0]
+		self.columns["y"][rows] = positions[:, 1]
+		self.size += num_rows
+
+	def as_arrays(self, episode=None):
+		"""Rows still in memory (only those of `episode` if given) as a dict of column arrays, plus the interned `names`."""
+		rows = slice(0, self.size)
+		if episode is not None:
+			rows = self.columns["episode"][:self.size] == episode
+		arrays = {column : data[:self.size][rows].copy() for column, data in self.columns.items()}
+		arrays["names"] = np.array(self.names)
+		return arrays
+
+	def end_episode(self, episode):
+		"""Stream the rows of the episode that just finished to disk and release them (no-op without out_dir)."""
+		if self.out_dir is None:
+			return
+
+		file_name = os.path.join(self.out_dir, "episode_{:06d}.npz".format(episode))
+		fd, tmp_name = tempfile.mkstemp(dir=self.out_dir, prefix=".tmp_", suffix=".npz")
+		with os.fdopen(fd, "wb") as f:
+			np.savez(f, **self.as_arrays())
+		os.replace(tmp_name, file_name)
+
+		self.size = 0
+
+
+def load_trajectories(trajectory_dir):
+	"""
+	Args:
+		trajectory_dir (str): out_dir of a streaming TrajectoryRecorder
+
+	Returns:
+		(dict): column name -> array over every flushed episode, plus `names` (name_id -> option name);
+				empty columns (same layout) for a run that flushed no episode
+	"""
+	episode_files = sorted(glob.glob(os.path.join(trajectory_dir, "episode_*.npz")))
+	if len(episode_files) == 0:
+		arrays = {column : np.empty(0, dtype=dtype) for column, dtype in TrajectoryRecorder.COLUMNS}
+		arrays["names"] = np.array([], dtype=str)
+		return arrays
+
+	episodes = []
+	for episode_file in episode_files:
+		with np.load(episode_file) as data:
+			episodes.append({key : data[key] for key in data.files})
+
+	# Names are only ever appended to, so the last episode's list covers every earlier name_id
+	arrays = {column : np.concatenate([episode[column] for episode in episodes]) for column, _ in TrajectoryRecorder.COLUMNS}
+	arrays["names"] = episodes[-1]["names"]
+	return arrays
@@ -1,18 +1,13 @@
 # Python imports.
 import pdb
 import numpy as np
-import scipy.interpolate
-import matplotlib.pyplot as plt
-import time
-import torch
-import seaborn as sns
-sns.set()
-import imageio
-from PIL import Image
 
 # Other imports.
 from simple_rl.tasks.point_maze.PointMazeStateClass import PointMazeState
-from simple_rl.tasks.point_maze.PointMazeMDPClass import PointMazeMDP
+
+# matplotlib, seaborn, scipy, imageio and the MuJoCo maze are imported by the helpers that use them, so importing
+# this module (and the agents that import it) stays cheap and works on headless machines without MuJoCo.
+_seaborn_styled = False
 
 class Experience(object):
 	def __init__(self, s, a, r, s_prime):
@@ -40,7 +35,18 @@ class Experience(object):
 # Plotting utils
 # ---------------
 
+def get_pyplot():
+	"""matplotlib.pyplot, with the seaborn style applied the first time it is requested."""
+	global _seaborn_styled
+	import matplotlib.pyplot as plt
+	if not _seaborn_styled:
+		import seaborn as sns
+		sns.set()
+		_seaborn_styled = True
+	return plt
+
 def plot_trajectory(trajectory, color='k', marker="o"):
+	plt = get_pyplot()
 	for i, state in enumerate(trajectory):
 		if isinstance(state, PointMazeState):
 			x = state.position[0]
@@ -61,6 +67,12 @@ def plot_all_trajectories_in_initiation_data(initiation_data, marker="o"):
 		color_idx = i % len(possible_colors)
 		plot_trajectory(trajectory, color=possible_colors[color_idx], marker=marker)
 
+# Grid of point-maze states on which value functions are sampled: each (x, y) position is paired with every
+# combination of the velocities, headings and angular velocities below.
+GRID_VELOCITIES = np.array([-0.01, -0.1, 0., 0.01, 0.1])
+GRID_THETAS = np.array([-90., -45., 0., 45., 90.])
+GRID_THETA_DOTS = np.array([-1., 0., 1.])
+
 def get_grid_states():
 	ss = []
 	for x in np.arange(0., 11., 1.):
@@ -69,53 +81,98 @@ def get_grid_states():
 			ss.append(s)
 	return ss
 
-
-def get_initiation_set_values(option):
-	values = []
-	for x in np.arange(-2., 11., 1.):
-		for y in np.arange(-2., 18., 1.):
-			s = PointMazeState(position=np.array([x, y]), velocity=np.array([0, 0]),
-							   theta=0, theta_dot=0, done=False)
-			values.append(option.is_init_true(s))
-
-	return values
-
-
-def get_values(solver, init_values=False):
-	values = []
-	for x in np.arange(0., 11., 1.):
-		for y in np.arange(0., 11., 1.):
-			v = []
-			for vx in [-0.01, -0.1, 0., 0.01, 0.1]:
-				for vy in [-0.01, -0.1, 0., 0.01, 0.1]:
-					for theta in [-90., -45., 0., 45., 90.]:
-						for theta_dot in [-1., 0., 1.]:
-							s = PointMazeState(position=np.array([x, y]), velocity=np.array([vx, vy]),
-											   theta=theta, theta_dot=theta_dot, done=False)
-
-							if not init_values:
-								v.append(solver.get_value(s.features()))
-							else:
-								v.append(solver.is_init_true(s))
-
-			if not init_values:
-				values.append(np.mean(v))
-			else:
-				values.append(np.sum(v))
-
-	return values
-
-def render_sampled_value_function(solver, episode=None, experiment_name=""):
-	states = get_grid_states()
-	values = get_values(solver)
-
-	x = np.array([state.position[0] for state in states])
-	y = np.array([state.position[1] for state in states])
-	xi, yi = np.linspace(x.min(), x.max(), 1000), np.linspace(y.min(), y.max(), 1000)
+def get_grid_positions(xs=np.arange(0., 11., 1.), ys=np.arange(0., 11., 1.)):
+	"""(len(xs) * len(ys), 2) matrix of positions, in the order of get_grid_states (x major, y minor)."""
+	xx, yy = np.meshgrid(xs, ys, indexing="ij")
+	return np.stack([xx.ravel(), yy.ravel()], axis=1)
+
+def get_state_grid(positions):
+	"""
+	Args:
+		positions (np.ndarray): (P, 2) matrix of (x, y) positions
+
+	Returns:
+		states (np.ndarray): (P * K, 6) matrix of PointMazeState features, position major, where K is the number of
+							 (vx, vy, theta, theta_dot) combinations of the sampling grid
+	"""
+	vx, vy, theta, theta_dot = np.meshgrid(GRID_VELOCITIES, GRID_VELOCITIES, GRID_THETAS, GRID_THETA_DOTS, indexing="ij")
+	dynamics = np.stack([theta.ravel(), vx.ravel(), vy.ravel(), theta_dot.ravel()], axis=1)
+	num_positions, num_dynamics = positions.shape[0], dynamics.shape[0]
+
+	# Same feature order as PointMazeState: x, y, theta, vx, vy, theta_dot
+	states = np.empty((num_positions * num_dynamics, 6))
+	states[:, :2] = np.repeat(positions, num_dynamics, axis=0)
+	states[:, 2:] = np.tile(dynamics, (num_positions, 1))
+	return states
+
+def get_batched_values(solver, states, batch_size=8192):
+	"""
+	Args:
+		solver (DDPGAgent or DQNAgent)
+		states (np.ndarray): (N, state_dim) matrix of states
+		batch_size (int): number of states per forward pass
+
+	Returns:
+		values (np.ndarray): (N,) value of each state under the solver
+	"""
+	if not hasattr(solver, "get_batched_values"):
+		return np.array([solver.get_value(state) for state in states], dtype=np.float64).ravel()
+	return np.concatenate([solver.get_batched_values(states[i:i + batch_size]) for i in range(0, states.shape[0], batch_size)])
+
+def get_initiation_set_values(option, positions=None):
+	"""
+	Args:
+		option (Option)
+		positions (np.ndarray): (P, 2) positions to classify, defaults to a grid over [-2, 10] x [-2, 17]
+
+	Returns:
+		values (np.ndarray): (P,) whether the option can be initiated at each position (at rest)
+	"""
+	if positions is None:
+		positions = get_grid_positions(np.arange(-2., 11., 1.), np.arange(-2., 18., 1.))
+	states = np.zeros((positions.shape[0], 6))
+	states[:, :2] = positions
+	return np.asarray(option.batched_is_init_true(states), dtype=np.float64)
+
+def get_values(solver, init_values=False, positions=None):
+	"""
+	Args:
+		solver (DDPGAgent or DQNAgent, or an Option when init_values is set)
+		init_values (bool): count the grid states in the option's initiation set instead of averaging values
+		positions (np.ndarray): (P, 2) positions to evaluate, defaults to get_grid_positions()
+
+	Returns:
+		values (np.ndarray): (P,) mean value (or initiation count) over the sampled dynamics at each position
+	"""
+	if positions is None:
+		positions = get_grid_positions()
+	states = get_state_grid(positions)
+
+	if not init_values:
+		values = get_batched_values(solver, states)
+		return values.reshape(positions.shape[0], -1).mean(axis=1)
+	inits = np.asarray(solver.batched_is_init_true(states), dtype=np.float64)
+	return inits.reshape(positions.shape[0], -1).sum(axis=1)
+
+def render_sampled_value_function(solver, episode=None, experiment_name="", resolution=250):
+	"""
+	Args:
+		solver (DDPGAgent or DQNAgent)
+		episode (int)
+		experiment_name (str)
+		resolution (int): side of the grid the sampled values are interpolated on
+	"""
+	import scipy.interpolate
+	plt = get_pyplot()
+	positions = get_grid_positions()
+	values = get_values(solver, positions=positions)
+
+	x, y = positions[:, 0], positions[:, 1]
+	xi, yi = np.linspace(x.min(), x.max(), resolution), np.linspace(y.min(), y.max(), resolution)
 	xx, yy = np.meshgrid(xi, yi)
 	rbf = scipy.interpolate.Rbf(x, y, values, function="linear")
 	zz = rbf(xx, yy)
-	plt.imshow(zz, vmin=min(values), vmax=max(values), extent=[x.min(), x.max(), y.min(), y.max()], origin="lower")
+	plt.imshow(zz, vmin=values.min(), vmax=values.max(), extent=[x.min(), x.max(), y.min(), y.max()], origin="lower")
 	plt.colorbar()
 	name = solver.name if episode is None else solver.name + "_{}_{}".format(experiment_name, episode)
 	plt.savefig("value_function_plots/{}/{}_value_function.png".format(experiment_name, name))
@@ -129,6 +186,7 @@ def make_meshgrid(x, y, h=.02):
 	return xx, yy
 
 def plot_one_class_initiation_classifier(option, episode=None, experiment_name=""):
+	plt = get_pyplot()
 	plt.figure(figsize=(8.0, 5.0))
 	X = option.construct_feature_matrix(option.positive_examples)
 	X0, X1 = X[:, 0], X[:, 1]
@@ -149,6 +207,7 @@ def plot_one_class_initiation_classifier(option, episode=None, experiment_name="
 	plt.close()
 
 def visualize_dqn_replay_buffer(solver, experiment_name=""):
+	plt = get_pyplot()
 	goal_transitions = list(filter(lambda e: e[2] >= 0 and e[4] == 1, solver.replay_buffer.memory))
 	cliff_transitions = list(filter(lambda e: e[2] < 0 and e[4] == 1, solver.replay_buffer.memory))
 	non_terminals = list(filter(lambda e: e[4] == 0, solver.replay_buffer.memory))
@@ -173,17 +232,19 @@ def visualize_dqn_replay_buffer(solver, experiment_name=""):
 	plt.savefig("value_function_plots/{}/{}_replay_buffer_analysis.png".format(experiment_name, solver.name))
 	plt.close()
 
-def plot_two_class_classifier(option, episode, experiment_name):
-	states = get_grid_states()
-	values = get_initiation_set_values(option)
+def plot_two_class_classifier(option, episode, experiment_name, resolution=250):
+	import imageio
+	import scipy.interpolate
+	plt = get_pyplot()
+	positions = get_grid_positions(np.arange(-2., 11., 1.), np.arange(-2., 18., 1.))
+	values = get_initiation_set_values(option, positions)
 
-	x = np.array([state.position[0] for state in states])
-	y = np.array([state.position[1] for state in states])
-	xi, yi = np.linspace(x.min(), x.max(), 1000), np.linspace(y.min(), y.max(), 1000)
+	x, y = positions[:, 0], positions[:, 1]
+	xi, yi = np.linspace(x.min(), x.max(), resolution), np.linspace(y.min(), y.max(), resolution)
 	xx, yy = np.meshgrid(xi, yi)
 	rbf = scipy.interpolate.Rbf(x, y, values, function="linear")
 	zz = rbf(xx, yy)
-	plt.imshow(zz, vmin=min(values), vmax=max(values), extent=[x.min(), x.max(), y.min(), y.max()], origin="lower",
+	plt.imshow(zz, vmin=values.min(), vmax=values.max(), extent=[x.min(), x.max(), y.min(), y.max()], origin="lower",
 			   alpha=0.6, cmap=plt.cm.bwr)
 	#plt.colorbar()
 
@@ -208,6 +269,7 @@ def plot_two_class_classifier(option, episode, experiment_name):
 	plt.close()
 
 def visualize_smdp_updates(global_solver, experiment_name=""):
+	plt = get_pyplot()
 	smdp_transitions = list(filter(lambda e: isinstance(e.action, int) and e.action > 0, global_solver.replay_buffer.memory))
 	negative_transitions = list(filter(lambda e: e.done == 0, smdp_transitions))
 	terminal_transitions = list(filter(lambda e: e.done == 1, smdp_transitions))
@@ -231,6 +293,7 @@ def visualize_smdp_updates(global_solver, experiment_name=""):
 	plt.close()
 
 def visualize_next_state_reward_heat_map(solver, episode=None, experiment_name=""):
+	plt = get_pyplot()
 	next_states = [experience[3] for experience in solver.replay_buffer.memory]
 	rewards = [experience[2] for experience in solver.replay_buffer.memory]
 	x = np.array([state[0] for state in next_states])
@@ -250,6 +313,9 @@ def visualize_next_state_reward_heat_map(solver, episode=None, experiment_name="
 
 
 def replay_trajectory(trajectory, dir_name):
+	from PIL import Image
+	from simple_rl.tasks.point_maze.PointMazeMDPClass import PointMazeMDP
+
 	colors = ["0 0 0 1", "0 0 1 1", "0 1 0 1", "1 0 0 1", "1 1 0 1", "1 1 1 1", "1 0 1 1", ""]
 
 	for i, (option, state) in enumerate(trajectory):
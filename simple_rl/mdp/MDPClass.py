@@ -78,8 +78,71 @@ class MDP(object):
 
         return reward, next_state
 
+    def transition_distribution(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns:
+            (list): [(State, float)], every next state with its probability under T(. | @state, @action).
+
+        Summary:
+            Optional: tabular MDPs that know their dynamics exactly override this, and planners
+            then use it instead of sampling @transition_func (see has_transition_distribution).
+        '''
+        raise NotImplementedError("(simple_rl) " + type(self).__name__ + " has no exact transition distribution.")
+
+    def batched_transition_distribution(self, states, actions):
+        '''
+        Args:
+            states (list of State)
+            actions (list)
+
+        Returns:
+            (list): distributions[i][j] is transition_distribution(states[i], actions[j]).
+        '''
+        return [[self.transition_distribution(s, a) for a in actions] for s in states]
+
+    def has_transition_distribution(self):
+        '''
+        Returns:
+            (bool): True iff transition_distribution describes @self.transition_func, ie. both are
+                defined by the same class (a subclass with new dynamics falls back to sampling).
+        '''
+        transition_func = getattr(self.transition_func, "__func__", None)
+        if transition_func is None or getattr(self.transition_func, "__self__", None) is not self:
+            return False
+        distribution_owner = _defining_class(type(self), "transition_distribution")
+        return distribution_owner is not MDP and distribution_owner is _defining_class(type(self), transition_func.__name__)
+
+    @staticmethod
+    def _merge_outcomes(outcomes):
+        '''
+        Args:
+            outcomes (list): [(State, float)], possibly with repeated states.
+
+        Returns:
+            (list): [(State, float)] with the probabilities of equal states summed, zero probabilities dropped.
+        '''
+        probs = {}
+        for s_prime, prob in outcomes:
+            if prob > 0:
+                probs[s_prime] = probs.get(s_prime, 0.0) + prob
+        return list(probs.items())
+
     def reset(self):
         self.cur_state = copy.deepcopy(self.init_state)
 
     def end_of_instance(self):
         pass
+
+def _defining_class(cls, name):
+    '''
+    Returns:
+        (type): The class in the MRO of @cls whose body defines the attribute @name.
+    '''
+    for klass in cls.__mro__:
+        if name in vars(klass):
+            return klass
+    return None
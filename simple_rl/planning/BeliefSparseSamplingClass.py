@@ -1,10 +1,13 @@
 from math import log
 import numpy as np
 import copy
-from collections import defaultdict
+from collections import defaultdict, Counter, OrderedDict
+import multiprocessing as mp
 import random
+import time
 
 from simple_rl.pomdp.BeliefMDPClass import BeliefMDP
+from simple_rl.pomdp.BeliefStateClass import BeliefState
 
 
 class BeliefSparseSampling(object):
@@ -14,8 +17,15 @@ class BeliefSparseSampling(object):
     Assuming that you don't have access to the underlying transition dynamics, but do have access to a naiive generative
     model of the underlying MDP, this algorithm performs on-line, near-optimal planning with a per-state running time
     that has no dependence on the number of states in the MDP.
+
+    The `width` samples of a (s, a) are drawn in one call to the generative model (sample_successors, when it has
+    one) and each distinct successor is expanded once, weighted by how often it was drawn. Values are memoized per
+    (belief key, horizon, height) in an LRU table of at most `memo_size` entries. With a `time_budget`, planning
+    deepens the tree one level at a time and acts on the deepest one finished in time; with `num_workers` > 1,
+    the root actions are evaluated in parallel processes.
     '''
-    def __init__(self, gen_model, gamma, tol, max_reward, state, name="bss"):
+    def __init__(self, gen_model, gamma, tol, max_reward, state, name="bss", memo_size=100000, key_decimals=6,
+                 time_budget=None, num_workers=1):
         '''
         Args:
              gen_model (BeliefMDP): Model of our MDP -- we tell it what action we are performing from some state s
@@ -24,6 +34,10 @@ class BeliefSparseSampling(object):
              tol (float): Most expected difference between optimal and computed value function
              max_reward (float): Upper bound on the reward you can get for any state, action
              state (State): This is the current state, and we need to output the action to take here
+             memo_size (int): Most values kept in the memo, the least recently used ones are dropped first
+             key_decimals (int): Beliefs equal up to this many decimals share their memoized values
+             time_budget (float): Seconds allowed per plan_from_state (None plans to the full horizon)
+             num_workers (int): Processes evaluating the root actions (forked, so only where fork is available)
         '''
         self.tol = tol
         self.gamma = gamma
@@ -32,12 +46,18 @@ class BeliefSparseSampling(object):
         self.current_state = state
         self.horizon = self._horizon
         self.width = self._width
+        self.memo_size = memo_size
+        self.key_decimals = key_decimals
+        self.time_budget = time_budget
+        self.num_workers = num_workers
 
         print('BSS Horizon = {} \t Width = {}'.format(self.horizon, self.width))
 
         self.name = name
         self.root_level_qvals = defaultdict()
-        self.nodes_by_horizon  = defaultdict(lambda: defaultdict(float))
+        self.value_memo = OrderedDict()
+        self._root_horizon = self.horizon
+        self._deadline = None
 
     @property
     def _horizon(self):
@@ -98,12 +118,24 @@ class BeliefSparseSampling(object):
         Returns:
             average_reward (float): measure of how good (s, a) would be
         '''
+        width = self._get_width_at_height(self._root_horizon - horizon)
         total = 0.0
-        width = self._get_width_at_height(self.horizon - horizon)
-        for _ in range(width):
-            next_state = self.gen_model.transition_func(state, action)
-            total += self.gen_model.reward_func(state, action) + (self.gamma * self._estimate_v(next_state, horizon-1))
-        return total / float(width)
+        for next_state, count in self._sample_successors(state, action, width):
+            total += count * self._estimate_v(next_state, horizon-1)
+        return self.gen_model.reward_func(state, action) + self.gamma * total / float(width)
+
+    def _sample_successors(self, state, action, width):
+        '''
+        Returns:
+            successors (list): (next state, number of the `width` samples that gave it)
+        '''
+        if hasattr(self.gen_model, 'sample_successors'):
+            return self.gen_model.sample_successors(state, action, width)
+        return list(Counter(self.gen_model.transition_func(state, action) for _ in range(width)).items())
+
+    def _memo_key(self, state, horizon):
+        state_key = state.key(self.key_decimals) if isinstance(state, BeliefState) else state
+        return state_key, horizon, self._root_horizon - horizon
 
     def _estimate_v(self, state, horizon):
         '''
@@ -114,16 +146,44 @@ class BeliefSparseSampling(object):
         Returns:
             V(s) (float)
         '''
-        if state in self.nodes_by_horizon:
-            if horizon in self.nodes_by_horizon[state]:
-                return self.nodes_by_horizon[state][horizon]
+        key = self._memo_key(state, horizon)
+        if key in self.value_memo:
+            self.value_memo.move_to_end(key)
+            return self.value_memo[key]
+
+        if self._deadline is not None and time.time() > self._deadline:
+            raise _OutOfTime()
 
         if self.gen_model.is_in_goal_state():
-            self.nodes_by_horizon[state][horizon] = self.gen_model.reward_func(state, random.choice(self.gen_model.actions))
+            value = self.gen_model.reward_func(state, random.choice(self.gen_model.actions))
         else:
-            self.nodes_by_horizon[state][horizon] = np.max(self._estimate_qs(state, horizon))
+            value = np.max(self._estimate_qs(state, horizon))
 
-        return self.nodes_by_horizon[state][horizon]
+        self.value_memo[key] = value
+        if len(self.value_memo) > self.memo_size:
+            self.value_memo.popitem(last=False)
+        return value
+
+    def _root_qvalues(self, state, horizon):
+        '''
+        Args:
+            state (State)
+            horizon (int): depth of the tree
+
+        Returns:
+            qvalues (np.ndarray): Q(state, a) of every action, evaluated in parallel with `num_workers` > 1
+        '''
+        self._root_horizon = horizon
+        if self.num_workers <= 1 or 'fork' not in mp.get_all_start_methods():
+            return self._estimate_qs(state, horizon)
+
+        from concurrent.futures import ProcessPoolExecutor
+        # Forked workers start from this planner (model, memo, deadline) as it is now; only the Q-values come back.
+        _root_planner['planner'] = self
+        seeds = [random.randint(0, 2 ** 31 - 1) for _ in self.gen_model.actions]
+        with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=mp.get_context('fork')) as pool:
+            futures = [pool.submit(_root_qvalue, state, action, horizon, seed) for action, seed in zip(self.gen_model.actions, seeds)]
+            return np.array([future.result() for future in futures])
 
     def plan_from_state(self, state):
         '''
@@ -133,15 +193,39 @@ class BeliefSparseSampling(object):
         Returns:
             action (str): near-optimal action to perform from state
         '''
-        if state in self.root_level_qvals:
-            qvalues = self.root_level_qvals[state]
+        root_key = state.key(self.key_decimals) if isinstance(state, BeliefState) else state
+        if root_key in self.root_level_qvals:
+            qvalues = self.root_level_qvals[root_key]
+        elif self.time_budget is None:
+            qvalues = self._root_qvalues(state, self.horizon)
+            self.root_level_qvals[root_key] = qvalues
         else:
-            init_horizon = self.horizon
-            qvalues = self._estimate_qs(state, init_horizon)
+            qvalues = self._anytime_qvalues(state)
         action_idx = np.argmax(qvalues)
-        self.root_level_qvals[state] = qvalues
         return self.gen_model.actions[action_idx]
 
+    def _anytime_qvalues(self, state):
+        '''
+        Deepens the tree one level at a time until `time_budget` runs out (the first level is always finished).
+
+        Returns:
+            qvalues (np.ndarray): Q(state, a) of the deepest tree finished in time
+        '''
+        deadline = time.time() + self.time_budget
+        qvalues = self._root_qvalues(state, 1)
+        for horizon in range(2, self.horizon + 1):
+            self._deadline = deadline
+            try:
+                qvalues = self._root_qvalues(state, horizon)
+            except _OutOfTime:
+                break
+            finally:
+                self._deadline = None
+        else:
+            root_key = state.key(self.key_decimals) if isinstance(state, BeliefState) else state
+            self.root_level_qvals[root_key] = qvalues
+        return qvalues
+
     def run(self, verbose=True):
         discounted_sum_rewards = 0.0
         num_iter = 0
@@ -157,3 +241,18 @@ class BeliefSparseSampling(object):
             state = copy.deepcopy(next_state)
             num_iter += 1
         return discounted_sum_rewards, policy
+
+
+class _OutOfTime(Exception):
+    ''' Raised when the time budget of an anytime plan runs out in the middle of a tree. '''
+    pass
+
+# The planner whose root actions forked workers evaluate.
+_root_planner = {}
+
+def _root_qvalue(state, action, horizon, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    planner = _root_planner['planner']
+    planner._root_horizon = horizon
+    return planner._sampled_q_estimate(state, action, horizon)
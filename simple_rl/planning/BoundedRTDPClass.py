@@ -1,8 +1,13 @@
 ''' BoundedRTDPClass.py: Contains the Bounded-RTPDP solver class. '''
 
 # Python imports.
-from collections import defaultdict
-import copy
+from collections import defaultdict, namedtuple
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+import random
+import numpy as np
 
 # Other imports.
 from simple_rl.planning import Planner, ValueIteration
@@ -10,6 +15,34 @@ from simple_rl.mdp.MDPClass import MDP
 from simple_rl.mdp.StateClass import State
 from simple_rl.utils.additional_datastructures import SimpleRLStack
 
+# One backup of a trial: the state, the greedy (lower bound) action taken there, the bounds after the backup,
+# and the expected gap of the successors (None for the backups on the way back).
+Backup = namedtuple("Backup", ["state", "action", "lower", "upper", "expected_gap"])
+
+class BoundsView(MutableMapping):
+    '''
+    Live State -> bound mapping over one of BoundedRTDP's bound arrays: reads see the current bounds, and writes
+    set them.
+    '''
+    def __init__(self, planner, bounds_attr):
+        self.planner = planner
+        self.bounds_attr = bounds_attr
+
+    def __getitem__(self, state):
+        return float(getattr(self.planner, self.bounds_attr)[self.planner.state_index[state]])
+
+    def __setitem__(self, state, value):
+        getattr(self.planner, self.bounds_attr)[self.planner.state_index[state]] = value
+
+    def __delitem__(self, state):
+        raise TypeError("The bound of a state can not be removed.")
+
+    def __iter__(self):
+        return iter(self.planner.states)
+
+    def __len__(self):
+        return len(self.planner.states)
+
 class BoundedRTDP(Planner):
     '''
     Bounded Real-Time Dynamic Programming: RTDP with monotone upper bounds and performance guarantees (McMahan et al)
@@ -17,6 +50,11 @@ class BoundedRTDP(Planner):
     The Bounded RTDP solver can produce partial policies with strong performance guarantees while only touching a
     fraction of the state space, even on problems where other algorithms would have to visit the full state space.
     To do so, Bounded RTDP maintains both upper and lower bounds on the optimal value function.
+
+    States are indexed as in ValueIteration's sparse model, the bounds are arrays over those indices, and the
+    successors of each state are kept contiguous (see _build_successor_index), so a backup or a step of a trial
+    costs O(successors of the state) rather than O(|S|). lower_values and upper_values are live mappings over the
+    arrays, and every trial writes the bounds it backed up into @lower_values_init and @upper_values_init.
     '''
     def __init__(self, mdp, lower_values_init, upper_values_init, tau=10., name='BRTDP'):
         '''
@@ -28,16 +66,51 @@ class BoundedRTDP(Planner):
             name (str): Name of the planner
         '''
         Planner.__init__(self, mdp, name)
-        self.lower_values = lower_values_init
-        self.upper_values = upper_values_init
 
         # Using the value iteration class for accessing the matrix of transition probabilities
+        # (exact when the MDP has a transition_distribution, else estimated from 1000 samples per (s, a)).
         vi = ValueIteration(mdp, sample_rate=1000)
+        vi._compile_model()
         self.states = vi.get_states()
-        vi._compute_matrix_from_trans_func()
+        self.state_index = vi.state_index
         self.trans_dict = vi.trans_dict
+        self.reward_matrix = vi.reward_matrix
+        self.terminal_mask = vi.terminal_mask
+        self._build_successor_index(vi.trans_matrices)
+
+        self.lower_bounds = np.array([lower_values_init[s] for s in self.states], dtype=float)
+        self.upper_bounds = np.array([upper_values_init[s] for s in self.states], dtype=float)
+        self.lower_values_init = lower_values_init
+        self.upper_values_init = upper_values_init
+        self.trial_traces = []
+
+        init_index = self.state_index[self.mdp.init_state]
+        self.max_diff = (self.upper_bounds[init_index] - self.lower_bounds[init_index]) / tau
+
+    def _build_successor_index(self, trans_matrices):
+        '''
+        Args:
+            trans_matrices (list): T(. | ., a) per action, as sparse (|S| x |S|) matrices.
+
+        Summary:
+            Stacks T state major: the successors of (s, a) are self.successors[start:end] with probabilities
+            self.successor_probs[start:end], where start, end = self.successor_ptr[s * |A| + a], self.successor_ptr[s * |A| + a + 1].
+        '''
+        from scipy import sparse
 
-        self.max_diff = (self.upper_values[self.mdp.init_state] - self.lower_values[self.mdp.init_state]) / tau
+        num_states, num_actions = len(self.states), len(self.actions)
+        rows, cols, probs = [], [], []
+        for j, trans in enumerate(trans_matrices):
+            trans = trans.tocoo()
+            rows.append(trans.row * num_actions + j)
+            cols.append(trans.col)
+            probs.append(trans.data)
+        stacked_trans = sparse.csr_matrix((np.concatenate(probs), (np.concatenate(rows), np.concatenate(cols))),
+                                          shape=(num_states * num_actions, num_states))
+        stacked_trans.sum_duplicates()
+        self.successors = stacked_trans.indices
+        self.successor_probs = stacked_trans.data
+        self.successor_ptr = stacked_trans.indptr
 
     # ------------------
     # -- Planning API --
@@ -76,42 +149,84 @@ class BoundedRTDP(Planner):
         Returns:
             action (str)
         '''
-        return self._greedy_action(state, self.lower_values)
+        return self.actions[self._greedy_action(self.state_index[state], self.lower_bounds)]
+
+    @property
+    def lower_values(self):
+        ''' (BoundsView): State -> current lower bound on its value. '''
+        return BoundsView(self, "lower_bounds")
+
+    @property
+    def upper_values(self):
+        ''' (BoundsView): State -> current upper bound on its value. '''
+        return BoundsView(self, "upper_bounds")
 
     # ------------------
     # -- RTDP Routine --
     # ------------------
 
     def run_sample_trial(self, verbose=False):
-        init_state = self.mdp.init_state
-        state = copy.deepcopy(init_state)
+        '''
+        Args:
+            verbose (bool)
+
+        Returns:
+            trace (list): The Backups of the trial, also appended to self.trial_traces.
+        '''
+        state = self.state_index[self.mdp.init_state]
         trajectory = SimpleRLStack()
-        while not state.is_terminal():
+        trace = []
+        while not self.terminal_mask[state]:
             trajectory.push(state)
-            self.upper_values[state] = self._best_qvalue(state, self.upper_values)
-            action = self._greedy_action(state, self.lower_values)
-            self.lower_values[state] = self._qvalue(state, action, self.lower_values)
-            expected_gap_distribution = self._expected_gap_distribution(state, action)
-            expected_gap = sum(expected_gap_distribution.values())
-            if verbose: print('{}\tAction: {}\tGap: {}\tMaxDiff: {}'.format(state, action, expected_gap, self.max_diff))
+            self.upper_bounds[state] = self._best_qvalue(state, self.upper_bounds)
+            action = self._greedy_action(state, self.lower_bounds)
+            self.lower_bounds[state] = self._qvalue(state, action, self.lower_bounds)
+            successors, gaps = self._expected_gap_distribution(state, action)
+            expected_gap = gaps.sum()
+            trace.append(Backup(self.states[state], self.actions[action], self.lower_bounds[state], self.upper_bounds[state], expected_gap))
+            if verbose: print('{}\tAction: {}\tGap: {}\tMaxDiff: {}'.format(self.states[state], self.actions[action], expected_gap, self.max_diff))
             if expected_gap < self.max_diff:
                 if verbose: print('Ending rollouts with gap {} and max_diff {}'.format(expected_gap, self.max_diff))
                 break
-            state = BoundedRTDP._pick_next_state(expected_gap_distribution, expected_gap)
+            state = BoundedRTDP._pick_next_state(successors, gaps, expected_gap)
         while not trajectory.is_empty():
             state = trajectory.pop()
-            self.upper_values[state] = self._best_qvalue(state, self.upper_values)
-            self.lower_values[state] = self._best_qvalue(state, self.lower_values)
+            self.upper_bounds[state] = self._best_qvalue(state, self.upper_bounds)
+            self.lower_bounds[state] = self._best_qvalue(state, self.lower_bounds)
+            trace.append(Backup(self.states[state], None, self.lower_bounds[state], self.upper_bounds[state], None))
+
+        # The caller's bounds follow the backups, as they did when BRTDP updated them in place.
+        for backup in trace:
+            self.lower_values_init[backup.state] = float(self.lower_bounds[self.state_index[backup.state]])
+            self.upper_values_init[backup.state] = float(self.upper_bounds[self.state_index[backup.state]])
+        self.trial_traces.append(trace)
+        return trace
+
+    def _qvalues(self, state, values):
+        '''
+        Args:
+            state (int): Index of the state.
+            values (np.ndarray): Value of every state.
+
+        Returns:
+            (np.ndarray): Q(state, a) for every action, summed over the successors of (state, a) only.
+        '''
+        num_actions = len(self.actions)
+        row_ptr = self.successor_ptr[state * num_actions:(state + 1) * num_actions + 1]
+        start, end = row_ptr[0], row_ptr[-1]
+        weighted_values = self.successor_probs[start:end] * values[self.successors[start:end]]
+        # Every (s, a) has at least one successor, so no segment is empty.
+        return self.reward_matrix[state] + np.add.reduceat(weighted_values, row_ptr[:-1] - start)
 
     def _greedy_action(self, state, values):
-        return max([(self._qvalue(state, action, values), action) for action in self.actions])[1]
+        return int(np.argmax(self._qvalues(state, values)))
 
     def _qvalue(self, state, action, values):
-        return self.mdp.reward_func(state, action) + sum([self.trans_dict[state][action][next_state] * values[next_state] \
-                                                      for next_state in self.states])
+        start, end = self.successor_ptr[state * len(self.actions) + action:state * len(self.actions) + action + 2]
+        return self.reward_matrix[state, action] + np.dot(self.successor_probs[start:end], values[self.successors[start:end]])
 
     def _best_qvalue(self, state, values):
-        return max([self._qvalue(state, action, values) for action in self.actions])
+        return self._qvalues(state, values).max()
 
     # -------------------------
     # -- Convenience Methods --
@@ -122,31 +237,28 @@ class BoundedRTDP(Planner):
         Weight the distribution representing our uncertainty over state values by the
         transition probabilities when taking `action` from `state`.
         Args:
-            state (State)
-            action (str)
+            state (int): Index of the state.
+            action (int): Index of the action.
 
         Returns:
-            expected_gaps (defaultdict): weighted distribution over states of difference b/w upper and lower values
+            successors (np.ndarray): indices of the successors of (state, action)
+            expected_gaps (np.ndarray): their transition probability times the difference b/w their upper and lower values
         '''
-        expected_gaps = defaultdict()
-        for next_state in self.states:
-            gap = self.upper_values[next_state] - self.lower_values[next_state]
-            expected_gaps[next_state] = self.trans_dict[state][action][next_state] * gap
-        return expected_gaps
+        start, end = self.successor_ptr[state * len(self.actions) + action:state * len(self.actions) + action + 2]
+        successors = self.successors[start:end]
+        gaps = self.upper_bounds[successors] - self.lower_bounds[successors]
+        return successors, self.successor_probs[start:end] * gaps
 
     @staticmethod
-    def _pick_next_state(distribution, expected_gap):
+    def _pick_next_state(successors, expected_gaps, expected_gap):
         '''
         Args:
-            distribution (defaultdict)
-            expected_gap (float)
+            successors (np.ndarray)
+            expected_gaps (np.ndarray)
+            expected_gap (float): sum of `expected_gaps`, positive
 
         Returns:
-            state (State): sampled from a scaled version of `distribution`
-        '''
-        def _scale_distribution(_distribution, scaling_factor):
-            for state in _distribution:
-                _distribution[state] *= scaling_factor
-            return _distribution
-        scaled_distribution = _scale_distribution(distribution, expected_gap)
-        return max(scaled_distribution, key=scaled_distribution.get)
+            state (int): successor sampled with probability proportional to its expected gap
+        '''
+        i = np.searchsorted(np.cumsum(expected_gaps), random.random() * expected_gap, side='right')
+        return int(successors[min(i, len(successors) - 1)])
@@ -1,23 +1,68 @@
-''' MCTSClass.py: Class for a basic Monte Carlo Tree Search Planner. '''
+''' MCTSClass.py: Class for a UCT Monte Carlo Tree Search Planner. '''
 
 # Python imports.
 import math as m
+import multiprocessing as mp
 import random
-from collections import defaultdict
+import time
+import numpy as np
 
 # Other imports.
 from simple_rl.planning.PlannerClass import Planner
 
 class MCTS(Planner):
+    '''
+    UCT (Kocsis and Szepesvari, 2006): each iteration descends from the root by UCB1 over sampled transitions,
+    expands one untried action of the first node that has one, estimates the value of the new node by a batch of
+    random rollouts, and backs the discounted return up the path.
 
-    def __init__(self, mdp, name="mcts", explore_param=m.sqrt(2), rollout_depth=20, num_rollouts_per_step=10):
+    The tree is a node table over preallocated arrays, one row per distinct (state, depth) (paths reaching a state
+    at the same depth share its node, and a path never comes back to one of its nodes): visits, and per action its
+    visits, its sum of returns and the child node reached by its last sampled transition (-1 until the action is
+    tried). The table doubles when full.
+
+    A search runs for @num_iterations iterations or @time_budget seconds. With @num_workers > 1, that many
+    processes each search from the root with their own seed and the root statistics are summed (root parallelism).
+    '''
+
+    def __init__(self, mdp, name="mcts", explore_param=m.sqrt(2), rollout_depth=20, num_rollouts_per_step=10,
+                 num_iterations=500, time_budget=None, num_workers=1, initial_capacity=1024):
+        '''
+        Args:
+            mdp (MDP)
+            name (str)
+            explore_param (float): c of the UCB1 bonus c * sqrt(log N(s) / N(s, a)).
+            rollout_depth (int): Steps of each random rollout from a new node.
+            num_rollouts_per_step (int): Rollouts run together (as one batch) to evaluate a new node.
+            num_iterations (int): Iterations of a search (ignored with a @time_budget).
+            time_budget (float): Seconds per search.
+            num_workers (int): Processes searching from the root in parallel.
+            initial_capacity (int): Nodes the table starts with.
+        '''
         Planner.__init__(self, mdp, name=name)
 
         self.rollout_depth = rollout_depth
         self.num_rollouts_per_step = num_rollouts_per_step
-        self.value_total = defaultdict(lambda : defaultdict(float))
         self.explore_param = explore_param
-        self.visitation_counts = defaultdict(lambda : defaultdict(lambda : 0))
+        self.num_iterations = num_iterations
+        self.time_budget = time_budget
+        self.num_workers = num_workers
+        self.initial_capacity = initial_capacity
+        self.pool = None
+        self.reset_tree()
+
+    def reset_tree(self):
+        '''
+        Summary:
+            Empties the node table.
+        '''
+        num_actions = len(self.actions)
+        self.node_index = {}
+        self.node_keys = []
+        self.visits = np.zeros(self.initial_capacity, dtype=np.int64)
+        self.action_visits = np.zeros((self.initial_capacity, num_actions), dtype=np.int64)
+        self.value_sums = np.zeros((self.initial_capacity, num_actions), dtype=float)
+        self.children = np.full((self.initial_capacity, num_actions), -1, dtype=np.int64)
 
     def plan(self, cur_state, horizon=20):
         '''
@@ -27,13 +72,13 @@ class MCTS(Planner):
 
         Returns:
             (list): List of actions
+            (list): List of states
         '''
         action_seq = []
         state_seq = [cur_state]
         steps = 0
         while not cur_state.is_terminal() and steps < horizon:
-            action = self._next_action(cur_state)
-            # Do the rollouts...
+            action = self.policy(cur_state)
             cur_state = self.transition_func(cur_state, action)
             action_seq.append(action)
             state_seq.append(cur_state)
@@ -49,83 +94,187 @@ class MCTS(Planner):
             state (State)
 
         Returns:
-            (str)
+            (str): The most visited action of a search from @state.
         '''
-        if not self.has_planned:
-            self.plan(state)
-
-        return self._next_action(state)
+        action_visits, value_sums = self.search(state)
+        return self.actions[int(np.argmax(action_visits))]
 
-    def _next_action(self, state):
+    def search(self, state, horizon=20):
         '''
-        Args;
+        Args:
             state (State)
+            horizon (int): Depth of the tree (rollouts then go @rollout_depth steps further).
 
         Returns:
-            (str)
+            (np.ndarray): N(state, a) per action.
+            (np.ndarray): Sum of the returns of (state, a) per action.
+        '''
+        if self.num_workers > 1:
+            return self._parallel_search(state, horizon)
+
+        root = self._get_node(state, 0)
+        self._run_iterations(root, horizon)
+        return self.action_visits[root].copy(), self.value_sums[root].copy()
 
+    def get_q_values(self, state):
+        '''
+        Returns:
+            (np.ndarray): Mean return of each action at @state, as a root, in the tree (0 for untried ones).
+        '''
+        node = self.node_index.get((state, 0))
+        if node is None:
+            return np.zeros(len(self.actions))
+        return self.value_sums[node] / np.maximum(self.action_visits[node], 1)
+
+    def close(self):
+        '''
         Summary:
-            Performs a single step of the MCTS rollout.
+            Stops the search processes.
         '''
-        best_action = self.actions[0]
-        best_score = 0
-        total_visits = [self.visitation_counts[state][a] for a in self.actions]
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
 
-        print(total_visits)
+    # -----------------
+    # -- UCT search --
+    # -----------------
 
-        if 0 in total_visits:
-            # Insufficient stats, return random.
-                # Should choose randomly AMONG UNSAMPLED.
-            unsampled_actions = [self.actions[i] for i, x in enumerate(total_visits) if x == 0]
-            next_action = random.choice(unsampled_actions)
-            self.visitation_counts[state][next_action] += 1
-            return next_action
+    def _run_iterations(self, root, horizon):
+        deadline = None if self.time_budget is None else time.time() + self.time_budget
+        iteration = 0
+        while (iteration < self.num_iterations) if deadline is None else (time.time() < deadline):
+            self._iterate(root, horizon)
+            iteration += 1
+        return iteration
 
-        total = sum(total_visits)
+    def _iterate(self, root, horizon):
+        '''
+        Summary:
+            One UCT iteration from @root: selection, expansion, batched rollouts and backup.
+        '''
+        node = root
+        path = []
+        leaf_value = 0.0
+        for depth in range(horizon):
+            state = self.node_keys[node][0]
+            if state.is_terminal():
+                break
 
-        # Else choose according to the UCT explore method.
-        for cur_action in self.actions:
-            s_a_value_tot = self.value_total[state][cur_action]
-            s_a_visit = self.visitation_counts[state][cur_action]
-            score = s_a_value_tot / s_a_visit + self.explore_param * m.sqrt(m.log(total) / s_a_visit)
+            untried = np.flatnonzero(self.children[node] < 0)
+            action = int(random.choice(untried)) if len(untried) > 0 else self._ucb_action(node)
 
-            if score > best_score:
-                best_action = cur_action
-                best_score = score
+            next_state = self.transition_func(state, self.actions[action])
+            path.append((node, action, self.reward_func(state, self.actions[action])))
+            # _get_node may grow (and so replace) the arrays, they are indexed after it.
+            child = self._get_node(next_state, depth + 1)
+            self.children[node, action] = child
+            node = child
+
+            if len(untried) > 0:
+                leaf_value = self._batched_rollouts(next_state)
+                break
 
-        return best_action
+        # Backup of the discounted returns along the path.
+        value = leaf_value
+        for node, action, reward in reversed(path):
+            value = reward + self.gamma * value
+            self.visits[node] += 1
+            self.action_visits[node, action] += 1
+            self.value_sums[node, action] += value
 
-    def _rollout(self, cur_state, action):
+    def _ucb_action(self, node):
+        action_visits = self.action_visits[node]
+        scores = self.value_sums[node] / action_visits + self.explore_param * np.sqrt(m.log(self.visits[node]) / action_visits)
+        best_actions = np.flatnonzero(scores == scores.max())
+        return int(random.choice(best_actions))
+
+    def _batched_rollouts(self, state):
         '''
         Args:
-            cur_state (State)
-            action (str)
+            state (State)
+
+        Returns:
+            (float): Mean discounted return of @num_rollouts_per_step random rollouts from @state, stepped together.
+        '''
+        if state.is_terminal():
+            return 0.0
+
+        states = [state] * self.num_rollouts_per_step
+        returns = np.zeros(self.num_rollouts_per_step)
+        active = list(range(self.num_rollouts_per_step))
+        discount = 1.0
+        for depth in range(self.rollout_depth):
+            actions = np.random.randint(len(self.actions), size=len(active))
+            still_active = []
+            for i, action in zip(active, actions):
+                action = self.actions[action]
+                returns[i] += discount * self.reward_func(states[i], action)
+                states[i] = self.transition_func(states[i], action)
+                if not states[i].is_terminal():
+                    still_active.append(i)
+            active = still_active
+            if not active:
+                break
+            discount *= self.gamma
+
+        return returns.mean()
 
+    def _get_node(self, state, depth):
+        '''
         Returns:
-            (float): Discounted reward from the rollout.
+            (int): The node of @state at @depth, added to the table if new.
         '''
-        trajectory = []
-        total_discounted_reward = []
-        for i in range(self.rollout_depth):
+        key = (state, depth)
+        node = self.node_index.get(key)
+        if node is None:
+            node = self.node_index[key] = len(self.node_keys)
+            self.node_keys.append(key)
+            if node == len(self.visits):
+                self._grow()
+        return node
 
-            # Simulate next state.
-            next_action = self._next_action(cur_state)
-            cur_state = self.transition_func(cur_state, next_action)
-            next_reward = self.reward_func(cur_state, next_action)
+    def _grow(self):
+        capacity = 2 * len(self.visits)
+        num_actions = len(self.actions)
+        self.visits = np.concatenate([self.visits, np.zeros(capacity - len(self.visits), dtype=np.int64)])
+        self.action_visits = np.concatenate([self.action_visits, np.zeros((capacity - len(self.action_visits), num_actions), dtype=np.int64)])
+        self.value_sums = np.concatenate([self.value_sums, np.zeros((capacity - len(self.value_sums), num_actions))])
+        self.children = np.concatenate([self.children, np.full((capacity - len(self.children), num_actions), -1, dtype=np.int64)])
 
-            # Track rewards and states.
-            total_discounted_reward.append(self.gamma**i * next_reward)
-            trajectory.append((cur_state, next_action))
+    # ---------------------
+    # -- Root parallelism --
+    # ---------------------
 
-            if cur_state.is_terminal():
-                # Break terminal.
-                break
+    def _parallel_search(self, state, horizon):
+        if self.pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            worker_args = dict(explore_param=self.explore_param, rollout_depth=self.rollout_depth, num_rollouts_per_step=self.num_rollouts_per_step,
+                               num_iterations=self.num_iterations, time_budget=self.time_budget, initial_capacity=self.initial_capacity)
+            self.pool = ProcessPoolExecutor(max_workers=self.num_workers, mp_context=mp.get_context("spawn"),
+                                            initializer=_init_searcher, initargs=(self.mdp, worker_args))
+
+        seeds = [random.randint(0, 2 ** 31 - 1) for _ in range(self.num_workers)]
+        results = [future.result() for future in [self.pool.submit(_search_root, state, horizon, seed) for seed in seeds]]
+        action_visits = sum(visits for visits, _ in results)
+        value_sums = sum(values for _, values in results)
+
+        # The merged statistics become the root of this planner's table.
+        root = self._get_node(state, 0)
+        self.visits[root] = action_visits.sum()
+        self.action_visits[root] = action_visits
+        self.value_sums[root] = value_sums
+        return action_visits, value_sums
 
-        # Update all visited nodes.
-        for i, experience in enumerate(trajectory):
-            s, a = experience
-            self.visitation_counts[s][a] += 1
-            self.value_total[s][a] += sum(total_discounted_reward[i:])
+# The search of a worker process.
+_searcher = {}
 
-        return total_discounted_reward
+def _init_searcher(mdp, worker_args):
+    _searcher['planner'] = MCTS(mdp, **worker_args)
 
+def _search_root(state, horizon, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    planner = _searcher['planner']
+    # Every search starts from a fresh tree, so the merged statistics count each iteration once.
+    planner.reset_tree()
+    return planner.search(state, horizon)
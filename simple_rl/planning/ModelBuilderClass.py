@@ -0,0 +1,180 @@
+''' ModelBuilderClass.py: Builds the reachable state space and T, R of a tabular MDP in one pass. '''
+
+# Python imports.
+from __future__ import print_function
+from collections import namedtuple
+import hashlib
+import multiprocessing as mp
+import os
+import pickle
+import numpy as np
+
+# Reachable states in BFS order (state i is index_states[i]), R as a (|S| x |A|) matrix, and per action the
+# (row, col, prob) entries of T(. | ., a) (a row may repeat a col, the probabilities are then summed).
+TabularModel = namedtuple("TabularModel", ["index_states", "rewards", "rows", "cols", "probs"])
+
+class ModelBuilder(object):
+    '''
+    Expands the states reachable from the MDP's initial state one BFS frontier at a time, each frontier split
+    into chunks expanded in parallel by a process pool. Every expanded (s, a) gives its R(s, a) and its
+    T(. | s, a), exactly (see MDP.transition_distribution) or as the counts of @sample_rate samples, so
+    reachability and the model come from a single pass. States are interned to their BFS index as they come in.
+
+    With a @cache_dir, the model is saved there and later builders of the same MDP load it instead.
+    '''
+
+    def __init__(self, mdp, sample_rate=3, num_workers=1, cache_dir=None, chunk_size=256):
+        '''
+        Args:
+            mdp (MDP): Pickled to the workers when @num_workers > 1.
+            sample_rate (int): Samples of T(s, a) per (s, a) when @mdp has no exact transition_distribution.
+            num_workers (int): Processes expanding a frontier (1 expands it in this process).
+            cache_dir (str): Directory of the saved models (None disables the cache).
+            chunk_size (int): States per task sent to a worker.
+        '''
+        self.mdp = mdp
+        self.actions = mdp.get_actions()
+        self.sample_rate = sample_rate
+        self.num_workers = num_workers
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.exact_transitions = mdp.has_transition_distribution()
+
+    def build(self):
+        '''
+        Returns:
+            (TabularModel)
+        '''
+        cache_file = self.get_cache_file()
+        if cache_file is not None and os.path.exists(cache_file):
+            with open(cache_file, "rb") as f:
+                return pickle.load(f)
+
+        if self.num_workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=self.num_workers, mp_context=mp.get_context("spawn"), initializer=_init_builder,
+                                       initargs=(self.mdp, self.sample_rate, self.exact_transitions))
+            try:
+                model = self._build(pool)
+            finally:
+                pool.shutdown(wait=True)
+        else:
+            model = self._build(None)
+
+        if cache_file is not None:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            # Written next to its final name, then moved, so a reader never sees part of a model.
+            tmp_file = cache_file + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+
+        return model
+
+    def _build(self, pool):
+        '''
+        Args:
+            pool (concurrent.futures.Executor): Expands the chunks of a frontier (None expands them here).
+
+        Returns:
+            (TabularModel)
+        '''
+        init_state = self.mdp.get_init_state()
+        state_index = {init_state: 0}
+        index_states = [init_state]
+        rows = [[] for _ in self.actions]
+        cols = [[] for _ in self.actions]
+        probs = [[] for _ in self.actions]
+        rewards = []
+
+        start = 0
+        while start < len(index_states):
+            frontier = index_states[start:]
+            chunks = [frontier[i:i + self.chunk_size] for i in range(0, len(frontier), self.chunk_size)]
+            if pool is None or len(chunks) == 1:
+                expansions = (_expand(self.mdp, self.actions, self.sample_rate, self.exact_transitions, chunk) for chunk in chunks)
+            else:
+                # map keeps the frontier's order, so states get the same indices as in a serial BFS.
+                expansions = pool.map(_expand_chunk, chunks)
+
+            i = start
+            for chunk_rewards, chunk_outcomes in expansions:
+                rewards.extend(chunk_rewards)
+                for state_outcomes in chunk_outcomes:
+                    for j, outcomes in enumerate(state_outcomes):
+                        for s_prime, prob in outcomes:
+                            k = state_index.get(s_prime)
+                            if k is None:
+                                k = state_index[s_prime] = len(index_states)
+                                index_states.append(s_prime)
+                            rows[j].append(i)
+                            cols[j].append(k)
+                            probs[j].append(prob)
+                    i += 1
+            start += len(frontier)
+
+        num_states, num_actions = len(index_states), len(self.actions)
+        return TabularModel(index_states=index_states,
+                            rewards=np.array(rewards, dtype=float).reshape(num_states, num_actions),
+                            rows=[np.array(rows[j], dtype=np.int64) for j in range(num_actions)],
+                            cols=[np.array(cols[j], dtype=np.int64) for j in range(num_actions)],
+                            probs=[np.array(probs[j], dtype=float) for j in range(num_actions)])
+
+    def get_cache_file(self):
+        '''
+        Returns:
+            (str): Where the model of this MDP and sample rate is saved, None without a @cache_dir or if
+                the MDP can't be keyed. The key covers the MDP's class and its data attributes (not
+                its methods, nor its current state).
+        '''
+        if self.cache_dir is None:
+            return None
+        attributes = sorted((name, value) for name, value in vars(self.mdp).items() if name != "cur_state" and not callable(value))
+        try:
+            key = pickle.dumps((type(self.mdp).__module__, type(self.mdp).__name__, attributes, self.sample_rate, self.exact_transitions), protocol=2)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return None
+        return os.path.join(self.cache_dir, "model_" + str(self.mdp).replace(os.sep, "_") + "_" + hashlib.sha1(key).hexdigest()[:16] + ".pkl")
+
+def _expand(mdp, actions, sample_rate, exact_transitions, states):
+    '''
+    Args:
+        mdp (MDP)
+        actions (list)
+        sample_rate (int)
+        exact_transitions (bool)
+        states (list)
+
+    Returns:
+        (tuple): R(s, .) per state, and per state and action the [(State, float)] of T(. | s, a).
+    '''
+    rewards = [[mdp.get_reward_func()(s, a) for a in actions] for s in states]
+    if exact_transitions:
+        return rewards, mdp.batched_transition_distribution(states, actions)
+
+    transition_func = mdp.get_transition_func()
+    outcomes = []
+    for s in states:
+        state_outcomes = []
+        for a in actions:
+            # Samples counted as they come, so an s' shows up once, where it was first sampled.
+            counts = {}
+            for sample in range(sample_rate):
+                s_prime = transition_func(s, a)
+                counts[s_prime] = counts.get(s_prime, 0) + 1
+            state_outcomes.append([(s_prime, count / float(sample_rate)) for s_prime, count in counts.items()])
+        outcomes.append(state_outcomes)
+    return rewards, outcomes
+
+# State of a worker process: its copy of the MDP and how to expand states.
+_builder = {}
+
+def _init_builder(mdp, sample_rate, exact_transitions):
+    _builder['mdp'] = mdp
+    _builder['actions'] = mdp.get_actions()
+    _builder['sample_rate'] = sample_rate
+    _builder['exact_transitions'] = exact_transitions
+
+def _expand_chunk(states):
+    return _expand(_builder['mdp'], _builder['actions'], _builder['sample_rate'], _builder['exact_transitions'], states)
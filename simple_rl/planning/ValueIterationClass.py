@@ -2,6 +2,7 @@
 from __future__ import print_function
 from collections import defaultdict
 import random
+import numpy as np
 
 # Check python version for queue module.
 import sys
@@ -12,29 +13,69 @@ else:
 
 # Other imports.
 from simple_rl.planning.PlannerClass import Planner
+from simple_rl.planning.ModelBuilderClass import ModelBuilder
 
 class ValueIteration(Planner):
 
-    def __init__(self, mdp, name="value_iter", delta=0.0001, max_iterations=500, sample_rate=3):
+    # Bellman backup schedules of the sparse backend.
+    SWEEPS = ("jacobi", "gauss_seidel", "async")
+
+    def __init__(self, mdp, name="value_iter", delta=0.0001, max_iterations=500, sample_rate=3, backend="sparse", sweep="jacobi", block_size=1024, num_workers=1, cache_dir=None):
         '''
         Args:
             mdp (MDP)
             delta (float): After an iteration if VI, if no change more than @\delta has occurred, terminates.
             max_iterations (int): Hard limit for number of iterations.
-            sample_rate (int): Determines how many samples from @mdp to take to estimate T(s' | s, a).
+            sample_rate (int): Determines how many samples from @mdp to take to estimate T(s' | s, a),
+                unless @mdp gives T exactly (see MDP.transition_distribution).
             horizon (int): Number of steps before terminating.
+            backend (str): "sparse" (states interned to indices, one scipy.sparse T per action, vectorized backups) or "dict" (per-state Python sweeps).
+            sweep (str): Sparse backend only, one of ValueIteration.SWEEPS:
+                "jacobi": every state backed up from the previous iteration's values.
+                "gauss_seidel": states backed up in blocks of @block_size, each block using the values of the blocks before it.
+                "async": only states with a successor whose value changed by more than @delta are backed up again.
+            block_size (int): Number of states per block of a "gauss_seidel" sweep.
+            num_workers (int): Sparse backend only, processes building the model (see ModelBuilder).
+            cache_dir (str): Sparse backend only, directory where the model is saved and reloaded from (None: not saved).
         '''
         Planner.__init__(self, mdp, name=name)
 
+        if backend not in ("sparse", "dict"):
+            raise ValueError("Unknown ValueIteration backend: " + str(backend))
+        if sweep not in ValueIteration.SWEEPS:
+            raise ValueError("Unknown ValueIteration sweep: " + str(sweep))
+
         self.delta = delta
         self.max_iterations = max_iterations
         self.sample_rate = sample_rate
+        self.backend = backend
+        self.sweep = sweep
+        self.block_size = block_size
+        self.num_workers = num_workers
+        self.cache_dir = cache_dir
+        self.exact_transitions = mdp.has_transition_distribution()
         self.value_func = defaultdict(float)
         self.reachability_done = False
         self.has_computed_matrix = False
         self.bellman_backups = 0
 
+        # Sparse backend: the model compiled by _compile_model and the Q-values of the last run.
+        self.state_index = {}
+        self.index_states = []
+        self.action_index = {}
+        self.trans_matrices = None
+        self.reward_matrix = None
+        self.terminal_mask = None
+        self.values = None
+        self.q_matrix = None
+        self._stacked_trans = None
+        self._block_trans = None
+
     def _compute_matrix_from_trans_func(self):
+        if self.backend == "sparse":
+            self._compile_model()
+            return
+
         if self.has_computed_matrix:
             self._compute_reachable_state_space()
             # We've already run this, just return.
@@ -48,12 +89,99 @@ class ValueIteration(Planner):
 
         for s in self.get_states():
             for a in self.actions:
-                for sample in range(self.sample_rate):
-                    s_prime = self.transition_func(s, a)
-                    self.trans_dict[s][a][s_prime] += 1.0 / self.sample_rate
+                for s_prime, prob in self._get_outcomes(s, a):
+                    self.trans_dict[s][a][s_prime] += prob
 
         self.has_computed_matrix = True
 
+    def _get_outcomes(self, s, a):
+        '''
+        Args:
+            s (State)
+            a (str)
+
+        Returns:
+            (list): [(State, float)], T(. | @s, @a) from the MDP if it gives it exactly, else @sample_rate
+                samples of @self.transition_func with probability 1 / @sample_rate each.
+        '''
+        if self.exact_transitions:
+            return self.mdp.transition_distribution(s, a)
+        prob = 1.0 / self.sample_rate
+        return [(self.transition_func(s, a), prob) for sample in range(self.sample_rate)]
+
+    def _compile_model(self):
+        '''
+        Summary:
+            Interns every state reachable from @self.init_state to an index (self.state_index) while building T,
+            so that reachability and T(s' | s, a) come from a single pass over (s, a) (see ModelBuilder): the
+            exact distribution when the MDP gives it, else @sample_rate samples per (s, a).
+            Stores T(. | ., a) as one sparse (|S| x |S|) matrix per action, R(s, a) as a dense (|S| x |A|) matrix,
+            and fills self.trans_dict from the same model.
+        '''
+        if self.has_computed_matrix:
+            return
+        from scipy import sparse
+
+        model = ModelBuilder(self.mdp, sample_rate=self.sample_rate, num_workers=self.num_workers, cache_dir=self.cache_dir).build()
+        index_states = model.index_states
+        num_states, num_actions = len(index_states), len(self.actions)
+
+        self.trans_dict = defaultdict(lambda:defaultdict(lambda:defaultdict(float)))
+        for j, a in enumerate(self.actions):
+            for i, k, prob in zip(model.rows[j].tolist(), model.cols[j].tolist(), model.probs[j].tolist()):
+                self.trans_dict[index_states[i]][a][index_states[k]] += prob
+
+        # Repeated samples of the same s' are summed by the conversion to CSR.
+        self.trans_matrices = [sparse.coo_matrix((model.probs[j], (model.rows[j], model.cols[j])), shape=(num_states, num_states)).tocsr()
+                               for j in range(num_actions)]
+        self.reward_matrix = model.rewards
+        self.terminal_mask = np.array([s.is_terminal() for s in index_states], dtype=bool)
+        self.action_index = dict((a, j) for j, a in enumerate(self.actions))
+        self.state_index = dict((s, i) for i, s in enumerate(index_states))
+        self.index_states = index_states
+        self.states = set(index_states)
+        self.values = np.array([self.value_func.get(s, 0.0) for s in index_states], dtype=float)
+        self._stacked_trans = None
+        self._block_trans = None
+
+        self.reachability_done = True
+        self.has_computed_matrix = True
+
+    def _get_stacked_trans(self):
+        '''
+        Returns:
+            (scipy.sparse.csr_matrix): The per action T stacked into one (|A||S| x |S|) matrix, so a backup is one product.
+        '''
+        if self._stacked_trans is None:
+            from scipy import sparse
+            self._stacked_trans = sparse.vstack(self.trans_matrices).tocsr()
+        return self._stacked_trans
+
+    def _get_block_trans(self):
+        '''
+        Returns:
+            (list): (first state, stacked T rows of the block's states) per block of @self.block_size states.
+        '''
+        if self._block_trans is None:
+            from scipy import sparse
+            num_states = len(self.index_states)
+            self._block_trans = [(start, sparse.vstack([trans[start:start + self.block_size] for trans in self.trans_matrices]).tocsr())
+                                 for start in range(0, num_states, self.block_size)]
+        return self._block_trans
+
+    def _backup(self, stacked_trans, rewards, values):
+        '''
+        Args:
+            stacked_trans (scipy.sparse.csr_matrix): T rows of m states, action major (|A|m x |S|).
+            rewards (np.ndarray): R of the same m states (m x |A|).
+            values (np.ndarray): V of every state.
+
+        Returns:
+            (np.ndarray): Q of the m states (m x |A|).
+        '''
+        expected_future_vals = stacked_trans.dot(values).reshape(len(self.actions), rewards.shape[0]).T
+        return rewards + self.gamma * expected_future_vals
+
     def get_gamma(self):
         return self.mdp.get_gamma()
 
@@ -63,6 +191,9 @@ class ValueIteration(Planner):
         return len(self.states)      
 
     def get_states(self):
+        if self.backend == "sparse":
+            self._compute_reachable_state_space()
+            return list(self.index_states)
         if self.reachability_done:
             return list(self.states)
         else:
@@ -88,6 +219,11 @@ class ValueIteration(Planner):
         Returns:
             (float): The Q estimate given the current value function @self.value_func.
         '''
+        if self.q_matrix is not None:
+            i, j = self.state_index.get(s), self.action_index.get(a)
+            if i is not None and j is not None:
+                return self.q_matrix[i, j]
+
         # Compute expected value.
         expected_future_val = 0
         for s_prime in self.trans_dict[s][a].keys():
@@ -105,6 +241,11 @@ class ValueIteration(Planner):
         if self.reachability_done:
             return
 
+        if self.backend == "sparse":
+            # Reachability and T are estimated from the same samples.
+            self._compile_model()
+            return
+
         state_queue = queue.Queue()
         state_queue.put(self.init_state)
         self.states.add(self.init_state)
@@ -112,8 +253,7 @@ class ValueIteration(Planner):
         while not state_queue.empty():
             s = state_queue.get()
             for a in self.actions:
-                for samples in range(self.sample_rate): # Take @sample_rate samples to estimate E[V]
-                    next_state = self.transition_func(s,a)
+                for next_state, prob in self._get_outcomes(s, a): # Exact T, or @sample_rate samples to estimate E[V]
 
                     if next_state not in self.states:
                         self.states.add(next_state)
@@ -126,6 +266,9 @@ class ValueIteration(Planner):
         Summary:
             Runs ValueIteration and fills in the self.value_func.           
         '''
+        if self.backend == "sparse":
+            return self._run_vi_sparse()
+
         # Algorithm bookkeeping params.
         iterations = 0
         max_diff = float("inf")
@@ -158,6 +301,66 @@ class ValueIteration(Planner):
 
         return iterations, value_of_init_state
 
+    def _run_vi_sparse(self):
+        '''
+        Summary:
+            ValueIteration over the compiled model (see _compile_model), with vectorized backups scheduled by @self.sweep.
+            Fills in self.values, self.q_matrix and self.value_func.
+        '''
+        iterations = 0
+        max_diff = float("inf")
+        self._compute_matrix_from_trans_func()
+        values = self.values.copy()
+        num_states = len(values)
+        live = ~self.terminal_mask
+        self.bellman_backups = 0
+
+        if self.sweep == "async":
+            # predecessors[k] holds the states with a transition into k.
+            predecessors = sum(self.trans_matrices).T.tocsr()
+            active = np.arange(num_states)
+
+        # Main loop.
+        while max_diff > self.delta and iterations < self.max_iterations:
+            if self.sweep == "jacobi":
+                self.bellman_backups += num_states
+                new_values = np.where(live, self._backup(self._get_stacked_trans(), self.reward_matrix, values).max(axis=1), values)
+                max_diff = np.abs(new_values - values).max()
+                values = new_values
+            elif self.sweep == "gauss_seidel":
+                self.bellman_backups += num_states
+                max_diff = 0
+                for start, stacked_trans in self._get_block_trans():
+                    stop = start + stacked_trans.shape[0] // len(self.actions)
+                    max_q = self._backup(stacked_trans, self.reward_matrix[start:stop], values).max(axis=1)
+                    new_values = np.where(live[start:stop], max_q, values[start:stop])
+                    max_diff = max(np.abs(new_values - values[start:stop]).max(), max_diff)
+                    values[start:stop] = new_values
+            else:
+                from scipy import sparse
+                self.bellman_backups += len(active)
+                stacked_trans = sparse.vstack([trans[active] for trans in self.trans_matrices]).tocsr()
+                max_q = self._backup(stacked_trans, self.reward_matrix[active], values).max(axis=1)
+                new_values = np.where(live[active], max_q, values[active])
+                diffs = np.abs(new_values - values[active])
+                values[active] = new_values
+                max_diff = diffs.max()
+
+                # Only states whose successors moved can move next.
+                active = np.unique(predecessors[active[diffs > self.delta]].indices)
+                if len(active) == 0:
+                    max_diff = 0
+            iterations += 1
+
+        self.values = values
+        self.q_matrix = self._backup(self._get_stacked_trans(), self.reward_matrix, values)
+        self.value_func = defaultdict(float, zip(self.index_states, values.tolist()))
+
+        value_of_init_state = self._compute_max_qval_action_pair(self.init_state)[0]
+        self.has_planned = True
+
+        return iterations, value_of_init_state
+
     def get_num_backups_in_recent_run(self):
         if self.has_planned:
             return self.bellman_backups
@@ -247,6 +450,11 @@ class ValueIteration(Planner):
         Returns:
             (tuple) --> (float, str): where the float is the Qval, str is the action.
         '''
+        if self.q_matrix is not None and state in self.state_index:
+            q_vals = self.q_matrix[self.state_index[state]]
+            best = int(np.argmax(q_vals))
+            return q_vals[best], self.actions[best]
+
         # Grab random initial action in case all equal
         max_q_val = float("-inf")
         best_action = self.actions[0]
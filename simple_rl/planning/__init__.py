@@ -3,10 +3,20 @@ Implementations of standard planning algorithms:
 
 	PlannerClass: Abstract class for a planner
 	ValueIterationClass: Value Iteration.
+	ModelBuilderClass: Parallel, cached construction of a tabular MDP's reachable states and model.
 	MCTSClass: Monte Carlo Tree Search.
 '''
 
-# Grab classes.
-from simple_rl.planning.PlannerClass import Planner
-from simple_rl.planning.ValueIterationClass import ValueIteration
-from simple_rl.planning.MCTSClass import MCTS
\ No newline at end of file
+# Other imports.
+from simple_rl.utils.lazy_imports import lazy_attributes
+
+# Grab classes (each planner module is imported the first time its class is used).
+_LAZY_ATTRIBUTES = {
+	"Planner" : "simple_rl.planning.PlannerClass",
+	"ValueIteration" : "simple_rl.planning.ValueIterationClass",
+	"ModelBuilder" : "simple_rl.planning.ModelBuilderClass",
+	"MCTS" : "simple_rl.planning.MCTSClass",
+}
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
+__all__ = list(_LAZY_ATTRIBUTES)
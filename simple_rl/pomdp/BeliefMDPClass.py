@@ -1,3 +1,5 @@
+import numpy as np
+
 from simple_rl.mdp.MDPClass import MDP
 from simple_rl.pomdp.POMDPClass import POMDP
 from simple_rl.pomdp.BeliefStateClass import BeliefState
@@ -34,6 +36,27 @@ class BeliefMDP(MDP):
         next_belief_distribution = self.belief_updater_func(belief_state.distribution, action, observation)
         return BeliefState(next_belief_distribution)
 
+    def sample_successors(self, belief_state, action, num_samples):
+        '''
+        Batched form of the belief transition function: draws @num_samples observations at once and updates the
+        belief once per distinct observation. Observations are drawn from the updater's model of the underlying
+        POMDP, sum_s' T(s' | s, a) O(z | s') for its current state s.
+        Args:
+            belief_state (BeliefState)
+            action (str)
+            num_samples (int)
+
+        Returns:
+            successors (list): (next BeliefState, number of the @num_samples draws that gave it)
+        '''
+        updater = self.pomdp.belief_updater
+        next_state_probs = updater.transition_matrices[updater.action_index[action]][updater.state_index[self.pomdp.cur_state]]
+        observations = self.pomdp.get_observations()
+        observation_probs = np.array([next_state_probs.dot(updater.observation_likelihoods[z])[0] for z in observations])
+        counts = np.random.multinomial(num_samples, observation_probs / observation_probs.sum())
+        return [(BeliefState(self.belief_updater_func(belief_state.distribution, action, z)), int(count))
+                for z, count in zip(observations, counts) if count > 0]
+
     def _belief_reward_function(self, belief_state, action):
         '''
         The belief MDP reward function R(b, a) is the expected reward from the POMDP reward function
@@ -1,5 +1,6 @@
 # Python imports.
 from collections import defaultdict
+import numpy as np
 
 # Other imports.
 from simple_rl.mdp.StateClass import State
@@ -14,7 +15,8 @@ class BeliefState(State):
             belief_distribution (defaultdict)
         '''
         self.distribution = belief_distribution
-        State.__init__(self, data=belief_distribution.values())
+        # A tuple (not a view of the dict), so that equal beliefs hash and compare equal and the state can be copied.
+        State.__init__(self, data=tuple(belief_distribution.values()))
 
     def __repr__(self):
         return self.__str__()
@@ -22,6 +24,16 @@ class BeliefState(State):
     def __str__(self):
         return 'BeliefState::' + str(self.distribution)
 
+    def key(self, decimals=6):
+        '''
+        Args:
+            decimals (int)
+
+        Returns:
+            (tuple): the probabilities rounded to @decimals, so beliefs that only differ by rounding errors share a key.
+        '''
+        return tuple(np.round(self.data, decimals).tolist())
+
     def belief(self, state):
         '''
         Args:
@@ -1,10 +1,21 @@
+# Python imports.
 from collections import defaultdict
+import numpy as np
+
+# Other imports.
 from simple_rl.planning.ValueIterationClass import ValueIteration
 
 class BeliefUpdater(object):
-    ''' Wrapper class for different methods for belief state updates in POMDPs. '''
+    '''
+    Wrapper class for different methods for belief state updates in POMDPs.
+
+    States are interned to the indices of ValueIteration's model (self.state_index), T is kept as one sparse
+    (|S| x |S|) matrix per action and O as one likelihood vector over next states per observation, so an update
+    is a sparse mat-vec and an elementwise product. Beliefs are given either as dicts State -> float or as
+    vectors over the state indices (dense np.ndarray, or a scipy.sparse 1 x |S| row), and returned in kind.
+    '''
 
-    def __init__(self, mdp, transition_func, reward_func, observation_func, updater_type='discrete'):
+    def __init__(self, mdp, transition_func, reward_func, observation_func, updater_type='discrete', num_particles=1000):
         '''
         Args:
             mdp (POMDP)
@@ -12,9 +23,11 @@ class BeliefUpdater(object):
             reward_func: R(s, a) --> float
             observation_func: O(s, a) --> z
             updater_type (str)
+            num_particles (int): Particles of a belief given as a dict to the particle filter.
         '''
         self.reward_func = reward_func
         self.updater_type = updater_type
+        self.num_particles = num_particles
 
         # We use the ValueIteration class to construct the transition and observation probabilities
         self.vi = ValueIteration(mdp, sample_rate=500)
@@ -22,6 +35,17 @@ class BeliefUpdater(object):
         self.transition_probs = self.construct_transition_matrix(transition_func)
         self.observation_probs = self.construct_observation_matrix(observation_func, transition_func)
 
+        self.state_index = self.vi.state_index
+        self.index_states = self.vi.index_states
+        self.action_index = self.vi.action_index
+        # T(s' | s, a) as (|S| x |S|) matrices indexed [s, s'], and transposed for mat-vecs with dense beliefs.
+        self.transition_matrices = self.vi.trans_matrices
+        self._predict_matrices = [trans.T.tocsr() for trans in self.transition_matrices]
+        # O(z | s') as |S| vectors.
+        self.observation_likelihoods = dict((z, np.array([self.observation_probs[s][z] for s in self.index_states], dtype=float))
+                                            for z in mdp.get_observations())
+        self._sampling_tables = {}
+
         if updater_type == 'discrete':
             self.updater = self.discrete_filter_updater
         elif updater_type == 'kalman':
@@ -32,17 +56,38 @@ class BeliefUpdater(object):
             raise AttributeError('updater_type {} did not conform to expected type'.format(updater_type))
 
     def discrete_filter_updater(self, belief, action, observation):
-        def _compute_normalization_factor(bel):
-            return sum(bel.values())
+        '''
+        Args:
+            belief (dict, np.ndarray or scipy.sparse row): b(s)
+            action (str)
+            observation (str)
 
-        def _update_belief_for_state(b, sp, T, O, a, z):
-            return O[sp][z] * sum([T[s][a][sp] * b[s] for s in b])
+        Returns:
+            new_belief (same kind as @belief): b'(s') proportional to O(z | s') sum_s T(s' | s, a) b(s). A dict belief
+                keeps its states (states the model never reached have no probability).
+        '''
+        from scipy import sparse
+
+        j = self.action_index[action]
+        likelihoods = self.observation_likelihoods[observation]
+
+        if sparse.issparse(belief):
+            new_belief = sparse.csr_matrix(belief.dot(self.transition_matrices[j]).multiply(likelihoods))
+            normalization = new_belief.sum()
+            return new_belief / normalization if normalization > 0 else new_belief
 
+        if isinstance(belief, np.ndarray):
+            new_belief = likelihoods * self._predict_matrices[j].dot(belief)
+            normalization = new_belief.sum()
+            return new_belief / normalization if normalization > 0 else new_belief
+
+        new_vector = likelihoods * self._predict_matrices[j].dot(self.belief_vector(belief))
         new_belief = defaultdict()
         for sprime in belief:
-            new_belief[sprime] = _update_belief_for_state(belief, sprime, self.transition_probs, self.observation_probs, action, observation)
+            i = self.state_index.get(sprime)
+            new_belief[sprime] = float(new_vector[i]) if i is not None else 0.
 
-        normalization = _compute_normalization_factor(new_belief)
+        normalization = sum(new_belief.values())
 
         for sprime in belief:
             if normalization > 0: new_belief[sprime] /= normalization
@@ -53,7 +98,107 @@ class BeliefUpdater(object):
         pass
 
     def particle_filter_updater(self, belief, action, observation):
-        pass
+        '''
+        Args:
+            belief (dict or np.ndarray): b(s), or the state indices of the particles (an integer np.ndarray)
+            action (str)
+            observation (str)
+
+        Returns:
+            new_belief (same kind as @belief): every particle moved by a sample of T(. | s, a), weighted by O(z | s')
+                and systematically resampled; as a dict, the fraction of the particles in each state.
+        '''
+        if isinstance(belief, np.ndarray) and belief.dtype.kind in 'iu':
+            particles = belief
+        else:
+            particles = self.sample_particles(belief, self.num_particles)
+
+        particles = self._sample_transitions(particles, self.action_index[action])
+        weights = self.observation_likelihoods[observation][particles]
+        total_weight = weights.sum()
+        if total_weight > 0:
+            # Systematic resampling: one uniform offset, then evenly spaced positions along the cumulative weights.
+            positions = (np.random.random() + np.arange(len(particles))) / len(particles)
+            resampled = np.searchsorted(np.cumsum(weights) / total_weight, positions, side='right')
+            particles = particles[np.minimum(resampled, len(particles) - 1)]
+
+        if isinstance(belief, np.ndarray) and belief.dtype.kind in 'iu':
+            return particles
+
+        counts = np.bincount(particles, minlength=len(self.index_states)) / float(len(particles))
+        if isinstance(belief, np.ndarray):
+            return counts
+        new_belief = defaultdict(float)
+        for sprime in belief:
+            new_belief[sprime] = 0.
+        for i in np.flatnonzero(counts):
+            new_belief[self.index_states[i]] = float(counts[i])
+        return new_belief
+
+    def sample_particles(self, belief, num_particles):
+        '''
+        Args:
+            belief (dict or np.ndarray): b(s)
+            num_particles (int)
+
+        Returns:
+            (np.ndarray): state indices of @num_particles particles drawn from @belief.
+        '''
+        probs = belief if isinstance(belief, np.ndarray) else self.belief_vector(belief)
+        return np.random.choice(len(probs), size=num_particles, p=probs / probs.sum())
+
+    def _sample_transitions(self, particles, action):
+        '''
+        Args:
+            particles (np.ndarray): state indices
+            action (int): index of the action
+
+        Returns:
+            (np.ndarray): for each particle, the index of a next state sampled from T(. | s, a).
+        '''
+        if action not in self._sampling_tables:
+            trans = self.transition_matrices[action]
+            row_sums = np.asarray(trans.sum(axis=1)).ravel()
+            rows = np.repeat(np.arange(trans.shape[0]), np.diff(trans.indptr))
+            # Row i's cumulative probabilities shifted by i, so the whole table is sorted and one searchsorted
+            # finds every particle's successor.
+            shifted_cdf = rows + np.cumsum(trans.data) - np.repeat(np.cumsum(row_sums) - row_sums, np.diff(trans.indptr))
+            self._sampling_tables[action] = (trans, row_sums, shifted_cdf)
+        trans, row_sums, shifted_cdf = self._sampling_tables[action]
+
+        targets = particles + np.random.random(len(particles)) * row_sums[particles]
+        entries = np.searchsorted(shifted_cdf, targets, side='right')
+        # Rounding can land just outside a particle's row, the nearest entry of the row is then the one drawn.
+        entries = np.clip(entries, trans.indptr[particles], trans.indptr[particles + 1] - 1)
+        return trans.indices[entries]
+
+    def belief_vector(self, belief):
+        '''
+        Args:
+            belief (dict): State -> float
+
+        Returns:
+            (np.ndarray): @belief over the state indices (states the model never reached are left out).
+        '''
+        vector = np.zeros(len(self.index_states))
+        for state, prob in belief.items():
+            i = self.state_index.get(state)
+            if i is not None:
+                vector[i] = prob
+        return vector
+
+    def belief_dict(self, vector):
+        '''
+        Args:
+            vector (np.ndarray): b over the state indices
+
+        Returns:
+            (defaultdict): State -> float, for the states with a non zero probability.
+        '''
+        belief = defaultdict(float)
+        for i in np.flatnonzero(vector):
+            belief[self.index_states[i]] = float(vector[i])
+        return belief
 
     def construct_transition_matrix(self, transition_func):
         '''
@@ -25,10 +25,8 @@ import numpy as np
 from collections import defaultdict
 
 # Non-standard imports.
-from simple_rl.planning import ValueIteration
 from simple_rl.experiments import Experiment
 from simple_rl.mdp import MarkovGameMDP
-from simple_rl.agents import FixedPolicyAgent
 
 def play_markov_game(agent_ls, markov_game_mdp, instances=10, episodes=100, steps=30, verbose=False, open_plot=True):
     '''
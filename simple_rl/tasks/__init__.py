@@ -1,29 +1,34 @@
 # Python imports.
 from __future__ import print_function
 
-# Grab classes.
-from simple_rl.tasks.bandit.BanditMDPClass import BanditMDP
-from simple_rl.tasks.chain.ChainMDPClass import ChainMDP
-from simple_rl.tasks.chain.ChainStateClass import ChainState
-from simple_rl.tasks.combo_lock.ComboLockMDPClass import ComboLockMDP
-from simple_rl.tasks.four_room.FourRoomMDPClass import FourRoomMDP
-from simple_rl.tasks.gather.GatherMDPClass import GatherMDP
-from simple_rl.tasks.gather.GatherStateClass import GatherState
-from simple_rl.tasks.grid_game.GridGameMDPClass import GridGameMDP
-from simple_rl.tasks.grid_world.GridWorldMDPClass import GridWorldMDP
-from simple_rl.tasks.grid_world.GridWorldStateClass import GridWorldState
-from simple_rl.tasks.hanoi.HanoiMDPClass import HanoiMDP
-from simple_rl.tasks.navigation.NavigationMDP import NavigationMDP
-from simple_rl.tasks.prisoners.PrisonersDilemmaMDPClass import PrisonersDilemmaMDP
-from simple_rl.tasks.puddle.PuddleMDPClass import PuddleMDP
-from simple_rl.tasks.random.RandomMDPClass import RandomMDP
-from simple_rl.tasks.random.RandomStateClass import RandomState
-from simple_rl.tasks.taxi.TaxiOOMDPClass import TaxiOOMDP
-from simple_rl.tasks.taxi.TaxiStateClass import TaxiState
-from simple_rl.tasks.trench.TrenchOOMDPClass import TrenchOOMDP
-from simple_rl.tasks.rock_paper_scissors.RockPaperScissorsMDPClass import RockPaperScissorsMDP
-try:
-	from simple_rl.tasks.gym.GymMDPClass import GymMDP
-except ImportError:
-	print("Warning: OpenAI gym not installed.")
-	pass
+# Other imports.
+from simple_rl.utils.lazy_imports import lazy_attributes
+
+# Grab classes (each task module is imported the first time its class is used).
+_LAZY_ATTRIBUTES = {
+	"BanditMDP" : "simple_rl.tasks.bandit.BanditMDPClass",
+	"ChainMDP" : "simple_rl.tasks.chain.ChainMDPClass",
+	"ChainState" : "simple_rl.tasks.chain.ChainStateClass",
+	"ComboLockMDP" : "simple_rl.tasks.combo_lock.ComboLockMDPClass",
+	"FourRoomMDP" : "simple_rl.tasks.four_room.FourRoomMDPClass",
+	"GatherMDP" : "simple_rl.tasks.gather.GatherMDPClass",
+	"GatherState" : "simple_rl.tasks.gather.GatherStateClass",
+	"GridGameMDP" : "simple_rl.tasks.grid_game.GridGameMDPClass",
+	"GridWorldMDP" : "simple_rl.tasks.grid_world.GridWorldMDPClass",
+	"GridWorldState" : "simple_rl.tasks.grid_world.GridWorldStateClass",
+	"HanoiMDP" : "simple_rl.tasks.hanoi.HanoiMDPClass",
+	"NavigationMDP" : "simple_rl.tasks.navigation.NavigationMDP",
+	"PrisonersDilemmaMDP" : "simple_rl.tasks.prisoners.PrisonersDilemmaMDPClass",
+	"PuddleMDP" : "simple_rl.tasks.puddle.PuddleMDPClass",
+	"RandomMDP" : "simple_rl.tasks.random.RandomMDPClass",
+	"RandomState" : "simple_rl.tasks.random.RandomStateClass",
+	"TaxiOOMDP" : "simple_rl.tasks.taxi.TaxiOOMDPClass",
+	"TaxiState" : "simple_rl.tasks.taxi.TaxiStateClass",
+	"TrenchOOMDP" : "simple_rl.tasks.trench.TrenchOOMDPClass",
+	"RockPaperScissorsMDP" : "simple_rl.tasks.rock_paper_scissors.RockPaperScissorsMDPClass",
+	# Requires OpenAI gym: raises ImportError when used without it.
+	"GymMDP" : "simple_rl.tasks.gym.GymMDPClass",
+}
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
+__all__ = [name for name in _LAZY_ATTRIBUTES if name != "GymMDP"]
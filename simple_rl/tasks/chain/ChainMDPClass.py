@@ -57,5 +57,16 @@ class ChainMDP(MDP):
         else:
             raise ValueError("(simple_rl Error): Unrecognized action! (" + action + ")")
 
+    def transition_distribution(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns:
+            (list): [(State, 1.0)], the transitions are deterministic.
+        '''
+        return [(self._transition_func(state, action), 1.0)]
+
     def __str__(self):
         return "chain-" + str(self.num_states)
@@ -63,5 +63,16 @@ class ComboLockMDP(MDP):
         else:
             return ChainState(1)
 
+    def transition_distribution(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns:
+            (list): [(State, 1.0)], the transitions are deterministic.
+        '''
+        return [(self._transition_func(state, action), 1.0)]
+
     def __str__(self):
         return "combolock-" + str(self.num_states)
@@ -160,15 +160,50 @@ class GridWorldMDP(MDP):
         r = random.random()
         if self.slip_prob > r:
             # Flip dir.
-            if action == "up":
-                action = random.choice(["left", "right"])
-            elif action == "down":
-                action = random.choice(["left", "right"])
-            elif action == "left":
-                action = random.choice(["up", "down"])
-            elif action == "right":
-                action = random.choice(["up", "down"])
+            action = random.choice(GridWorldMDP._slip_actions(action))
 
+        return self._move(state, action)
+
+    def transition_distribution(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns:
+            (list): [(State, float)], the next states of _transition_func with their probabilities.
+        '''
+        if state.is_terminal():
+            return [(state, 1.0)]
+
+        outcomes = [(self._move(state, action), 1.0 - self.slip_prob)]
+        slip_actions = GridWorldMDP._slip_actions(action)
+        for slip_action in slip_actions:
+            outcomes.append((self._move(state, slip_action), self.slip_prob / len(slip_actions)))
+
+        return MDP._merge_outcomes(outcomes)
+
+    @staticmethod
+    def _slip_actions(action):
+        '''
+        Returns:
+            (list): The actions perpendicular to @action, one of which is taken when the agent slips.
+        '''
+        if action in ["up", "down"]:
+            return ["left", "right"]
+        elif action in ["left", "right"]:
+            return ["up", "down"]
+        return [action]
+
+    def _move(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns
+            (State): The state reached by moving in the direction of @action.
+        '''
         if action == "up" and state.y < self.height and not self.is_wall(state.x, state.y + 1):
             next_state = GridWorldState(state.x, state.y + 1)
         elif action == "down" and state.y > 1 and not self.is_wall(state.x, state.y - 1):
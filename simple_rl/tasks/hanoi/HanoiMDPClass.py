@@ -79,6 +79,17 @@ class HanoiMDP(MDP):
 
         return new_state
 
+    def transition_distribution(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns:
+            (list): [(State, 1.0)], the transitions are deterministic.
+        '''
+        return [(self._transition_func(state, action), 1.0)]
+
     def _is_goal_state(self, state):
         '''
         Args:
@@ -50,6 +50,19 @@ class Maze1DPOMDP(POMDP):
                 return Maze1DState(random.choice(['left', 'middle', 'right']))
         raise ValueError('Invalid state: {} action: {} in 1DMaze'.format(state, action))
 
+    def transition_distribution(self, state, action):
+        '''
+        Args:
+            state (Maze1DState)
+            action (str)
+
+        Returns:
+            (list): [(Maze1DState, float)], leaving the goal resets to a uniformly random other state.
+        '''
+        if state.name == 'goal' and action in Maze1DPOMDP.ACTIONS:
+            return [(Maze1DState(name), 1. / 3) for name in ['left', 'middle', 'right']]
+        return [(self._transition_func(state, action), 1.)]
+
     def _observation_func(self, state, action):
         next_state = self._transition_func(state, action)
         return 'goal' if next_state.name == 'goal' else 'nothing'
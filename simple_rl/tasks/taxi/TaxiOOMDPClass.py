@@ -105,15 +105,47 @@ class TaxiOOMDP(OOMDP):
 
         if self.slip_prob > random.random():
             # Flip dir.
-            if action == "up":
-                action = "down"
-            elif action == "down":
-                action = "up"
-            elif action == "left":
-                action = "right"
-            elif action == "right":
-                action = "left"
+            action = TaxiOOMDP._slip_action(action)
 
+        return self._taxi_move(state, action)
+
+    def transition_distribution(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns:
+            (list): [(State, float)], the next states of _taxi_transition_func with their probabilities.
+        '''
+        _error_check(state, action)
+
+        slip_action = TaxiOOMDP._slip_action(action)
+        if slip_action == action:
+            return [(self._taxi_move(state, action), 1.0)]
+
+        outcomes = [(self._taxi_move(state, action), 1.0 - self.slip_prob),
+                    (self._taxi_move(state, slip_action), self.slip_prob)]
+
+        return OOMDP._merge_outcomes(outcomes)
+
+    @staticmethod
+    def _slip_action(action):
+        '''
+        Returns:
+            (str): The action taken when the agent slips, the opposite direction of a move.
+        '''
+        return {"up":"down", "down":"up", "left":"right", "right":"left"}.get(action, action)
+
+    def _taxi_move(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns
+            (State): The state reached by applying @action, without slipping.
+        '''
         if action == "up" and state.get_agent_y() < self.height:
             next_state = self.move_agent(state, self.slip_prob, dy=1)
         elif action == "down" and state.get_agent_y() > 1:
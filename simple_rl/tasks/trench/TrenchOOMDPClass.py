@@ -132,13 +132,57 @@ class TrenchOOMDP(OOMDP):
 
         if self.slip_prob > r:
             # Flip dir.
-            if action == "forward":
-                action = random.choice(["rotate_left", "rotate_right", "place"])
-            elif action == "rotate_left":
-                action = random.choice(["forward", "rotate_right", "place"])
-            elif action == "rotate_right":
-                action = random.choice(["forward", "rotate_left", "place"])
+            slip_actions = TrenchOOMDP._slip_actions(action)
+            if slip_actions:
+                action = random.choice(slip_actions)
 
+        return self._trench_move(state, action)
+
+    def transition_distribution(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns:
+            (list): [(State, float)], the next states of _trench_transition_func with their probabilities.
+        '''
+        if state.is_terminal():
+            return [(state, 1.0)]
+
+        slip_actions = TrenchOOMDP._slip_actions(action)
+        if not slip_actions:
+            return [(self._trench_move(state, action), 1.0)]
+
+        outcomes = [(self._trench_move(state, action), 1.0 - self.slip_prob)]
+        for slip_action in slip_actions:
+            outcomes.append((self._trench_move(state, slip_action), self.slip_prob / len(slip_actions)))
+
+        return OOMDP._merge_outcomes(outcomes)
+
+    @staticmethod
+    def _slip_actions(action):
+        '''
+        Returns:
+            (list): The actions one of which is taken when the agent slips (empty if @action never slips).
+        '''
+        if action == "forward":
+            return ["rotate_left", "rotate_right", "place"]
+        elif action == "rotate_left":
+            return ["forward", "rotate_right", "place"]
+        elif action == "rotate_right":
+            return ["forward", "rotate_left", "place"]
+        return []
+
+    def _trench_move(self, state, action):
+        '''
+        Args:
+            state (State)
+            action (str)
+
+        Returns
+            (State): The state reached by applying @action, without slipping.
+        '''
         forward_state_in_bounds = self._forward_state_in_bounds(state)
         is_forward_loc_block = self._is_forward_loc_block(state)
         if action == "forward" and forward_state_in_bounds and not is_forward_loc_block:
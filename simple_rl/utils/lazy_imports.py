@@ -0,0 +1,48 @@
+'''
+lazy_imports.py: PEP 562 attribute loading for the simple_rl packages.
+
+Usage (in a package's __init__.py):
+    from simple_rl.utils.lazy_imports import lazy_attributes
+
+    _LAZY_ATTRIBUTES = {
+        "GridWorldMDP": "simple_rl.tasks.grid_world.GridWorldMDPClass",
+        ...
+    }
+    __getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
+
+`from simple_rl.tasks import GridWorldMDP` then imports only the grid world
+module, the first time the name is asked for. An entry naming the
+package's own submodule (eg. "agents": "simple_rl.agents" in simple_rl)
+resolves to the submodule itself.
+
+Requires Python 3.7+ (module-level __getattr__).
+'''
+
+# Python imports.
+import importlib
+import sys
+
+def lazy_attributes(package_name, registry):
+    '''
+    Args:
+        package_name (str): __name__ of the package.
+        registry (dict): Attribute name -> name of the module that defines it.
+
+    Returns:
+        (tuple): The package's (__getattr__, __dir__) functions.
+    '''
+    def __getattr__(name):
+        if name not in registry:
+            raise AttributeError("module {!r} has no attribute {!r}".format(package_name, name))
+
+        module = importlib.import_module(registry[name])
+        value = module if module.__name__ == package_name + "." + name else getattr(module, name)
+
+        # Cache on the package so later lookups never reach __getattr__ again.
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package_name])) | set(registry))
+
+    return __getattr__, __dir__
@@ -0,0 +1,187 @@
+'''
+metrics.py: Buffered, sampled scalar logging.
+
+MetricsWriter exposes the `add_scalar(tag, value, step)` interface of a
+tensorboardX SummaryWriter, so it can be handed to agents in place of one.
+Instead of writing every call through, it:
+    - keeps only every k-th value of a tag (per-tag sampling rates),
+    - aggregates the kept values in memory over a flush window,
+    - defers tensor -> float conversion (and callables, eg. gradient norms)
+      until the value is actually kept/flushed,
+    - writes window reductions (mean/min/max/last) to a backend from a
+      background thread every `flush_secs` seconds.
+
+Backends: anything with add_scalar(tag, value, step) and flush() (eg. a
+SummaryWriter), or the CSVBackend below.
+'''
+
+# Python imports.
+from __future__ import print_function
+import csv
+import fnmatch
+import os
+import threading
+from collections import defaultdict
+
+# Gradient norms cost a pass over every parameter; agents log them 1-in-10 updates
+GRADIENT_NORM_SAMPLE_RATES = {"*_grad_norm": 10, "*-GradientNorm": 10}
+
+class CSVBackend(object):
+    ''' Appends (tag, step, value) rows to a csv file. '''
+
+    def __init__(self, log_dir, file_name="metrics.csv"):
+        '''
+        Args:
+            log_dir (str)
+            file_name (str)
+        '''
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        self.path = os.path.join(log_dir, file_name)
+        is_new = not os.path.exists(self.path)
+        self._file = open(self.path, "a")
+        self._writer = csv.writer(self._file)
+        if is_new:
+            self._writer.writerow(["tag", "step", "value"])
+
+    def add_scalar(self, tag, value, step):
+        self._writer.writerow([tag, step, value])
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def _to_float(value):
+    # Callables are lazily evaluated metrics, tensors are only synced here.
+    if callable(value):
+        value = value()
+    if hasattr(value, "item"):
+        value = value.item()
+    return float(value)
+
+class _Window(object):
+    ''' Values kept for one tag since the last flush. '''
+    __slots__ = ["values", "last_step"]
+
+    def __init__(self):
+        self.values = []
+        self.last_step = 0
+
+class MetricsWriter(object):
+
+    REDUCTIONS = {"mean":lambda values: sum(values) / len(values),
+                  "min":min,
+                  "max":max,
+                  "last":lambda values: values[-1]}
+
+    def __init__(self, backend, flush_secs=30., default_sample_rate=1, sample_rates=None, reductions=None, default_reduction="mean"):
+        '''
+        Args:
+            backend: Object with add_scalar(tag, value, step) and flush() (SummaryWriter, CSVBackend).
+            flush_secs (float): Period of the background flush thread. If <= 0, only explicit flush() writes.
+            default_sample_rate (int): Keep every k-th value of tags with no matching rate.
+            sample_rates (dict): Maps fnmatch patterns over tags to sample rates, eg. {"*_action_*": 50}.
+            reductions (dict): Maps fnmatch patterns over tags to a reduction name or a list of them.
+            default_reduction (str): One of MetricsWriter.REDUCTIONS.
+        '''
+        self.backend = backend
+        self.flush_secs = flush_secs
+        self.default_sample_rate = max(1, int(default_sample_rate))
+        self.sample_rates = sample_rates if sample_rates is not None else {}
+        self.reductions = reductions if reductions is not None else {}
+        self.default_reduction = default_reduction
+
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._calls = defaultdict(int)
+        self._tag_rates = {}
+        self._tag_reductions = {}
+
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_secs > 0:
+            self._thread = threading.Thread(target=self._run, name="MetricsWriter")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _match(self, tag, patterns, default):
+        for pattern, value in patterns.items():
+            if fnmatch.fnmatchcase(tag, pattern):
+                return value
+        return default
+
+    def _sample_rate(self, tag):
+        if tag not in self._tag_rates:
+            self._tag_rates[tag] = max(1, int(self._match(tag, self.sample_rates, self.default_sample_rate)))
+        return self._tag_rates[tag]
+
+    def _reduction_names(self, tag):
+        if tag not in self._tag_reductions:
+            names = self._match(tag, self.reductions, self.default_reduction)
+            self._tag_reductions[tag] = [names] if isinstance(names, str) else list(names)
+        return self._tag_reductions[tag]
+
+    def should_sample(self, tag):
+        '''
+        Args:
+            tag (str)
+
+        Returns:
+            (bool): True if the next add_scalar call for @tag will be kept.
+                Lets callers skip building expensive values altogether.
+        '''
+        return self._calls[tag] % self._sample_rate(tag) == 0
+
+    def add_scalar(self, tag, value, step=None):
+        '''
+        Args:
+            tag (str)
+            value (float, tensor or callable returning either)
+            step (int)
+        '''
+        calls = self._calls[tag]
+        self._calls[tag] = calls + 1
+        if calls % self._sample_rate(tag) != 0:
+            return
+
+        # Evaluate lazy values now (eg. gradient norms must be read before the next update),
+        # but keep tensors as-is so the device sync happens on the flush thread.
+        if callable(value):
+            value = value()
+
+        with self._lock:
+            window = self._windows.get(tag)
+            if window is None:
+                window = self._windows[tag] = _Window()
+            window.values.append(value)
+            window.last_step = step if step is not None else calls
+
+    def flush(self):
+        ''' Reduces all pending windows and writes them to the backend. '''
+        with self._lock:
+            windows, self._windows = self._windows, {}
+
+        for tag, window in windows.items():
+            if len(window.values) == 0:
+                continue
+            values = [_to_float(value) for value in window.values]
+            names = self._reduction_names(tag)
+            for name in names:
+                out_tag = tag if len(names) == 1 else "{}/{}".format(tag, name)
+                self.backend.add_scalar(out_tag, MetricsWriter.REDUCTIONS[name](values), window.last_step)
+        self.backend.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_secs):
+            self.flush()
+
+    def close(self):
+        ''' Stops the flush thread and writes anything still buffered. '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        if hasattr(self.backend, "close"):
+            self.backend.close()
@@ -0,0 +1,222 @@
+'''
+profiler.py: Lightweight wall-clock profiler for hot paths in long-running agents.
+
+Usage:
+    from simple_rl.utils.profiler import profiler, profiled
+
+    class Agent(object):
+        @profiled("learn")
+        def _learn(self, experiences):
+            ...
+
+        def step(self):
+            with profiler.phase("env_step", self.name):
+                ...
+
+    profiler.enable()
+    profiler.start_episode()
+    ...
+    rows = profiler.end_episode(episode)
+    print(profiler.format_table(rows))
+    profiler.write(out_dir)
+
+Timings are inclusive: a phase that calls another profiled phase also counts
+the time spent in the callee. When the profiler is disabled, `profiled`
+methods pay a single attribute check and `phase` returns a shared no-op
+context manager.
+'''
+
+# Python imports.
+from __future__ import print_function
+import csv
+import functools
+import json
+import os
+import time
+from collections import defaultdict
+
+# time.perf_counter is not available in python 2.
+_clock = getattr(time, "perf_counter", time.time)
+
+class _NullTimer(object):
+    ''' No-op context manager handed out when profiling is disabled. '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _PhaseTimer(object):
+    ''' Context manager that charges its wall time to (phase, owner). '''
+    def __init__(self, profiler, phase, owner):
+        self.profiler = profiler
+        self.phase = phase
+        self.owner = owner
+        self.start = None
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.phase, self.owner, _clock() - self.start)
+        return False
+
+class Profiler(object):
+    ''' Accumulates wall time and call counts per (phase, owner) and per episode. '''
+
+    CSV_FIELDS = ["episode", "phase", "owner", "calls", "seconds", "episode_seconds"]
+
+    def __init__(self, enabled=False):
+        '''
+        Args:
+            enabled (bool): Whether timings are recorded.
+        '''
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self._totals = defaultdict(lambda : [0., 0])
+        self._episode_start = None
+        self.history = []
+        # Output file -> number of history rows already written to it
+        self._written = {}
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def disable(self):
+        self.enabled = False
+
+    def phase(self, phase, owner=""):
+        '''
+        Args:
+            phase (str): Name of the phase being timed.
+            owner (str): Option/agent the time is charged to.
+
+        Returns:
+            (context manager)
+        '''
+        if not self.enabled:
+            return _NULL_TIMER
+        return _PhaseTimer(self, phase, owner)
+
+    def add(self, phase, owner, seconds, calls=1):
+        total = self._totals[(phase, owner)]
+        total[0] += seconds
+        total[1] += calls
+
+    def start_episode(self):
+        self._totals.clear()
+        self._episode_start = _clock()
+
+    def end_episode(self, episode):
+        '''
+        Args:
+            episode (int)
+
+        Returns:
+            (list): Rows (dicts) for this episode, sorted by time spent (descending).
+
+        Summary:
+            Closes the current episode: moves the accumulated totals into
+            @self.history and clears them for the next episode.
+        '''
+        if not self.enabled:
+            return []
+
+        episode_seconds = _clock() - self._episode_start if self._episode_start is not None else 0.
+        rows = []
+        for (phase, owner), (seconds, calls) in self._totals.items():
+            rows.append({"episode":episode, "phase":phase, "owner":owner, "calls":calls,
+                         "seconds":seconds, "episode_seconds":episode_seconds})
+        rows.sort(key=lambda row: row["seconds"], reverse=True)
+
+        self.history.extend(rows)
+        self._totals.clear()
+        self._episode_start = None
+        return rows
+
+    @staticmethod
+    def format_table(rows):
+        '''
+        Args:
+            rows (list): As returned by end_episode.
+
+        Returns:
+            (str): Human readable breakdown of the episode.
+        '''
+        if len(rows) == 0:
+            return ""
+
+        episode_seconds = rows[0]["episode_seconds"]
+        owner_width = max([len("owner")] + [len(row["owner"]) for row in rows])
+        phase_width = max([len("phase")] + [len(row["phase"]) for row in rows])
+        line_format = "{:<" + str(phase_width) + "}  {:<" + str(owner_width) + "}  {:>8}  {:>10}  {:>10}  {:>6}"
+
+        lines = ["Profile (episode {}, {:.2f}s wall, inclusive times):".format(rows[0]["episode"], episode_seconds)]
+        lines.append(line_format.format("phase", "owner", "calls", "total (s)", "mean (ms)", "%"))
+        for row in rows:
+            mean_ms = 1000. * row["seconds"] / max(row["calls"], 1)
+            percent = 100. * row["seconds"] / episode_seconds if episode_seconds > 0 else 0.
+            lines.append(line_format.format(row["phase"], row["owner"], row["calls"],
+                                            "{:.3f}".format(row["seconds"]), "{:.3f}".format(mean_ms), "{:.1f}".format(percent)))
+        return "\n".join(lines)
+
+    def write(self, out_dir, file_name="profile"):
+        '''
+        Args:
+            out_dir (str): Directory to write into.
+            file_name (str): Base name for the .csv and .json files.
+
+        Summary:
+            Writes the per-episode time series as CSV and JSON lines (one row per line).
+            The first call for a file (re)creates it, later calls only append the rows
+            recorded since, so calling this every episode stays cheap.
+        '''
+        if not self.enabled:
+            return
+
+        csv_path = os.path.join(out_dir, file_name + ".csv")
+        json_path = os.path.join(out_dir, file_name + ".jsonl")
+        start = self._written.get(csv_path, 0)
+        rows = self.history[start:]
+
+        with open(csv_path, "a" if start > 0 else "w") as f:
+            writer = csv.DictWriter(f, fieldnames=Profiler.CSV_FIELDS)
+            if start == 0:
+                writer.writeheader()
+            writer.writerows(rows)
+
+        with open(json_path, "a" if start > 0 else "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+        self._written[csv_path] = len(self.history)
+
+# Process-wide profiler shared by all instrumented modules.
+profiler = Profiler()
+
+def profiled(phase):
+    '''
+    Args:
+        phase (str): Name of the phase the decorated method is charged to.
+
+    Returns:
+        (function): Method decorator. Time is charged to the instance's `name`
+            attribute (if any), so options/solvers are reported separately.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not profiler.enabled:
+                return func(self, *args, **kwargs)
+            start = _clock()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                profiler.add(phase, getattr(self, "name", ""), _clock() - start)
+        return wrapper
+    return decorator
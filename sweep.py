@@ -0,0 +1,302 @@
+'''
+sweep.py: Runs a grid of SkillChaining experiments in parallel.
+
+Every (grid point, seed) pair is one run of SkillChainingAgentClass.py in its own
+process. Runs are scheduled onto a pool of workers sized to the machine, and each
+run's torch/BLAS/OpenMP thread pools are pinned so the workers do not oversubscribe
+the cores. Runs that already completed are skipped, failed runs are retried (resuming
+from their last checkpoint when there is one), and a manifest of run directories,
+statuses and runtimes is kept up to date under runs/.
+
+Usage:
+	python sweep.py --experiment_name="maze_nu_sweep" --grid opt_nu=0.1,0.3 pes_nu=0.1,0.3,0.5 \
+		--seeds 0-9 --threads_per_run=1 --devices cpu -- --env=maze --episodes=300 --steps=2000 \
+		--use_smdp_update=True --option_timeout=True --subgoal_reward=300. --episodic_saves=True
+
+Everything after `--` is passed unchanged to every run.
+'''
+
+# Python imports.
+from __future__ import print_function
+import sys
+import os
+import json
+import time
+import queue
+import argparse
+import datetime
+import itertools
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPT = os.path.join("simple_rl", "agents", "func_approx", "dsc", "SkillChainingAgentClass.py")
+
+# Environment variables read by torch, numpy's BLAS and sklearn (through threadpoolctl/OpenMP) to size their thread pools
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"]
+
+def parse_seeds(seed_args):
+	''' ["0-4", "7"] -> [0, 1, 2, 3, 4, 7] '''
+	seeds = []
+	for seed_arg in seed_args:
+		if "-" in seed_arg:
+			start, end = seed_arg.split("-")
+			seeds.extend(range(int(start), int(end) + 1))
+		else:
+			seeds.append(int(seed_arg))
+	return seeds
+
+def parse_grid(grid_args):
+	''' ["opt_nu=0.1,0.3", "pes_nu=0.5"] -> [("opt_nu", ["0.1", "0.3"]), ("pes_nu", ["0.5"])] '''
+	grid = []
+	for grid_arg in grid_args:
+		name, values = grid_arg.split("=", 1)
+		grid.append((name.lstrip("-"), values.split(",")))
+	return grid
+
+def make_runs(experiment_name, grid, seeds):
+	'''
+	Args:
+		experiment_name (str): Prefix of every grid point's experiment name
+		grid (list): (argument name, list of values) pairs
+		seeds (list)
+
+	Returns:
+		(list): One dict per run, with the grid point's `config` and its `experiment_name` under runs/
+	'''
+	runs = []
+	names = [name for name, _ in grid]
+	for values in itertools.product(*[values for _, values in grid]):
+		config = dict(zip(names, values))
+		point_name = "_".join([experiment_name] + ["{}_{}".format(name, value) for name, value in zip(names, values)])
+		for seed in seeds:
+			runs.append({"experiment_name": point_name, "seed": seed, "config": config})
+	return runs
+
+def run_paths(run):
+	exp_dir = os.path.join("runs", run["experiment_name"])
+	data_dir = os.path.join(exp_dir, "run_{}_all_data".format(run["seed"]))
+	return exp_dir, data_dir
+
+def done_marker(run):
+	exp_dir, _ = run_paths(run)
+	return os.path.join(exp_dir, "run_{}.done".format(run["seed"]))
+
+def is_completed(run):
+	''' A run is complete once the launcher saw it exit cleanly, or its data shows SkillChaining finished saving. '''
+	_, data_dir = run_paths(run)
+	if os.path.exists(done_marker(run)):
+		return True
+	if os.path.exists(os.path.join(data_dir, "run_log")):
+		return os.path.exists(os.path.join(data_dir, "run_log", "final.pkl"))
+	return os.path.exists(os.path.join(data_dir, "per_episode_scores.pkl"))
+
+def make_command(run, device, extra_args, resume):
+	command = [sys.executable, "-u", SCRIPT,
+			   "--experiment_name={}".format(run["experiment_name"]),
+			   "--seed={}".format(run["seed"]),
+			   "--num_run={}".format(run["seed"]),
+			   "--device={}".format(device)]
+	command += ["--{}={}".format(name, value) for name, value in run["config"].items()]
+	command += extra_args
+	# SkillChaining parses booleans with type=bool, so only ever pass flags that should be True
+	if resume:
+		command.append("--resume=True")
+	return command
+
+def make_env(threads_per_run):
+	env = dict(os.environ)
+	for var in THREAD_ENV_VARS:
+		env[var] = str(threads_per_run)
+	# Runs import the package from the repository root
+	env["PYTHONPATH"] = os.pathsep.join([os.getcwd()] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+	return env
+
+def format_runtime(seconds):
+	seconds = int(seconds)
+	return "{}:{}:{}".format(seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+class Sweep(object):
+	''' Schedules runs onto `num_workers` worker slots and records their outcome in a manifest. '''
+
+	def __init__(self, runs, manifest_file, num_workers, threads_per_run, devices, extra_args, retries, dry_run=False):
+		'''
+		Args:
+			runs (list): As returned by make_runs
+			manifest_file (str)
+			num_workers (int): Runs executed at the same time
+			threads_per_run (int): Size of each run's torch/BLAS/OpenMP thread pools
+			devices (list): Devices handed out round robin to the worker slots (eg. ["cuda:0", "cuda:1"])
+			extra_args (list): Arguments passed to every run
+			retries (int): Extra attempts given to a failed run
+			dry_run (bool): Print the commands instead of running them
+		'''
+		self.runs = runs
+		self.manifest_file = manifest_file
+		self.num_workers = num_workers
+		self.threads_per_run = threads_per_run
+		self.extra_args = extra_args
+		self.retries = retries
+		self.dry_run = dry_run
+
+		# One device per worker slot: a run holds its slot's device for as long as it executes
+		self.devices = queue.Queue()
+		for i in range(num_workers):
+			self.devices.put(devices[i % len(devices)])
+
+		self.lock = threading.Lock()
+		self.processes = set()
+		self.stopped = False
+		self.manifest = self.load_manifest()
+
+	def load_manifest(self):
+		if os.path.exists(self.manifest_file):
+			with open(self.manifest_file, "r") as f:
+				return {(entry["experiment_name"], entry["seed"]): entry for entry in json.load(f)["runs"]}
+		return {}
+
+	def save_manifest(self):
+		''' Rewrites the manifest atomically (called with self.lock held). '''
+		manifest_dir = os.path.dirname(os.path.abspath(self.manifest_file))
+		if not os.path.exists(manifest_dir):
+			os.makedirs(manifest_dir)
+		entries = sorted(self.manifest.values(), key=lambda entry: (entry["experiment_name"], entry["seed"]))
+		fd, tmp_name = tempfile.mkstemp(dir=manifest_dir, prefix=".tmp_", suffix=".json")
+		with os.fdopen(fd, "w") as f:
+			json.dump({"updated": datetime.datetime.now().isoformat(), "runs": entries}, f, indent=2)
+		os.replace(tmp_name, self.manifest_file)
+
+	def record(self, run, **fields):
+		exp_dir, data_dir = run_paths(run)
+		with self.lock:
+			key = (run["experiment_name"], run["seed"])
+			entry = self.manifest.get(key, {})
+			entry.update({"experiment_name": run["experiment_name"], "seed": run["seed"], "config": run["config"],
+						  "run_dir": exp_dir, "data_dir": data_dir,
+						  "log_file": os.path.join(exp_dir, "run_{}.log".format(run["seed"]))})
+			entry.update(fields)
+			self.manifest[key] = entry
+			self.save_manifest()
+
+	def execute(self, run, device, resume):
+		''' Runs one attempt of `run`, teeing its output to the run's log file. Returns the exit code. '''
+		exp_dir, _ = run_paths(run)
+		log_file = os.path.join(exp_dir, "run_{}.log".format(run["seed"]))
+		command = make_command(run, device, self.extra_args, resume)
+
+		with open(log_file, "a") as log:
+			log.write("=====================================\n")
+			log.write("START: {}\n".format(datetime.datetime.now()))
+			log.write("CMD: {}\n".format(" ".join(command)))
+			for name, value in sorted(run["config"].items()):
+				log.write("- {}: {}\n".format(name, value))
+			log.write("- seed: {}\n".format(run["seed"]))
+			log.write("- device: {}\n".format(device))
+			log.write("=====================================\n\n")
+			log.flush()
+
+			with self.lock:
+				if self.stopped:
+					return None
+				process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=make_env(self.threads_per_run))
+				self.processes.add(process)
+			returncode = process.wait()
+			with self.lock:
+				self.processes.discard(process)
+		return returncode
+
+	def launch(self, run):
+		exp_dir, data_dir = run_paths(run)
+		if not os.path.exists(exp_dir):
+			os.makedirs(exp_dir)
+
+		device = self.devices.get()
+		try:
+			start = time.time()
+			returncode = None
+			for attempt in range(1 + self.retries):
+				# A failed attempt continues from its last checkpoint (when it was run with --checkpoint_every)
+				resume = attempt > 0 and os.path.exists(os.path.join(data_dir, "checkpoint.pt"))
+				self.record(run, status="running", attempts=attempt + 1, device=device, started=datetime.datetime.now().isoformat())
+				returncode = self.execute(run, device, resume)
+				if returncode == 0 or self.stopped:
+					break
+				print("|-> {} seed {} failed with exit code {} (attempt {} of {})".format(
+					run["experiment_name"], run["seed"], returncode, attempt + 1, 1 + self.retries))
+		finally:
+			self.devices.put(device)
+
+		runtime = time.time() - start
+		status = "completed" if returncode == 0 else ("stopped" if self.stopped else "failed")
+		if status == "completed":
+			with open(done_marker(run), "w") as f:
+				f.write(format_runtime(runtime) + "\n")
+		self.record(run, status=status, returncode=returncode, runtime_secs=round(runtime, 1))
+		print("|-> {} seed {}: {} in {} (h:m:s)".format(run["experiment_name"], run["seed"], status, format_runtime(runtime)))
+		return status
+
+	def stop(self):
+		''' Stops scheduling new runs and terminates the ones in flight. '''
+		with self.lock:
+			self.stopped = True
+			for process in self.processes:
+				process.terminate()
+
+	def run(self):
+		pending = []
+		for run in self.runs:
+			if is_completed(run):
+				print("|-> Skipping {} seed {} (already completed)".format(run["experiment_name"], run["seed"]))
+				if not self.dry_run:
+					self.record(run, status="completed")
+			else:
+				pending.append(run)
+
+		print("|-> {} of {} runs to go on {} workers ({} threads each)".format(len(pending), len(self.runs), self.num_workers, self.threads_per_run))
+		if self.dry_run:
+			for run in pending:
+				print(" ".join(make_command(run, self.devices.queue[0], self.extra_args, resume=False)))
+			return {}
+
+		executor = ThreadPoolExecutor(max_workers=self.num_workers)
+		futures = [executor.submit(self.launch, run) for run in pending]
+		try:
+			statuses = [future.result() for future in futures]
+		except KeyboardInterrupt:
+			print("|-> Interrupted, terminating running runs")
+			self.stop()
+			for future in futures:
+				future.cancel()
+			statuses = []
+		executor.shutdown(wait=True)
+
+		return {status: statuses.count(status) for status in set(statuses)}
+
+if __name__ == '__main__':
+	# Arguments after `--` go to every run unchanged
+	argv = sys.argv[1:]
+	extra_args = argv[argv.index("--") + 1:] if "--" in argv else []
+	argv = argv[:argv.index("--")] if "--" in argv else argv
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--experiment_name", type=str, help="Prefix of the grid points' experiment names", required=True)
+	parser.add_argument("--grid", type=str, nargs="*", help="Swept arguments, eg. opt_nu=0.1,0.3 pes_nu=0.5", default=[])
+	parser.add_argument("--seeds", type=str, nargs="+", help="Seeds or seed ranges, eg. 0-9", default=["0"])
+	parser.add_argument("--threads_per_run", type=int, help="torch/BLAS/OpenMP threads of each run", default=1)
+	parser.add_argument("--workers", type=int, help="Runs at the same time (default: cores // threads_per_run)", default=None)
+	parser.add_argument("--devices", type=str, nargs="+", help="Devices assigned round robin to the workers, eg. cuda:0 cuda:1", default=["cpu"])
+	parser.add_argument("--retries", type=int, help="Extra attempts for a failed run", default=1)
+	parser.add_argument("--manifest", type=str, help="Manifest file (default: runs/<experiment_name>_manifest.json)", default=None)
+	parser.add_argument("--dry_run", type=bool, help="Print the commands without running them", default=False)
+	args = parser.parse_args(argv)
+
+	num_workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads_per_run)
+	manifest_file = args.manifest or os.path.join("runs", "{}_manifest.json".format(args.experiment_name))
+	runs = make_runs(args.experiment_name, parse_grid(args.grid), parse_seeds(args.seeds))
+
+	sweep = Sweep(runs, manifest_file, num_workers, args.threads_per_run, args.devices, extra_args, args.retries, dry_run=args.dry_run)
+	counts = sweep.run()
+
+	print("|-> Sweep done: {} (manifest: {})".format(", ".join("{} {}".format(n, status) for status, n in sorted(counts.items())) or "nothing run", manifest_file))
+	sys.exit(1 if counts.get("failed", 0) > 0 else 0)
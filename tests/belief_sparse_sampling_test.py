@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+'''
+belief_sparse_sampling_test.py: Checks the batched, memoized, anytime and parallel BeliefSparseSampling.
+
+Usage:
+    python belief_sparse_sampling_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import random
+import sys
+import time
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.tasks.maze_1d.Maze1DPOMDPClass import Maze1DPOMDP
+from simple_rl.pomdp.BeliefMDPClass import BeliefMDP
+from simple_rl.planning.BeliefSparseSamplingClass import BeliefSparseSampling
+
+def make_planner(**kwargs):
+    belief_mdp = BeliefMDP(Maze1DPOMDP())
+    return BeliefSparseSampling(gen_model=belief_mdp, gamma=0.6, tol=1.0, max_reward=1.0, state=belief_mdp.get_init_state(), **kwargs)
+
+def test_batched_successors():
+    np.random.seed(0)
+    bss = make_planner()
+    successors = bss._sample_successors(bss.gen_model.get_init_state(), 'east', bss.width)
+    assert sum(count for _, count in successors) == bss.width
+    # One belief per distinct observation
+    assert len(successors) <= len(bss.gen_model.pomdp.get_observations())
+
+def test_run_reaches_goal():
+    random.seed(0)
+    np.random.seed(0)
+    bss = make_planner(memo_size=20)
+    discounted_sum_rewards, policy = bss.run(verbose=False)
+    assert bss.gen_model.is_in_goal_state() and discounted_sum_rewards > 0
+    assert len(bss.value_memo) <= 20
+
+def test_memo_size_keeps_values():
+    qvalues = []
+    for memo_size in (5, 100000):
+        bss = make_planner(memo_size=memo_size)
+        qvalues.append(bss._root_qvalues(bss.gen_model.get_init_state(), bss.horizon))
+    assert np.allclose(qvalues[0], qvalues[1])
+
+def test_anytime():
+    # Out of time right away: the plan falls back to the one level tree
+    bss = make_planner(time_budget=0.)
+    state = bss.gen_model.get_init_state()
+    assert np.allclose(bss._anytime_qvalues(state), make_planner()._root_qvalues(state, 1))
+    # Unfinished trees are not cached as the full horizon plan
+    assert len(bss.root_level_qvals) == 0 and bss._deadline is None
+
+    bss = make_planner(time_budget=10.)
+    start = time.time()
+    assert np.allclose(bss._anytime_qvalues(state), make_planner()._root_qvalues(state, bss.horizon))
+    assert time.time() - start < 10. and len(bss.root_level_qvals) == 1
+
+def test_parallel_root_actions():
+    serial, parallel = make_planner(), make_planner(num_workers=2)
+    state = serial.gen_model.get_init_state()
+    assert np.allclose(serial._root_qvalues(state, serial.horizon), parallel._root_qvalues(state, parallel.horizon))
+
+def main():
+    tests = [test_batched_successors, test_run_reaches_goal, test_memo_size_keeps_values, test_anytime, test_parallel_root_actions]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+'''
+belief_updater_test.py: Checks the vectorized BeliefUpdater filters against the per-state Bayes update.
+
+Usage:
+    python belief_updater_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+from collections import Counter
+import os
+import sys
+import numpy as np
+from scipy import sparse
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.tasks.maze_1d.Maze1DPOMDPClass import Maze1DPOMDP
+from simple_rl.tasks.maze_1d.Maze1DStateClass import Maze1DState
+
+def bayes_update(updater, belief, action, observation):
+    # The update as written before it was vectorized
+    T, O = updater.transition_probs, updater.observation_probs
+    new_belief = dict((sp, O[sp][observation] * sum([T[s][action][sp] * belief[s] for s in belief])) for sp in belief)
+    normalization = sum(new_belief.values())
+    return dict((sp, prob / normalization if normalization > 0 else prob) for sp, prob in new_belief.items())
+
+def random_beliefs(updater, num_beliefs):
+    rng = np.random.RandomState(0)
+    for _ in range(num_beliefs):
+        probs = rng.dirichlet(np.ones(len(updater.index_states)))
+        yield dict(zip(updater.index_states, probs))
+
+def test_discrete_matches_bayes_update():
+    updater = Maze1DPOMDP().belief_updater
+    for belief in random_beliefs(updater, 5):
+        for action in updater.action_index:
+            for observation in updater.observation_likelihoods:
+                expected = bayes_update(updater, belief, action, observation)
+                new_belief = updater.discrete_filter_updater(belief, action, observation)
+                assert set(new_belief) == set(expected)
+                for s in expected:
+                    assert abs(new_belief[s] - expected[s]) < 1e-9, (action, observation, s)
+
+                # Dense and sparse vectors give the same belief
+                vector = updater.belief_vector(belief)
+                dense = updater.discrete_filter_updater(vector, action, observation)
+                sparse_row = updater.discrete_filter_updater(sparse.csr_matrix(vector), action, observation)
+                assert np.allclose(dense, updater.belief_vector(expected))
+                assert sparse.issparse(sparse_row) and np.allclose(sparse_row.toarray().ravel(), dense)
+
+def test_particle_filter():
+    np.random.seed(0)
+    updater = Maze1DPOMDP().belief_updater
+    num_particles = 20000
+
+    # Transitions of the particles follow T
+    goal = updater.state_index[Maze1DState('goal')]
+    successors = updater._sample_transitions(np.full(num_particles, goal), updater.action_index['east'])
+    counts = Counter(updater.index_states[i].name for i in successors)
+    assert set(counts) == {'left', 'middle', 'right'}
+    assert all(abs(count / float(num_particles) - 1. / 3) < 0.02 for count in counts.values())
+
+    # The resampled particles approximate the exact update
+    for belief in random_beliefs(updater, 3):
+        for action in updater.action_index:
+            expected = updater.belief_vector(updater.discrete_filter_updater(belief, action, 'nothing'))
+            particles = updater.sample_particles(belief, num_particles)
+            new_particles = updater.particle_filter_updater(particles, action, 'nothing')
+            assert new_particles.shape == particles.shape
+            frequencies = np.bincount(new_particles, minlength=len(expected)) / float(num_particles)
+            assert np.abs(frequencies - expected).max() < 0.02, action
+
+    new_belief = updater.particle_filter_updater(dict(belief), 'east', 'goal')
+    assert new_belief[updater.index_states[goal]] == 1.
+
+def main():
+    tests = [test_discrete_matches_bayes_update, test_particle_filter]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
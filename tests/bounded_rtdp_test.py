@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+'''
+bounded_rtdp_test.py: Checks BoundedRTDP's successor-sparse backups against sums over trans_dict.
+
+Usage:
+    python bounded_rtdp_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+from collections import Counter
+import os
+import random
+import sys
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.tasks import GridWorldMDP
+from simple_rl.planning.ValueIterationClass import ValueIteration
+from simple_rl.planning.BoundedRTDPClass import BoundedRTDP
+
+def make_planner():
+    mdp = GridWorldMDP(6, 6, goal_locs=[(6, 6)], lava_locs=[(3, 4)], slip_prob=0.2)
+    vi = ValueIteration(mdp)
+    vi.run_vi()
+    lower_values = dict((s, vi.get_value(s) - 0.5) for s in vi.get_states())
+    upper_values = dict((s, 1. / (1. - mdp.gamma)) for s in vi.get_states())
+    return BoundedRTDP(mdp, lower_values_init=lower_values, upper_values_init=upper_values)
+
+def test_backups_match_trans_dict():
+    planner = make_planner()
+    values = np.random.RandomState(0).uniform(size=len(planner.states))
+    for i, s in enumerate(planner.states):
+        q_vals = planner._qvalues(i, values)
+        for j, a in enumerate(planner.actions):
+            expected_q_val = planner.mdp.reward_func(s, a) + sum(planner.trans_dict[s][a][s_prime] * values[planner.state_index[s_prime]]
+                                                                 for s_prime in planner.trans_dict[s][a])
+            assert abs(q_vals[j] - expected_q_val) < 1e-9, (s, a)
+            assert abs(planner._qvalue(i, j, values) - expected_q_val) < 1e-9, (s, a)
+
+def test_pick_next_state_samples():
+    random.seed(0)
+    successors, gaps = np.array([4, 7, 9]), np.array([0.1, 0.0, 0.3])
+    counts = Counter(BoundedRTDP._pick_next_state(successors, gaps, gaps.sum()) for _ in range(4000))
+    assert set(counts) == {4, 9}
+    assert abs(counts[4] / 4000. - 0.25) < 0.03
+
+def test_trial_trace():
+    random.seed(0)
+    planner = make_planner()
+    policy = planner.plan()
+    trace = planner.trial_traces[-1]
+    assert len(planner.trial_traces) == 1 and len(trace) > 0
+    assert trace[0].state == planner.mdp.get_init_state() and trace[0].expected_gap is not None
+    for backup in trace:
+        i = planner.state_index[backup.state]
+        assert planner.lower_bounds[i] <= planner.upper_bounds[i] + 1e-9
+    # The way back is backed up too
+    assert trace[-1].state == planner.mdp.get_init_state() and trace[-1].action is None
+    assert planner.lower_values[trace[-1].state] == trace[-1].lower
+    assert all(a in planner.actions for a in policy.values())
+
+def test_bounds_after_plan():
+    random.seed(0)
+    planner = make_planner()
+    lower_values, upper_values = planner.lower_values, planner.upper_values
+    init_lower_values = dict(planner.lower_values_init)
+    planner.plan()
+    init_state = planner.mdp.get_init_state()
+
+    # Mappings taken before plan() see its backups
+    assert lower_values[init_state] == planner.lower_bounds[planner.state_index[init_state]]
+    assert lower_values[init_state] > init_lower_values[init_state]
+    for s in planner.states:
+        i = planner.state_index[s]
+        assert lower_values[s] == planner.lower_bounds[i] and upper_values[s] == planner.upper_bounds[i]
+        # So do the dicts the planner was given
+        assert planner.lower_values_init[s] == lower_values[s] and planner.upper_values_init[s] == upper_values[s]
+    assert len(lower_values) == len(planner.states) and set(upper_values) == set(planner.states)
+
+    upper_values[init_state] = 0.
+    assert planner.upper_bounds[planner.state_index[init_state]] == 0.
+
+def main():
+    tests = [test_backups_match_trans_dict, test_pick_next_state_samples, test_trial_trace, test_bounds_after_plan]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+'''
+checkpoint_test.py: Checks that SkillChaining runs resumed from a checkpoint continue the uninterrupted run.
+
+Usage:
+    python checkpoint_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+import torch
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from evaluation_worker_test import PlaneMDP
+from simple_rl.agents.func_approx.dsc.OptionClass import Option
+from simple_rl.agents.func_approx.dsc.SkillChainingAgentClass import SkillChaining
+from simple_rl.agents.func_approx.ddpg.replay_buffer import ReplayBuffer
+from simple_rl.agents.func_approx.dqn.DQNAgentClass import ReplayBuffer as DQNReplayBuffer
+
+NUM_STEPS = 30
+
+class GoalPlaneMDP(PlaneMDP):
+    ''' PlaneMDP with the rest of what SkillChaining asks of its domain. '''
+    goal_position = np.array([1., 0.])
+
+    def batched_is_goal_state(self, states):
+        return np.array([self.is_goal_state(state) for state in states])
+
+    def distance_to_goal(self, position):
+        return max(0., 1. - position[0])
+
+    @staticmethod
+    def is_primitive_action(action):
+        return np.all(np.abs(action) <= 1.)
+
+def make_agent(log_dir, seed=0, **kwargs):
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    args = argparse.Namespace(experiment_name="checkpoint", pretrained=False, seed=seed)
+    return SkillChaining(GoalPlaneMDP(seed=seed), NUM_STEPS, lr_actor=1e-4, lr_critic=1e-3, lr_dqn=1e-4, ddpg_batch_size=16,
+                         device=torch.device("cpu"), log_dir=log_dir, seed=seed, experiment_name="checkpoint", args=args,
+                         eval_every=0, **kwargs)
+
+def run_and_resume(log_dir, num_episodes, resumed_episodes):
+    ''' Trains for @num_episodes with a checkpoint at the end, then returns that agent and one resumed from it. '''
+    agent = make_agent(log_dir, checkpoint_every=num_episodes)
+    agent.skill_chaining(num_episodes, NUM_STEPS)
+    # A new process: the generators are seeded again and the agent is built from scratch
+    resumed_agent = make_agent(log_dir, checkpoint_every=num_episodes, resume=True)
+    scores = resumed_agent.skill_chaining(resumed_episodes, NUM_STEPS)
+    return agent, resumed_agent, scores
+
+def test_resumed_run_matches():
+    log_dir = tempfile.mkdtemp()
+    try:
+        uninterrupted_dir, interrupted_dir = os.path.join(log_dir, "uninterrupted"), os.path.join(log_dir, "interrupted")
+        os.makedirs(uninterrupted_dir)
+        os.makedirs(interrupted_dir)
+        uninterrupted_agent = make_agent(uninterrupted_dir)
+        expected = uninterrupted_agent.skill_chaining(6, NUM_STEPS)
+
+        _, resumed_agent, scores = run_and_resume(interrupted_dir, 4, 6)
+        assert scores == expected
+        # The goal option is trained before the checkpoint, and its classifiers are not stored again after it
+        assert [option.name for option in resumed_agent.trained_options] == ["global_option", "option_1"]
+        assert len(resumed_agent.classifier_store) == len(uninterrupted_agent.classifier_store)
+    finally:
+        shutil.rmtree(log_dir)
+
+def test_trained_option_round_trip():
+    log_dir = tempfile.mkdtemp()
+    try:
+        # Resumed for no episode, so the resumed agent is the checkpointed one
+        agent, resumed_agent, _ = run_and_resume(log_dir, 4, 4)
+        goal_option, resumed_goal_option = agent.trained_options[-1], resumed_agent.trained_options[-1]
+        assert goal_option.name == resumed_goal_option.name == "option_1" and goal_option.get_training_phase() != "gestation"
+
+        positions = np.random.RandomState(0).uniform(-1.5, 1.5, size=(50, 2))
+        classifiers = [(getattr(goal_option, name), getattr(resumed_goal_option, name)) for name in Option.CLASSIFIER_ATTRIBUTES]
+        assert all((classifier is None) == (resumed_classifier is None) for classifier, resumed_classifier in classifiers)
+        classifiers = [(classifier, resumed_classifier) for classifier, resumed_classifier in classifiers if classifier is not None]
+        assert len(classifiers) > 0
+        for classifier, resumed_classifier in classifiers:
+            assert np.array_equal(classifier.decision_function(positions), resumed_classifier.decision_function(positions))
+            assert resumed_agent.classifier_store.get_version(resumed_classifier) == agent.classifier_store.get_version(classifier)
+
+        # The child being learned is relinked to the restored parent, not to a copy of it
+        assert resumed_agent.untrained_option.name == agent.untrained_option.name == "option_2"
+        assert resumed_agent.untrained_option.parent is resumed_goal_option
+        assert resumed_goal_option.parent is None
+    finally:
+        shutil.rmtree(log_dir)
+
+def assert_same_columns(buffer, restored_buffer):
+    columns, restored_columns = buffer.columns(), restored_buffer.columns()
+    assert sorted(columns) == sorted(restored_columns)
+    for name, column in columns.items():
+        assert column.dtype == restored_columns[name].dtype and np.array_equal(column, restored_columns[name]), name
+
+def test_replay_buffer_round_trip():
+    rng = np.random.RandomState(0)
+    buffer, restored_buffer = ReplayBuffer(buffer_size=8), ReplayBuffer(buffer_size=8)
+    dqn_buffer, restored_dqn_buffer = [DQNReplayBuffer(2, 8, 4, 0, torch.device("cpu")) for _ in range(2)]
+    # Nothing added yet, then more transitions than the buffers hold
+    for num_added in [0, 12]:
+        for _ in range(num_added):
+            state, next_state = rng.normal(size=6), rng.normal(size=6)
+            buffer.add(state, rng.uniform(-1., 1., size=2), float(rng.normal()), next_state, bool(rng.randint(2)))
+            dqn_buffer.add(state, rng.randint(2), float(rng.normal()), next_state, bool(rng.randint(2)), rng.randint(1, 5))
+        if num_added > 0:
+            dqn_buffer.sample()
+
+        restored_buffer.load_state_dict(buffer.state_dict())
+        restored_dqn_buffer.load_state_dict(dqn_buffer.state_dict())
+        assert len(restored_buffer) == len(buffer) and len(restored_dqn_buffer) == len(dqn_buffer)
+        assert restored_dqn_buffer.positive_transitions == dqn_buffer.positive_transitions
+        assert_same_columns(buffer, restored_buffer)
+        assert_same_columns(dqn_buffer, restored_dqn_buffer)
+
+def main():
+    tests = [test_resumed_run_matches, test_trained_option_round_trip, test_replay_buffer_round_trip]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+'''
+classifier_store_test.py: Checks ClassifierSnapshot predictions against sklearn and ClassifierStore versioning.
+
+Usage:
+    python classifier_store_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import sys
+import numpy as np
+from sklearn import svm
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.agents.func_approx.dsc.ClassifierStoreClass import ClassifierSnapshot, ClassifierStore
+
+def make_classifiers():
+    rng = np.random.RandomState(0)
+    positions = rng.uniform(-1., 1., size=(200, 2))
+    labels = (np.linalg.norm(positions, axis=1) < 0.6).astype(int)
+    return [svm.SVC(gamma="scale", class_weight="balanced").fit(positions, labels),
+            svm.SVC(gamma=3.).fit(positions, 2 * labels - 1),
+            svm.OneClassSVM(nu=0.1, gamma="scale").fit(positions[labels == 1]),
+            svm.OneClassSVM(nu=0.3, gamma=2.).fit(positions)]
+
+def test_snapshot_matches_sklearn():
+    # More points than a kernel block, so several blocks are used
+    X = np.random.RandomState(1).uniform(-1.5, 1.5, size=(ClassifierSnapshot.CHUNK_SIZE + 500, 2))
+    for clf in make_classifiers():
+        assert ClassifierSnapshot.supports(clf)
+        snapshot = ClassifierSnapshot(clf)
+        expected_decisions = clf.decision_function(X)
+        decisions = snapshot.decision_function(X)
+        assert np.abs(decisions - expected_decisions).max() < 1e-4, type(clf).__name__
+
+        # Predictions only differ where float32 parameters can flip the sign
+        mismatches = snapshot.predict(X) != clf.predict(X)
+        assert np.all(np.abs(expected_decisions[mismatches]) < 1e-4), type(clf).__name__
+        assert snapshot.predict(X[0]).shape == (1,)
+
+def test_store_versions_by_identity():
+    clfs = make_classifiers()
+    store = ClassifierStore()
+    assert store.add(None) is None
+    versions = [store.add(clf) for clf in clfs]
+    assert versions == [0, 1, 2, 3]
+
+    # Unchanged classifiers keep their version, a refit (a new object) gets a new one, even if equal
+    assert [store.add(clf) for clf in clfs] == versions and len(store) == 4
+    refit = svm.OneClassSVM(nu=0.1, gamma="scale").fit(clfs[2].support_vectors_)
+    assert store.add(refit) == 4 and store.snapshots_since(4) == {4 : store.snapshots[4]}
+
+    # Classifiers a snapshot can not reduce are stored as they are
+    linear = svm.SVC(kernel="linear").fit([[0., 0.], [1., 1.]], [0, 1])
+    assert not ClassifierSnapshot.supports(linear)
+    assert store.snapshots[store.add(linear)] is linear
+
+def main():
+    tests = [test_snapshot_matches_sklearn, test_store_versions_by_identity]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+'''
+evaluation_worker_test.py: Checks that background evaluations of frozen options match inline ones.
+
+Usage:
+    python evaluation_worker_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import functools
+import os
+import sys
+from copy import deepcopy
+import numpy as np
+import torch
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.mdp.MDPClass import MDP
+from simple_rl.mdp.StateClass import State
+from simple_rl.agents.func_approx.dsc.OptionClass import Option
+from simple_rl.agents.func_approx.dsc.EvaluationWorkerClass import EvaluationWorker, run_evaluation_episode
+from simple_rl.agents.func_approx.dqn.DQNAgentClass import DQNAgent
+
+class PlaneState(State):
+    def __init__(self, position, is_terminal):
+        self.position = position
+        State.__init__(self, data=np.concatenate([position, np.zeros(4)]), is_terminal=is_terminal)
+
+class PlaneMDP(MDP):
+    ''' Point moved by its actions from a random start, until it reaches x >= 1. '''
+    def __init__(self, seed=0):
+        self.env_name = "plane"
+        self.seed = seed
+        self.render = False
+        self.dense_reward = False
+        self.reset()
+        MDP.__init__(self, [1, 2], None, None, self.init_state)
+
+    def execute_agent_action(self, action, option_idx=None):
+        position = self.cur_state.position + 0.2 * np.asarray(action)
+        self.cur_state = PlaneState(position, self.is_goal_state(position))
+        return (0. if self.cur_state.is_terminal() else -1.), self.cur_state
+
+    def is_goal_state(self, state):
+        position = state.position if isinstance(state, State) else state[:2]
+        return position[0] >= 1.
+
+    def reset(self):
+        self.init_state = PlaneState(np.random.uniform(-1., 1., size=2), False)
+        self.cur_state = deepcopy(self.init_state)
+
+    @staticmethod
+    def state_space_size():
+        return 6
+
+    @staticmethod
+    def action_space_size():
+        return 2
+
+def make_agent(mdp):
+    from sklearn import svm
+    kwargs = dict(overall_mdp=mdp, global_solver=None, lr_actor=1e-4, lr_critic=1e-3, lr_dqn=None, ddpg_batch_size=64, max_steps=40)
+    global_option = Option(name="global_option", **kwargs)
+    goal_option = Option(name="option_1", option_idx=1, **kwargs)
+
+    # A trained goal option that can be started right of x = 0
+    positions = np.random.RandomState(0).uniform([0., -1.], [1., 1.], size=(100, 2))
+    goal_option.optimistic_classifier = svm.OneClassSVM(nu=0.1, gamma="scale").fit(positions)
+    goal_option.pessimistic_classifier = svm.OneClassSVM(nu=0.3, gamma="scale").fit(positions)
+    goal_option.num_goal_hits = 10
+
+    trained_options = [global_option, goal_option]
+    agent_over_options = DQNAgent(6, 2, trained_options, seed=0, device=torch.device("cpu"), name="GlobalDQN")
+    return trained_options, agent_over_options
+
+def perturb(trained_options, agent_over_options):
+    for network in [option.solver.actor for option in trained_options] + [agent_over_options.policy_network]:
+        for param in network.parameters():
+            param.data.add_(1.)
+
+def test_matches_inline_and_is_frozen():
+    mdp = PlaneMDP()
+    trained_options, agent_over_options = make_agent(mdp)
+    expected = [run_evaluation_episode(mdp, trained_options, agent_over_options, 40, seed=seed)[:2] for seed in (5, 6, 7)]
+    # Several start states, so several outcomes
+    assert len(set(expected)) > 1
+
+    worker = EvaluationWorker(functools.partial(PlaneMDP, seed=1), 40, num_workers=2, num_episodes=3, seed=5)
+    try:
+        worker.submit(10, trained_options, agent_over_options)
+        # Training carries on and changes the options, the evaluation keeps the submitted ones
+        perturb(trained_options, agent_over_options)
+        worker.submit(20, trained_options, agent_over_options)
+        perturbed = [run_evaluation_episode(mdp, trained_options, agent_over_options, 40, seed=seed)[:2] for seed in (5, 6, 7)]
+
+        results = worker.poll(wait=True)
+        assert [episode for episode, _, _ in results] == [10, 20]
+        assert list(zip(*results[0][1:])) == expected
+        assert list(zip(*results[1][1:])) == perturbed
+    finally:
+        worker.close()
+
+def test_pending_limit():
+    mdp = PlaneMDP()
+    trained_options, agent_over_options = make_agent(mdp)
+    worker = EvaluationWorker(functools.partial(PlaneMDP, seed=1), 40, num_workers=1, num_episodes=2, max_pending=1)
+    try:
+        # The evaluator is still starting up, so nothing is done yet and the second evaluation is dropped
+        worker.submit(1, trained_options, agent_over_options)
+        worker.submit(2, trained_options, agent_over_options)
+        assert worker.poll() == [] and worker.num_dropped == 1
+    finally:
+        results = worker.close()
+    assert [(episode, len(scores)) for episode, scores, _ in results] == [(1, 2)]
+
+def test_dead_evaluator():
+    mdp = PlaneMDP()
+    trained_options, agent_over_options = make_agent(mdp)
+    worker = EvaluationWorker(functools.partial(PlaneMDP, seed=1), 40, num_workers=1)
+    try:
+        worker.submit(1, trained_options, agent_over_options)
+        assert len(worker.poll(wait=True)) == 1
+        for process in list(worker.pool._processes.values()):
+            process.terminate()
+            process.join()
+
+        # Neither submitting nor waiting hangs, the evaluation is counted as failed
+        worker.submit(2, trained_options, agent_over_options)
+        assert worker.poll(wait=True) == []
+        assert worker.num_failed == 1
+    finally:
+        worker.close()
+
+def main():
+    tests = [test_matches_inline_and_is_frozen, test_pending_limit, test_dead_evaluator]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
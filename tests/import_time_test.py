@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+'''
+import_time_test.py: Guards the import time of the simple_rl packages.
+
+Each case is imported in fresh interpreters (nothing cached in sys.modules).
+A case fails if its median import time exceeds its budget, or if it loads a
+module it should not need (eg. matplotlib or gym for a grid world).
+
+Usage:
+    python import_time_test.py [num_repeats]
+'''
+
+# Python imports.
+from __future__ import print_function
+import json
+import os
+import subprocess
+import sys
+
+# (import statement, budget in seconds, modules that must not be loaded)
+CASES = [
+    ("import simple_rl", 0.1, ["numpy", "simple_rl.tasks", "simple_rl.agents", "simple_rl.planning", "matplotlib"]),
+    ("from simple_rl.tasks import GridWorldMDP", 0.5, ["matplotlib", "gym", "torch", "simple_rl.tasks.gather", "simple_rl.agents"]),
+    ("from simple_rl.agents import QLearningAgent, RandomAgent", 0.5, ["matplotlib", "torch", "simple_rl.tasks", "simple_rl.agents.func_approx.LinearQAgentClass"]),
+    ("from simple_rl.planning import ValueIteration", 0.5, ["matplotlib", "simple_rl.tasks", "simple_rl.planning.MCTSClass"]),
+]
+
+MEASURE = '''
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+'''
+
+def measure(statement, parent_dir):
+    '''
+    Args:
+        statement (str): Import statement, run in a fresh interpreter.
+        parent_dir (str): Directory containing the simple_rl package.
+
+    Returns:
+        (tuple): (seconds spent importing, list of loaded module names)
+    '''
+    env = dict(os.environ, PYTHONPATH=parent_dir)
+    output = subprocess.check_output([sys.executable, "-c", MEASURE.format(statement=statement)], env=env, cwd=parent_dir)
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    return result["elapsed"], result["modules"]
+
+def main():
+    num_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    parent_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+    print("\n" + "="*32)
+    print("== Running", len(CASES), "import time tests ==")
+    print("="*32 + "\n")
+    total_passed = 0
+
+    for i, (statement, budget, forbidden) in enumerate(CASES):
+        print("\t [Test", str(i + 1) + "] ", statement + ": ",)
+
+        # The first run also warms the bytecode cache, so only the later ones are timed.
+        _, modules = measure(statement, parent_dir)
+        times = sorted(measure(statement, parent_dir)[0] for _ in range(num_repeats))
+        median = times[len(times) // 2]
+        loaded = [name for name in forbidden if name in modules]
+
+        if median <= budget and len(loaded) == 0:
+            total_passed += 1
+            print("\t\tPASS ({:.3f}s, budget {:.2f}s).".format(median, budget))
+        else:
+            print("\t\tFAIL ({:.3f}s, budget {:.2f}s{}).".format(median, budget, ", loaded " + ", ".join(loaded) if loaded else ""))
+
+    print("\nResults:", total_passed, "/", len(CASES), "passed.")
+    return total_passed == len(CASES)
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+'''
+linear_q_test.py: Checks LinearQAgent's weight matrix updates against the flat state-action feature formulation.
+
+Usage:
+    python linear_q_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import math
+import os
+import random
+import sys
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.mdp import State
+from simple_rl.tasks import GridWorldMDP
+from simple_rl.agents.func_approx.LinearQAgentClass import LinearQAgent
+
+def random_states(num_states, num_features, seed=0):
+    rng = np.random.RandomState(seed)
+    return [State(data=rng.normal(size=num_features)) for _ in range(num_states)]
+
+def test_matches_flat_features():
+    np.random.seed(0)
+    actions = ["a", "b", "c"]
+    for rbf in [False, True]:
+        agent = LinearQAgent(actions, num_features=4, rbf=rbf, anneal=False)
+        s, s_prime = random_states(2, 4)
+        feats = [math.exp(-f ** 2) for f in s.features()] if rbf else list(s.features())
+
+        # Q(s, a) = w . phi(s, a), with phi(s, a) the features of s in the block of a
+        flat_weights = agent.weights.ravel().copy()
+        for j, a in enumerate(actions):
+            phi = agent._phi(s, a)
+            assert np.allclose(phi[j * 4:(j + 1) * 4], feats) and np.count_nonzero(phi[:j * 4]) == 0
+            assert abs(agent.get_q_value(s, a) - flat_weights.dot(phi)) < 1e-12
+        assert np.allclose(agent.get_q_values(s), [flat_weights.dot(agent._phi(s, a)) for a in actions])
+
+        # w <-- w + alpha * delta * phi(s, a)
+        delta = 0.7 + agent.gamma * max(flat_weights.dot(agent._phi(s_prime, a)) for a in actions) - flat_weights.dot(agent._phi(s, "b"))
+        expected_weights = flat_weights + agent.alpha * delta * agent._phi(s, "b")
+        agent.update(s, "b", 0.7, s_prime)
+        assert abs(agent.most_recent_loss - delta) < 1e-12
+        assert np.allclose(agent.weights.ravel(), expected_weights)
+
+def test_replay_of_one_is_online():
+    np.random.seed(0)
+    states = random_states(20, 5, seed=1)
+    agent = LinearQAgent(["a", "b"], num_features=5, anneal=False)
+    replay_agent = LinearQAgent(["a", "b"], num_features=5, anneal=False, replay_size=1, batch_size=1)
+    replay_agent.weights = agent.weights.copy()
+    for s, s_prime in zip(states, states[1:]):
+        action = random.choice(["a", "b"])
+        agent.update(s, action, 1.0, s_prime)
+        replay_agent.update(s, action, 1.0, s_prime)
+    assert np.allclose(agent.weights, replay_agent.weights)
+
+def test_replay_batches():
+    np.random.seed(0)
+    states = random_states(50, 3, seed=2)
+    agent = LinearQAgent(["a", "b"], num_features=3, anneal=False, replay_size=16, batch_size=8)
+    weights = agent.weights.copy()
+    for i, (s, s_prime) in enumerate(zip(states, states[1:])):
+        agent.update(s, "a", 0.0, s_prime)
+        # Nothing is learned until a batch is stored, and the buffer wraps around
+        assert np.array_equal(agent.weights, weights) == (i < 7)
+    assert agent.num_transitions == 49 and np.array_equal(agent.replay_features[0], states[48].features())
+    agent.reset()
+    assert agent.num_transitions == 0 and not agent.weights.any()
+
+def test_acts_on_grid():
+    np.random.seed(0)
+    random.seed(0)
+    mdp = GridWorldMDP(5, 5, goal_locs=[(5, 5)])
+    for agent in [LinearQAgent(mdp.get_actions(), num_features=2, alpha=0.01),
+                  LinearQAgent(mdp.get_actions(), num_features=2, alpha=0.01, rbf=True, explore="softmax", replay_size=100)]:
+        for episode in range(3):
+            mdp.reset()
+            state, reward = mdp.get_init_state(), 0
+            for step in range(50):
+                reward, state = mdp.execute_agent_action(agent.act(state, reward))
+            agent.end_of_episode()
+        assert np.all(np.isfinite(agent.weights))
+        assert abs(sum(agent.get_action_distr(state)) - 1) < 1e-9
+
+def main():
+    tests = [test_matches_flat_features, test_replay_of_one_is_online, test_replay_batches, test_acts_on_grid]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
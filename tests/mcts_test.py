@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+'''
+mcts_test.py: Checks the UCT search of MCTS, its node table, budgets and root parallel search.
+
+Usage:
+    python mcts_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import random
+import sys
+import time
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.tasks import GridWorldMDP, TaxiOOMDP
+from simple_rl.planning.MCTSClass import MCTS
+
+def seed(value):
+    random.seed(value)
+    np.random.seed(value)
+
+def test_plan_reaches_goal():
+    seed(0)
+    mdp = GridWorldMDP(5, 5, goal_locs=[(5, 5)], slip_prob=0.0)
+    mcts = MCTS(mdp, num_iterations=200, initial_capacity=4)
+    action_seq, state_seq = mcts.plan(mdp.get_init_state(), horizon=20)
+    assert state_seq[-1].is_terminal() and len(action_seq) < 20
+
+    # The table grew past its initial capacity and is consistent
+    num_nodes = len(mcts.node_keys)
+    assert num_nodes > 4 and len(mcts.visits) >= num_nodes
+    assert all(mcts.node_index[key] == i for i, key in enumerate(mcts.node_keys))
+    assert (mcts.children[:num_nodes] < num_nodes).all()
+    assert (mcts.children[num_nodes:] == -1).all() and (mcts.action_visits[num_nodes:] == 0).all()
+    assert (mcts.visits[:num_nodes] == mcts.action_visits[:num_nodes].sum(axis=1)).all()
+
+def test_taxi_pickup():
+    seed(1)
+    taxi_passengers = [{"x":2, "y":1, "dest_x":2, "dest_y":2, "in_taxi":0}]
+    mdp = TaxiOOMDP(3, 3, agent={"x":1, "y":1, "has_passenger":0}, walls=[], passengers=taxi_passengers)
+    mcts = MCTS(mdp, num_iterations=1000)
+    action_visits, value_sums = mcts.search(mdp.get_init_state())
+    assert action_visits.sum() == 1000
+    # Moving right, onto the passenger, is the best start
+    assert mcts.actions[int(np.argmax(action_visits))] == "right"
+
+def test_time_budget():
+    mdp = GridWorldMDP(10, 10, goal_locs=[(10, 10)], slip_prob=0.1)
+    mcts = MCTS(mdp, time_budget=0.2, num_iterations=1)
+    start = time.time()
+    action_visits, _ = mcts.search(mdp.get_init_state())
+    assert 0.2 <= time.time() - start < 1. and action_visits.sum() > 1
+
+def test_root_parallel():
+    seed(0)
+    mdp = GridWorldMDP(5, 5, goal_locs=[(5, 5)], slip_prob=0.0)
+    mcts = MCTS(mdp, num_iterations=100, num_workers=2)
+    try:
+        action_visits, value_sums = mcts.search(mdp.get_init_state())
+        # Each worker ran its own iterations from the root
+        assert action_visits.sum() == 2 * 100
+        root = mcts.node_index[(mdp.get_init_state(), 0)]
+        assert np.array_equal(mcts.action_visits[root], action_visits) and np.allclose(mcts.value_sums[root], value_sums)
+        assert mcts.policy(mdp.get_init_state()) in ["up", "right"]
+    finally:
+        mcts.close()
+
+def main():
+    tests = [test_plan_reaches_goal, test_taxi_pickup, test_time_budget, test_root_parallel]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+'''
+mesh_prediction_cache_test.py: Checks MeshPredictionCache against direct classifier predictions.
+
+Usage:
+    python mesh_prediction_cache_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+from sklearn import svm
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.agents.func_approx.dsc.ClassifierStoreClass import ClassifierStore
+from simple_rl.agents.func_approx.dsc.MeshPredictionCacheClass import MeshPredictionCache
+
+def make_classifiers():
+    rng = np.random.RandomState(0)
+    X = rng.uniform(-2., 11., size=(300, 2))
+    y = (X[:, 0] + X[:, 1] > 9.).astype(int)
+    return svm.SVC(gamma="scale").fit(X, y), svm.OneClassSVM(gamma="scale", nu=0.2).fit(X[y == 1])
+
+def make_mesh(h=0.1):
+    return np.meshgrid(np.arange(-2., 11., h), np.arange(-2., 11., h))
+
+def expected_mask(clf, x_mesh, y_mesh):
+    return (clf.predict(np.c_[x_mesh.ravel(), y_mesh.ravel()]) > 0).reshape(x_mesh.shape)
+
+def test_versioned_masks():
+    svc, ocsvm = make_classifiers()
+    store = ClassifierStore()
+    versions = {"initiation" : store.add(svc), "pessimistic" : store.add(ocsvm)}
+    x_mesh, y_mesh = make_mesh()
+    cache = MeshPredictionCache(store.snapshots)
+
+    for _ in range(3):
+        masks = cache.get_masks(versions, x_mesh, y_mesh)
+        for clf_name, version in versions.items():
+            assert masks[clf_name].dtype == bool and masks[clf_name].shape == x_mesh.shape
+            assert np.array_equal(masks[clf_name], expected_mask(store.snapshots[version], x_mesh, y_mesh))
+
+    assert (cache.num_misses, cache.num_hits, len(cache)) == (2, 4, 2)
+
+    # Another mesh is another entry
+    cache.get_mask(versions["initiation"], *make_mesh(h=0.5))
+    assert (cache.num_misses, len(cache)) == (3, 3)
+
+def test_unversioned_masks():
+    svc, ocsvm = make_classifiers()
+    x_mesh, y_mesh = make_mesh()
+    cache = MeshPredictionCache()
+
+    for _ in range(2):
+        for clf in (svc, ocsvm):
+            assert np.array_equal(cache.get_mask(clf, x_mesh, y_mesh), expected_mask(clf, x_mesh, y_mesh))
+
+    # Memoized per object, never saved
+    assert (cache.num_misses, cache.num_hits, len(cache)) == (2, 2, 0)
+
+def test_save_load_round_trip():
+    svc, ocsvm = make_classifiers()
+    store = ClassifierStore()
+    v_svc, v_ocsvm = store.add(svc), store.add(ocsvm)
+    x_mesh, y_mesh = make_mesh()
+    data_dir = tempfile.mkdtemp()
+    try:
+        # Nothing to save yet, no file is written
+        MeshPredictionCache(store.snapshots).save(data_dir)
+        assert not os.path.exists(os.path.join(data_dir, MeshPredictionCache.FILE_NAME))
+
+        first = MeshPredictionCache(store.snapshots)
+        first.get_mask(v_svc, x_mesh, y_mesh)
+        first.save(data_dir)
+
+        # A second writer keeps the masks already on disk
+        second = MeshPredictionCache(store.snapshots)
+        second.get_mask(v_ocsvm, x_mesh, y_mesh)
+        second.save(data_dir)
+
+        loaded = MeshPredictionCache(store.snapshots).load(data_dir)
+        assert len(loaded) == 2
+        for version in (v_svc, v_ocsvm):
+            assert np.array_equal(loaded.get_mask(version, x_mesh, y_mesh), expected_mask(store.snapshots[version], x_mesh, y_mesh))
+        assert (loaded.num_misses, loaded.num_hits) == (0, 2)
+    finally:
+        shutil.rmtree(data_dir)
+
+def main():
+    tests = [test_versioned_masks, test_unversioned_masks, test_save_load_round_trip]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
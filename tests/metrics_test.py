@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+'''
+metrics_test.py: Checks the sampling, reductions and flushing of MetricsWriter and its CSVBackend.
+
+Usage:
+    python metrics_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.utils.metrics import MetricsWriter, CSVBackend, GRADIENT_NORM_SAMPLE_RATES
+
+class ListBackend(object):
+    def __init__(self):
+        self.rows = []
+        self.num_flushes = 0
+
+    def add_scalar(self, tag, value, step):
+        self.rows.append((tag, value, step))
+
+    def flush(self):
+        self.num_flushes += 1
+
+def read_csv(path):
+    with open(path) as f:
+        return list(csv.reader(f))
+
+def test_sampling_skips_lazy_values():
+    backend = ListBackend()
+    writer = MetricsWriter(backend, flush_secs=0, sample_rates=GRADIENT_NORM_SAMPLE_RATES)
+    evaluated = []
+    for step in range(25):
+        assert writer.should_sample("critic_grad_norm") == (step % 10 == 0)
+        writer.add_scalar("critic_grad_norm", lambda step=step: evaluated.append(step) or float(step), step)
+        writer.add_scalar("loss", float(step), step)
+
+    # Only every 10th gradient norm is ever computed
+    assert evaluated == [0, 10, 20]
+    writer.flush()
+    assert sorted(backend.rows) == [("critic_grad_norm", 10., 20), ("loss", 12., 24)]
+    assert backend.num_flushes == 1
+
+def test_reductions():
+    backend = ListBackend()
+    writer = MetricsWriter(backend, flush_secs=0, reductions={"score": ["min", "max", "last"]}, default_reduction="mean")
+    for step, value in enumerate([3., 1., 4., 1., 5.]):
+        writer.add_scalar("score", value, step)
+        writer.add_scalar("other", value, step)
+    writer.flush()
+    assert sorted(backend.rows) == [("other", 2.8, 4), ("score/last", 5., 4), ("score/max", 5., 4), ("score/min", 1., 4)]
+
+    # Windows are emptied by a flush
+    writer.flush()
+    assert len(backend.rows) == 4
+
+def test_csv_backend_and_close():
+    log_dir = tempfile.mkdtemp()
+    try:
+        writer = MetricsWriter(CSVBackend(os.path.join(log_dir, "logs")), flush_secs=0.05)
+        writer.add_scalar("a", 1., 0)
+        time.sleep(0.5)
+        # Written by the background thread
+        assert read_csv(os.path.join(log_dir, "logs", "metrics.csv")) == [["tag", "step", "value"], ["a", "0", "1.0"]]
+
+        # close() writes what is still buffered
+        writer.add_scalar("a", 2., 1)
+        writer.close()
+        assert not writer._thread.is_alive()
+        rows = read_csv(os.path.join(log_dir, "logs", "metrics.csv"))
+        assert rows[-1] == ["a", "1", "2.0"]
+
+        # Reopening appends without a second header
+        backend = CSVBackend(os.path.join(log_dir, "logs"))
+        backend.add_scalar("b", 3., 2)
+        backend.close()
+        assert read_csv(os.path.join(log_dir, "logs", "metrics.csv"))[1:] == [["a", "0", "1.0"], ["a", "1", "2.0"], ["b", "2", "3.0"]]
+    finally:
+        shutil.rmtree(log_dir)
+
+def test_gradient_norm():
+    import torch
+    from simple_rl.agents.func_approx.ddpg.utils import gradient_norm, compute_gradient_norm
+    model = torch.nn.Linear(3, 2)
+    assert float(gradient_norm(model)) == 0.
+    model(torch.ones(4, 3)).sum().backward()
+    assert abs(float(gradient_norm(model)) - compute_gradient_norm(model)) < 1e-5
+    assert float(gradient_norm(torch.nn.Sequential())) == 0.
+
+def main():
+    tests = [test_sampling_skips_lazy_values, test_reductions, test_csv_backend_and_close, test_gradient_norm]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
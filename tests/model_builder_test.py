@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+'''
+model_builder_test.py: Checks that parallel and cached ModelBuilder models match the serial one.
+
+Usage:
+    python model_builder_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.tasks import TaxiOOMDP, HanoiMDP, GridWorldMDP
+from simple_rl.planning.ModelBuilderClass import ModelBuilder
+from simple_rl.planning.ValueIterationClass import ValueIteration
+
+def make_taxi():
+    taxi_passengers = [{"x":4, "y":3, "dest_x":2, "dest_y":2, "in_taxi":0}]
+    return TaxiOOMDP(4, 4, agent={"x":1, "y":1, "has_passenger":0}, walls=[], passengers=taxi_passengers, slip_prob=0.1)
+
+def assert_same_model(model, expected_model):
+    assert model.index_states == expected_model.index_states
+    assert np.array_equal(model.rewards, expected_model.rewards)
+    for j in range(len(expected_model.rows)):
+        assert np.array_equal(model.rows[j], expected_model.rows[j])
+        assert np.array_equal(model.cols[j], expected_model.cols[j])
+        assert np.allclose(model.probs[j], expected_model.probs[j])
+
+def test_parallel_matches_serial():
+    for mdp in [make_taxi(), HanoiMDP(num_pegs=3, num_discs=3)]:
+        expected_model = ModelBuilder(mdp).build()
+        model = ModelBuilder(mdp, num_workers=2, chunk_size=8).build()
+        assert_same_model(model, expected_model)
+
+        # Every (s, a) of every reachable state has a distribution
+        num_states = len(expected_model.index_states)
+        for j in range(len(expected_model.rows)):
+            assert np.allclose(np.bincount(expected_model.rows[j], weights=expected_model.probs[j], minlength=num_states), 1.)
+
+def test_sampled_counts():
+    # Hides the grid world's exact distribution, so its transitions are sampled
+    mdp = GridWorldMDP(6, 6, goal_locs=[(6, 6)], slip_prob=0.3)
+    mdp.transition_func = functools.partial(GridWorldMDP._transition_func, mdp)
+    assert not mdp.has_transition_distribution()
+    model = ModelBuilder(mdp, sample_rate=4, num_workers=2, chunk_size=64).build()
+    num_states = len(model.index_states)
+    for j in range(len(model.rows)):
+        assert np.allclose(np.bincount(model.rows[j], weights=model.probs[j], minlength=num_states), 1.)
+        # Repeated samples of an s' are counted into one entry
+        entries = set(zip(model.rows[j].tolist(), model.cols[j].tolist()))
+        assert len(entries) == len(model.rows[j])
+
+def test_cache():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        mdp = make_taxi()
+        expected_model = ModelBuilder(mdp, cache_dir=cache_dir).build()
+        assert len(os.listdir(cache_dir)) == 1
+
+        # A hit builds nothing, another MDP (or sample rate) misses
+        builder = ModelBuilder(make_taxi(), cache_dir=cache_dir)
+        builder._build = None
+        assert_same_model(builder.build(), expected_model)
+        ModelBuilder(make_taxi(), sample_rate=5, cache_dir=cache_dir).build()
+        other_mdp = make_taxi()
+        other_mdp.slip_prob = 0.2
+        ModelBuilder(other_mdp, cache_dir=cache_dir).build()
+        assert len(os.listdir(cache_dir)) == 3
+
+        # Planners built on the cached model find the same values
+        vi, expected_vi = ValueIteration(make_taxi(), cache_dir=cache_dir), ValueIteration(make_taxi())
+        vi.run_vi()
+        expected_vi.run_vi()
+        for s in expected_vi.get_states():
+            assert vi.get_value(s) == expected_vi.get_value(s)
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_uncacheable_mdp():
+    mdp = GridWorldMDP(4, 4, goal_locs=[(4, 4)])
+    mdp.callbacks = {"reset": lambda: None}
+    assert ModelBuilder(mdp, cache_dir=tempfile.gettempdir()).get_cache_file() is None
+
+def main():
+    tests = [test_parallel_matches_serial, test_sampled_counts, test_cache, test_uncacheable_mdp]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
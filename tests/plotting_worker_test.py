@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+'''
+plotting_worker_test.py: Checks that the episodic plotting worker never blocks training.
+
+Usage:
+    python plotting_worker_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.agents.func_approx.dsc.PlottingWorkerClass import PlottingWorker
+
+def make_worker(log_dir):
+    x_mesh, y_mesh = np.meshgrid(np.arange(-2., 11., 0.5), np.arange(-2., 11., 0.5))
+    return PlottingWorker(log_dir, x_mesh, y_mesh, "maze", goal=np.array([0., 8.]), start=np.array([0., 0.]))
+
+def test_close_after_worker_died():
+    log_dir = tempfile.mkdtemp()
+    try:
+        worker = make_worker(log_dir)
+        worker.process.terminate()
+        worker.process.join()
+
+        start = time.time()
+        for episode in range(5):
+            worker.submit({'episode' : episode, 'clfs' : [], 'snapshots' : {}, 'scores' : [0.] * (episode + 1)})
+        worker.close(timeout=30.)
+
+        assert time.time() - start < 3 * PlottingWorker.PUT_TIMEOUT + 5.
+        assert not worker.feeder.is_alive()
+        assert worker.num_submitted == 5 and worker.num_dropped == 5
+    finally:
+        shutil.rmtree(log_dir)
+
+def test_close_lets_worker_finish():
+    log_dir = tempfile.mkdtemp()
+    try:
+        worker = make_worker(log_dir)
+        # The log dir has no plots/ directory, plotting fails but the worker keeps going
+        worker.submit({'episode' : 0, 'clfs' : [], 'snapshots' : {}, 'scores' : [0.]})
+        worker.close(timeout=60.)
+        assert not worker.process.is_alive()
+    finally:
+        shutil.rmtree(log_dir)
+
+def main():
+    tests = [test_close_after_worker_died, test_close_lets_worker_finish]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
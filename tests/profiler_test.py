@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+'''
+profiler_test.py: Checks the accumulation and output of simple_rl.utils.profiler.
+
+Usage:
+    python profiler_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.utils.profiler import profiler, profiled
+
+class Solver(object):
+    def __init__(self, name):
+        self.name = name
+
+    @profiled("learn")
+    def learn(self, seconds):
+        time.sleep(seconds)
+        with profiler.phase("inner", self.name):
+            time.sleep(seconds)
+
+def run_episode(episode, solvers):
+    profiler.start_episode()
+    for solver in solvers:
+        solver.learn(0.01)
+        solver.learn(0.01)
+    with profiler.phase("env_step"):
+        time.sleep(0.01)
+    return profiler.end_episode(episode)
+
+def test_accumulation():
+    profiler.reset()
+    profiler.enable()
+    try:
+        rows = run_episode(0, [Solver("a"), Solver("b")])
+        by_key = dict(((row["phase"], row["owner"]), row) for row in rows)
+        assert sorted(by_key) == [("env_step", ""), ("inner", "a"), ("inner", "b"), ("learn", "a"), ("learn", "b")]
+        assert by_key[("learn", "a")]["calls"] == 2 and by_key[("inner", "a")]["calls"] == 2 and by_key[("env_step", "")]["calls"] == 1
+
+        # Inclusive: learn counts the time spent in its inner phase
+        assert by_key[("learn", "a")]["seconds"] >= by_key[("inner", "a")]["seconds"] + 0.015
+        assert rows[0]["seconds"] >= rows[-1]["seconds"] and all(row["episode_seconds"] >= row["seconds"] for row in rows)
+
+        # Totals restart with every episode
+        rows = run_episode(1, [Solver("a")])
+        assert [row["calls"] for row in rows if row["phase"] == "learn"] == [2]
+        assert len(profiler.history) == 5 + 3
+        assert "learn" in profiler.format_table(rows)
+    finally:
+        profiler.disable()
+        profiler.reset()
+
+def test_disabled_records_nothing():
+    profiler.reset()
+    Solver("a").learn(0.)
+    with profiler.phase("env_step"):
+        pass
+    assert profiler.end_episode(0) == [] and profiler.history == []
+
+def test_write_appends_new_rows():
+    out_dir = tempfile.mkdtemp()
+    profiler.reset()
+    profiler.enable()
+    try:
+        for episode in range(3):
+            run_episode(episode, [Solver("a")])
+            profiler.write(out_dir)
+
+        with open(os.path.join(out_dir, "profile.csv")) as f:
+            csv_rows = list(csv.DictReader(f))
+        with open(os.path.join(out_dir, "profile.jsonl")) as f:
+            json_rows = [json.loads(line) for line in f]
+        assert [int(row["episode"]) for row in csv_rows] == [row["episode"] for row in profiler.history] == [0] * 3 + [1] * 3 + [2] * 3
+        assert json_rows == profiler.history
+    finally:
+        profiler.disable()
+        profiler.reset()
+        shutil.rmtree(out_dir)
+
+def main():
+    tests = [test_accumulation, test_disabled_records_nothing, test_write_appends_new_rows]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+'''
+replay_storage_test.py: Checks TransitionStore (the replay buffers' storage) against a plain list of rows.
+
+Usage:
+    python replay_storage_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import pickle
+import sys
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.agents.func_approx.ddpg.replay_storage import RAMBudget, TransitionStore
+from simple_rl.agents.func_approx.ddpg.replay_buffer import ReplayBuffer
+
+FIELDS = [("state", (3,), np.float32), ("action", (), np.int64), ("value", (), np.float64), ("done", (), bool)]
+
+def make_row(i):
+    # int64/float64 values that float32 cannot hold exactly
+    return {"state": np.array([i, i + 0.5, -i], dtype=np.float32), "action": 2 ** 25 + i, "value": 1. + i * 1e-9, "done": i % 7 == 0}
+
+def check_rows(store, expected_indices):
+    columns = store.columns()
+    assert len(store) == len(expected_indices)
+    for name, _, _ in FIELDS:
+        expected = np.array([make_row(i)[name] for i in expected_indices])
+        assert columns[name].dtype == np.dtype(dict((f[0], f[2]) for f in FIELDS)[name])
+        assert np.array_equal(columns[name], expected), name
+
+def test_overflow_drops_oldest():
+    store = TransitionStore(FIELDS, capacity=3000, budget=RAMBudget())
+    for i in range(10000):
+        store.append(**make_row(i))
+    check_rows(store, range(7000, 10000))
+
+def test_full_store_appends_in_place():
+    store = TransitionStore(FIELDS, capacity=2048, budget=RAMBudget())
+    for i in range(2048):
+        store.append(**make_row(i))
+    arrays = dict(store.hot)
+    for i in range(2048, 6000):
+        store.append(**make_row(i))
+    # At capacity the hot window is a ring: no reallocation (or copy) per append
+    assert all(store.hot[name] is arrays[name] for name in arrays)
+    check_rows(store, range(6000 - 2048, 6000))
+
+def test_spill_keeps_dtypes():
+    budget = RAMBudget(limit_bytes=200 * TransitionStore(FIELDS, 1, budget=RAMBudget()).row_nbytes)
+    store = TransitionStore(FIELDS, capacity=5000, budget=budget)
+    for i in range(8000):
+        store.append(**make_row(i))
+    assert store.cold is not None and store.hot_size() <= 200
+    assert budget.used_bytes <= budget.limit_bytes
+    check_rows(store, range(3000, 8000))
+
+def test_sample():
+    np.random.seed(0)
+    budget = RAMBudget(limit_bytes=100 * TransitionStore(FIELDS, 1, budget=RAMBudget()).row_nbytes)
+    store = TransitionStore(FIELDS, capacity=1000, budget=budget)
+    for i in range(1500):
+        store.append(**make_row(i))
+
+    batch = store.sample(256)
+    indices = batch["action"] - 2 ** 25
+    assert len(indices) == 256 and indices.min() >= 500 and indices.max() < 1500
+    for name, _, _ in FIELDS:
+        assert np.array_equal(batch[name], np.array([make_row(i)[name] for i in indices]))
+
+    # Fewer transitions than the batch size: each one exactly once
+    small = TransitionStore(FIELDS, capacity=1000, budget=RAMBudget())
+    for i in range(10):
+        small.append(**make_row(i))
+    assert sorted(small.sample(32)["action"] - 2 ** 25) == list(range(10))
+
+def test_pickle_round_trip():
+    budget = RAMBudget(limit_bytes=50 * TransitionStore(FIELDS, 1, budget=RAMBudget()).row_nbytes)
+    store = TransitionStore(FIELDS, capacity=400, budget=budget)
+    for i in range(900):
+        store.append(**make_row(i))
+    restored = pickle.loads(pickle.dumps(store))
+    check_rows(restored, range(500, 900))
+    restored.append(**make_row(900))
+    check_rows(restored, range(501, 901))
+
+def test_replay_buffer_columns():
+    buffer = ReplayBuffer(buffer_size=100)
+    assert len(buffer.columns("state")["state"]) == 0
+    for i in range(150):
+        buffer.add(np.full(4, i, dtype=np.float32), np.zeros(2, dtype=np.float32), float(i), np.zeros(4, dtype=np.float32), False)
+    columns = buffer.columns("state", "reward")
+    assert sorted(columns) == ["reward", "state"]
+    assert np.array_equal(columns["state"][:, 0], np.arange(50, 150)) and np.array_equal(columns["reward"], np.arange(50, 150))
+    assert [row[2] for row in buffer.memory] == list(range(50, 150))
+
+def main():
+    tests = [test_overflow_drops_oldest, test_full_store_appends_in_place, test_spill_keeps_dtypes, test_sample,
+             test_pickle_round_trip, test_replay_buffer_columns]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+'''
+results_index_test.py: Checks the ResultsIndex series and chain breaks against the runs' saved data.
+
+Usage:
+    python results_index_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import argparse
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.agents.func_approx.dsc.RunLogClass import RunLog
+from simple_rl.agents.func_approx.dsc.ResultsIndexClass import ResultsIndex, load_indexed_runs
+
+def make_all_data(seed, num_episodes=5):
+    rng = np.random.RandomState(seed)
+    return {'args' : argparse.Namespace(seed=seed, pes_nu=0.5, experiment_name="exp"),
+            'mdp_env_name' : "point-maze",
+            'per_episode_scores' : rng.uniform(-100., 0., size=num_episodes).tolist(),
+            'episodic_durations' : rng.randint(1, 200, size=num_episodes).tolist(),
+            'validation_scores' : [-50., -20.],
+            'validation_episodes' : [2, 4],
+            'num_options_history' : [1, 1, 2, 2, 3][:num_episodes],
+            'temporal_full_chain_breaks' : {1 : 0, 3 : 2},
+            'full_chain_breaks' : {"option_1" : {1 : 0, 3 : 1}, "option_2" : {3 : 1}}}
+
+def save_pickles(data_dir, all_data):
+    os.makedirs(data_dir)
+    for var_name, data in all_data.items():
+        with open(os.path.join(data_dir, var_name + ".pkl"), "wb") as f:
+            pickle.dump(data, f)
+
+def save_run_log(data_dir, all_data):
+    # The way SkillChaining.save_episode_data splits a run: a header of empty values, then one delta per episode
+    run_log = RunLog(data_dir)
+    header = dict((var_name, type(data)()) if isinstance(data, (list, dict)) else (var_name, data) for var_name, data in all_data.items())
+    run_log.write_header(header)
+    for episode in range(len(all_data['per_episode_scores'])):
+        delta = {'per_episode_scores' : all_data['per_episode_scores'][episode:episode + 1],
+                 'episodic_durations' : all_data['episodic_durations'][episode:episode + 1],
+                 'num_options_history' : all_data['num_options_history'][episode:episode + 1],
+                 'full_chain_breaks' : {option_name : {episode : breaks[episode]} for option_name, breaks in all_data['full_chain_breaks'].items() if episode in breaks}}
+        if episode in all_data['temporal_full_chain_breaks']:
+            delta['temporal_full_chain_breaks'] = {episode : all_data['temporal_full_chain_breaks'][episode]}
+        run_log.append_episode(episode, delta)
+    run_log.write_final({'validation_scores' : all_data['validation_scores'], 'validation_episodes' : all_data['validation_episodes']})
+
+def test_series_and_chain_breaks():
+    root = tempfile.mkdtemp()
+    try:
+        run_dir = os.path.join(root, "exp")
+        expected = {0 : make_all_data(0), 1 : make_all_data(1)}
+        save_pickles(os.path.join(run_dir, "run_0_all_data"), expected[0])
+        save_run_log(os.path.join(run_dir, "run_1_all_data"), expected[1])
+
+        index, experiment, runs = load_indexed_runs(run_dir, 0, 1)
+        try:
+            assert experiment == "exp" and [run["seed"] for run in runs] == [0, 1]
+            assert [run["args"].seed for run in runs] == [0, 1] and runs[1]["env_name"] == "point-maze"
+            for var_name in ResultsIndex.SERIES:
+                series = index.get_series(experiment, var_name)
+                for seed in [0, 1]:
+                    assert np.array_equal(series[seed], expected[seed][var_name]), (var_name, seed)
+            for seed, (temporal, full) in enumerate(index.get_chain_breaks(experiment)):
+                assert temporal == expected[seed]['temporal_full_chain_breaks']
+                assert full == expected[seed]['full_chain_breaks']
+            assert runs[0]["final_score"] == expected[0]['per_episode_scores'][-1]
+        finally:
+            index.close()
+    finally:
+        shutil.rmtree(root)
+
+def test_reingest_only_changed_runs():
+    root = tempfile.mkdtemp()
+    try:
+        data_dir = os.path.join(root, "exp", "run_3_all_data")
+        all_data = make_all_data(3)
+        save_pickles(data_dir, all_data)
+        index = ResultsIndex(root)
+        try:
+            assert index.ingest_run(data_dir)
+            assert not index.ingest_run(data_dir)
+            assert index.ingest(os.path.join(root, "exp")) == 0
+
+            # A newer file of the run is picked up
+            all_data['per_episode_scores'].append(1.)
+            with open(os.path.join(data_dir, "per_episode_scores.pkl"), "wb") as f:
+                pickle.dump(all_data['per_episode_scores'], f)
+            stamp = ResultsIndex.source_stamp(data_dir) + 10 ** 9
+            os.utime(os.path.join(data_dir, "per_episode_scores.pkl"), ns=(stamp, stamp))
+            assert index.ingest_run(data_dir)
+            assert np.array_equal(index.get_series("exp", 'per_episode_scores')[0], all_data['per_episode_scores'])
+            assert not index.ingest_run(data_dir)
+        finally:
+            index.close()
+    finally:
+        shutil.rmtree(root)
+
+def test_missing_seed():
+    root = tempfile.mkdtemp()
+    try:
+        run_dir = os.path.join(root, "exp")
+        save_pickles(os.path.join(run_dir, "run_0_all_data"), make_all_data(0))
+        save_pickles(os.path.join(run_dir, "run_2_all_data"), make_all_data(2))
+        try:
+            load_indexed_runs(run_dir, 0, 2)
+            assert False, "seed 1 has no data"
+        except IOError as error:
+            assert "[1]" in str(error)
+    finally:
+        shutil.rmtree(root)
+
+def main():
+    tests = [test_series_and_chain_breaks, test_reingest_only_changed_runs, test_missing_seed]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+'''
+rmax_test.py: Checks RMaxAgent's cached Q-values against the recursive R-Max backup over its samples.
+
+Usage:
+    python rmax_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+from collections import Counter
+import os
+import random
+import sys
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.tasks import GridWorldMDP
+from simple_rl.tasks.grid_world.GridWorldStateClass import GridWorldState
+from simple_rl.agents.RMaxAgentClass import RMaxAgent
+
+def explore(agent, mdp, num_episodes=10, num_steps=30):
+    '''
+    Summary:
+        Feeds @agent the transitions of a random walk on @mdp.
+    '''
+    for episode in range(num_episodes):
+        mdp.reset()
+        state = mdp.get_init_state()
+        for step in range(num_steps):
+            action = random.choice(mdp.get_actions())
+            reward, next_state = mdp.execute_agent_action(action)
+            agent.update(state, action, reward, next_state)
+            state = next_state
+            if state.is_terminal():
+                break
+
+def recursive_q_value(agent, state, action, horizon):
+    # R-Max's backup, recursing over the samples of the known (s, a).
+    q_val = agent._get_reward(state, action)
+    if horizon <= 0 or state.is_terminal() or not agent.is_known(state, action):
+        return q_val
+    row = agent.state_index[state] * len(agent.actions) + agent.action_index[action]
+    next_states = Counter(agent.index_states[k] for r, k in zip(agent.transition_rows, agent.transition_cols) if r == row)
+    return q_val + agent.gamma * sum(count * max(recursive_q_value(agent, s_prime, a, horizon - 1) for a in agent.actions)
+                                     for s_prime, count in next_states.items()) / agent.s_a_threshold
+
+def test_q_matches_recursion():
+    random.seed(1)
+    for s_a_threshold in [1, 3]:
+        mdp = GridWorldMDP(4, 4, goal_locs=[(4, 4)], lava_locs=[(2, 3)], slip_prob=0.3)
+        agent = RMaxAgent(mdp.get_actions(), horizon=3, s_a_threshold=s_a_threshold)
+        explore(agent, mdp)
+        assert agent.get_num_known_sa() > 0
+        for s in agent.index_states:
+            for a in agent.actions:
+                assert abs(agent.get_q_value(s, a) - recursive_q_value(agent, s, a, agent.horizon)) < 1e-9, (s, a)
+                assert abs(agent.get_q_value(s, a, horizon=1) - recursive_q_value(agent, s, a, 1)) < 1e-9, (s, a)
+        # Known (s, a) keep exactly @s_a_threshold samples
+        assert len(agent.transition_rows) <= s_a_threshold * len(agent.index_states) * len(agent.actions)
+
+def test_replans_only_when_known():
+    random.seed(0)
+    mdp = GridWorldMDP(4, 4, goal_locs=[(4, 4)], slip_prob=0.2)
+    agent = RMaxAgent(mdp.get_actions(), s_a_threshold=2)
+    num_plans = [0]
+    compute_q_table = agent._compute_q_table
+    def counting_compute_q_table(horizon):
+        num_plans[0] += 1
+        return compute_q_table(horizon)
+    agent._compute_q_table = counting_compute_q_table
+    explore(agent, mdp)
+    assert num_plans[0] == agent.get_num_known_sa()
+
+    # An unseen state is worth rmax
+    assert agent.get_max_q_value(GridWorldState(9, 9)) == agent.rmax
+
+def test_reaches_goal():
+    random.seed(0)
+    mdp = GridWorldMDP(4, 4, goal_locs=[(4, 4)], slip_prob=0.0)
+    agent = RMaxAgent(mdp.get_actions(), horizon=6)
+    for episode in range(30):
+        mdp.reset()
+        state, reward = mdp.get_init_state(), 0
+        for step in range(50):
+            reward, state = mdp.execute_agent_action(agent.act(state, reward))
+            if state.is_terminal():
+                break
+        agent.act(state, reward)
+        agent.end_of_episode()
+    # Once the grid is known, the agent goes straight to the goal
+    assert state.is_terminal() and step + 1 == 6
+
+def main():
+    tests = [test_q_matches_recursion, test_replans_only_when_known, test_reaches_goal]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+'''
+run_log_test.py: Round trip of a SkillChaining run through RunLog's header, episode deltas and final file.
+
+Usage:
+    python run_log_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.agents.func_approx.dsc.RunLogClass import RunLog, merge_delta, load_run_variable
+
+NUM_EPISODES = 4
+
+def make_all_data():
+    ''' What SkillChaining.save_all_data pickles at the end of a run without trajectories. '''
+    return {'args' : argparse.Namespace(seed=0, pretrained=False),
+            'option_data' : {"option_1" : {episode : {'clfs_bounds' : {'Optimistic initiation set' : episode // 2}} for episode in range(1, NUM_EPISODES)},
+                             "option_2" : {3 : {'clfs_bounds' : {'Optimistic initiation set' : 2}}}},
+            'classifier_snapshots' : {0 : "snapshot 0", 1 : "snapshot 1", 2 : "snapshot 2"},
+            'x_mesh' : [[0., 1.]], 'y_mesh' : [[0., 1.]], 'x_mesh_hd' : [[0., .5, 1.]], 'y_mesh_hd' : [[0., .5, 1.]],
+            'experiment_name' : "exp",
+            'per_episode_scores' : [-40., -30., -12., -5.],
+            'mdp_env_name' : "point-maze",
+            'episodic_durations' : [40, 30, 12, 5],
+            'pretrained' : False,
+            'validation_scores' : [-20., -6.],
+            'validation_episodes' : [1, 3],
+            'num_options_history' : [1, 2, 2, 3],
+            'temporal_chain_breaks' : {3 : 1}, 'option_chain_breaks' : {3 : {"option_1" : 1}}, 'goal_chain_breaks' : {},
+            'final_skill_chain' : ["option_2", "option_1"],
+            'full_chain_breaks' : {"option_1" : {1 : 0, 3 : 1}},
+            'temporal_full_chain_breaks' : {1 : 0, 3 : 1},
+            'goal_xy' : [9., 9.], 'start_xy' : [0., 0.]}
+
+def make_header(all_data):
+    # As SkillChaining.save_episode_data: values fixed for the run, and empty ones filled by the deltas and final.pkl
+    header = dict(all_data)
+    for var_name, data in all_data.items():
+        if isinstance(data, (list, dict)) and var_name not in ('x_mesh', 'y_mesh', 'goal_xy', 'start_xy'):
+            header[var_name] = type(data)()
+    header['x_mesh_hd'] = header['y_mesh_hd'] = header['final_skill_chain'] = None
+    return header
+
+def make_delta(all_data, episode):
+    delta = {}
+    for var_name in ['per_episode_scores', 'episodic_durations', 'num_options_history']:
+        delta[var_name] = all_data[var_name][episode:episode + 1]
+    delta['option_data'] = dict((option_name, {episode : option[episode]}) for option_name, option in all_data['option_data'].items() if episode in option)
+    delta['classifier_snapshots'] = dict((version, snapshot) for version, snapshot in all_data['classifier_snapshots'].items() if version == episode - 1)
+    delta['full_chain_breaks'] = dict((option_name, {episode : breaks[episode]}) for option_name, breaks in all_data['full_chain_breaks'].items() if episode in breaks)
+    if episode in all_data['temporal_full_chain_breaks']:
+        delta['temporal_full_chain_breaks'] = {episode : all_data['temporal_full_chain_breaks'][episode]}
+    return delta
+
+def make_final(all_data):
+    return dict((var_name, all_data[var_name]) for var_name in ['x_mesh_hd', 'y_mesh_hd', 'temporal_chain_breaks', 'option_chain_breaks',
+                                                                'goal_chain_breaks', 'final_skill_chain', 'validation_scores', 'validation_episodes'])
+
+def test_merge_delta():
+    all_data = {'scores' : [1.], 'breaks' : {"option_1" : {0 : 1}}, 'chain' : None}
+    merge_delta(all_data, {'scores' : [2., 3.], 'breaks' : {"option_1" : {1 : 0}, "option_2" : {1 : 2}}, 'chain' : ["option_1"], 'new' : 4})
+    assert all_data == {'scores' : [1., 2., 3.], 'breaks' : {"option_1" : {0 : 1, 1 : 0}, "option_2" : {1 : 2}}, 'chain' : ["option_1"], 'new' : 4}
+
+def test_round_trip_with_resume():
+    data_dir = tempfile.mkdtemp()
+    try:
+        expected = make_all_data()
+        run_log = RunLog(data_dir)
+        run_log.write_header(make_header(expected))
+        for episode in range(NUM_EPISODES):
+            if episode == 2:
+                # The run was killed during episode 3 after writing it, and resumed from its checkpoint at episode 2:
+                # the episodes after the checkpoint are written again
+                stale_delta = make_delta(expected, 2)
+                stale_delta['per_episode_scores'] = [-99.]
+                run_log.append_episode(2, stale_delta)
+                run_log.append_episode(3, make_delta(expected, 3))
+            run_log.append_episode(episode, make_delta(expected, episode))
+        run_log.write_final(make_final(expected))
+
+        assert RunLog.exists(data_dir)
+        all_data = RunLog.load(data_dir)
+        trajectory_data = all_data.pop('trajectory_data')
+        assert all(len(column) == 0 for column in trajectory_data.values())
+        assert all_data == expected
+
+        # The plotting fallback reads single variables from the log
+        assert load_run_variable(data_dir, 'per_episode_scores') == expected['per_episode_scores']
+        cache = {}
+        assert load_run_variable(data_dir, 'option_data', cache) == expected['option_data'] and data_dir in cache
+    finally:
+        shutil.rmtree(data_dir)
+
+def main():
+    tests = [test_merge_delta, test_round_trip_with_resume]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
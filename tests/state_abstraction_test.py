@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+'''
+state_abstraction_test.py: Checks the vectorized clustering of sa_helpers against per pair indicator calls.
+
+Usage:
+    python state_abstraction_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import sys
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.mdp import State, MDPDistribution
+from simple_rl.tasks import GridWorldMDP
+from simple_rl.planning.ValueIterationClass import ValueIteration
+from simple_rl.abstraction.state_abs import sa_helpers, indicator_funcs as ind_funcs
+
+def make_vi():
+    mdp = GridWorldMDP(6, 6, goal_locs=[(6, 6)], lava_locs=[(3, 4)], slip_prob=0.1)
+    vi = ValueIteration(mdp, backend="dict")
+    vi.run_vi()
+    return vi
+
+def test_vectorized_matches_pairwise():
+    vi = make_vi()
+    states, q_matrix = sa_helpers.get_q_matrix(vi)
+    for indic_func, features_func in ind_funcs.VECTORIZED_INDICATORS.items():
+        for epsilon in [0.0, 0.01, 0.05, 0.3]:
+            features, tolerance = features_func(q_matrix, epsilon=epsilon)
+            clusters = sa_helpers._cluster_features(features, tolerance)
+            expected_clusters = sa_helpers._cluster_pairwise(states, indic_func, vi, vi.actions, epsilon)
+            assert np.array_equal(clusters, expected_clusters), (indic_func.__name__, epsilon)
+
+def test_q_matrix_of_backends():
+    vi, sparse_vi = make_vi(), ValueIteration(make_vi().mdp)
+    sparse_vi.run_vi()
+    states, q_matrix = sa_helpers.get_q_matrix(vi)
+    sparse_states, sparse_q_matrix = sa_helpers.get_q_matrix(sparse_vi)
+    assert set(states) == set(sparse_states)
+    rows = dict(zip(sparse_states, sparse_q_matrix))
+    for s, q_vals in zip(states, q_matrix):
+        assert np.allclose(q_vals, rows[s], atol=1e-3), s
+
+def test_multitask_sa():
+    mdps = [GridWorldMDP(5, 5, goal_locs=[goal], slip_prob=0.0) for goal in [(5, 5), (1, 5)]]
+    mdp_distr = MDPDistribution(dict((mdp, 0.5) for mdp in mdps))
+    sa = sa_helpers.make_sa(mdp_distr, epsilon=0.0)
+    parallel_sa = sa_helpers.make_sa(mdp_distr, epsilon=0.0, num_workers=2)
+    assert sa._phi == parallel_sa._phi
+    assert 1 < sa.get_num_abstr_states() < sa.get_num_ground_states()
+
+    # Q*-equivalent states share their abstract state
+    sa = sa_helpers.make_singletask_sa(mdps[0], ind_funcs._q_eps_approx_indicator, State)
+    vi = ValueIteration(mdps[0])
+    vi.run_vi()
+    for s in sa.get_ground_states():
+        for s_prime in sa.get_ground_states():
+            same_q = all(vi.get_q_value(s, a) == vi.get_q_value(s_prime, a) for a in vi.actions)
+            assert (sa.phi(s) == sa.phi(s_prime)) == same_q, (s, s_prime)
+
+def main():
+    tests = [test_vectorized_matches_pairwise, test_q_matrix_of_backends, test_multitask_sa]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+'''
+sweep_test.py: Checks the commands and scheduling of sweep.py, with a stand-in for SkillChainingAgentClass.py.
+
+Usage:
+    python sweep_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+import sweep
+
+# Stand-in run: records its arguments, fails its first attempt when --fail_once=True, needs --device like SkillChaining.
+FAKE_RUN = '''
+import os, sys
+args = dict(arg[2:].split("=", 1) for arg in sys.argv[1:])
+assert args["device"] not in ("", "None")
+record = os.path.join("runs", args["experiment_name"], "attempts_{}.txt".format(args["seed"]))
+with open(record, "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+with open(record) as f:
+    num_attempts = len(f.readlines())
+sys.exit(1 if args.get("fail_once") == "True" and num_attempts == 1 else 0)
+'''
+
+def test_make_command():
+    run = {"experiment_name": "exp_nu_0.1", "seed": 3, "config": {"nu": "0.1"}}
+    command = sweep.make_command(run, "cuda:1", ["--episodes=5"], resume=False)
+    assert command[2] == sweep.SCRIPT
+    assert command[3:] == ["--experiment_name=exp_nu_0.1", "--seed=3", "--num_run=3", "--device=cuda:1", "--nu=0.1", "--episodes=5"]
+    assert sweep.make_command(run, "cpu", [], resume=True)[-1] == "--resume=True"
+
+def test_make_runs():
+    runs = sweep.make_runs("exp", sweep.parse_grid(["a=1,2", "--b=x"]), sweep.parse_seeds(["0-1", "5"]))
+    assert [(run["experiment_name"], run["seed"]) for run in runs] == \
+        [("exp_a_1_b_x", 0), ("exp_a_1_b_x", 1), ("exp_a_1_b_x", 5), ("exp_a_2_b_x", 0), ("exp_a_2_b_x", 1), ("exp_a_2_b_x", 5)]
+
+def test_sweep_schedules_retries_and_skips():
+    cwd, tmp_dir, script = os.getcwd(), tempfile.mkdtemp(), sweep.SCRIPT
+    try:
+        os.chdir(tmp_dir)
+        sweep.SCRIPT = os.path.join(tmp_dir, "fake_run.py")
+        with open(sweep.SCRIPT, "w") as f:
+            f.write(FAKE_RUN)
+
+        runs = sweep.make_runs("exp", sweep.parse_grid(["fail_once=False,True"]), [0, 1])
+        manifest_file = os.path.join("runs", "exp_manifest.json")
+        counts = sweep.Sweep(runs, manifest_file, num_workers=2, threads_per_run=1, devices=["cpu"], extra_args=[], retries=1).run()
+        assert counts == {"completed": 4}
+
+        with open(manifest_file) as f:
+            manifest = {(entry["experiment_name"], entry["seed"]): entry for entry in json.load(f)["runs"]}
+        for run in runs:
+            entry = manifest[(run["experiment_name"], run["seed"])]
+            assert entry["status"] == "completed" and entry["device"] == "cpu"
+            assert entry["attempts"] == (2 if run["config"]["fail_once"] == "True" else 1)
+            assert os.path.exists(sweep.done_marker(run))
+
+        # Completed runs are not launched again
+        counts = sweep.Sweep(runs, manifest_file, num_workers=2, threads_per_run=1, devices=["cpu"], extra_args=[], retries=1).run()
+        assert counts == {}
+        with open(os.path.join("runs", "exp_fail_once_False", "attempts_0.txt")) as f:
+            assert len(f.readlines()) == 1
+    finally:
+        sweep.SCRIPT = script
+        os.chdir(cwd)
+        shutil.rmtree(tmp_dir)
+
+def main():
+    tests = [test_make_command, test_make_runs, test_sweep_schedules_retries_and_skips]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
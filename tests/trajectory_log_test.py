@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+'''
+trajectory_log_test.py: Round trip of TrajectoryRecorder through its streamed episode files.
+
+Usage:
+    python trajectory_log_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.agents.func_approx.dsc.TrajectoryLogClass import TrajectoryRecorder, load_trajectories
+
+def record_run(recorder, num_episodes=3):
+    rng = np.random.RandomState(0)
+    for episode in range(num_episodes):
+        step = 0
+        for option_idx, name in [(0, "global_option"), (episode + 1, "option_{}".format(episode + 1)), (0, "global_option")]:
+            # Enough rows to grow the columns past their initial capacity
+            positions = rng.uniform(-2., 10., size=(7, 2))
+            recorder.record(episode, step, option_idx, name, positions)
+            step += len(positions)
+        recorder.end_episode(episode)
+
+def test_round_trip():
+    out_dir = tempfile.mkdtemp()
+    try:
+        in_memory = TrajectoryRecorder(initial_capacity=4)
+        streamed = TrajectoryRecorder(out_dir=out_dir, initial_capacity=4)
+        record_run(in_memory)
+        record_run(streamed)
+
+        # Streamed episodes are released from memory once written
+        assert len(streamed) == 0 and len(in_memory) == 3 * 3 * 7
+
+        expected, loaded = in_memory.as_arrays(), load_trajectories(out_dir)
+        assert sorted(loaded) == sorted(expected)
+        for column, dtype in TrajectoryRecorder.COLUMNS:
+            assert loaded[column].dtype == dtype and np.array_equal(loaded[column], expected[column]), column
+        assert list(loaded["names"]) == ["global_option", "option_1", "option_2", "option_3"]
+
+        episode_1 = in_memory.as_arrays(episode=1)
+        assert set(episode_1["episode"]) == {1} and list(episode_1["step"]) == list(range(21))
+    finally:
+        shutil.rmtree(out_dir)
+
+def test_empty_run():
+    out_dir = tempfile.mkdtemp()
+    try:
+        for trajectory_dir in (out_dir, os.path.join(out_dir, "missing")):
+            loaded = load_trajectories(trajectory_dir)
+            expected = TrajectoryRecorder().as_arrays()
+            assert sorted(loaded) == sorted(expected)
+            for column, dtype in TrajectoryRecorder.COLUMNS:
+                assert loaded[column].dtype == dtype and len(loaded[column]) == 0
+            assert len(loaded["names"]) == 0
+    finally:
+        shutil.rmtree(out_dir)
+
+def main():
+    tests = [test_round_trip, test_empty_run]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
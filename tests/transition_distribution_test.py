@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+'''
+transition_distribution_test.py: Checks MDP.transition_distribution against the sampled transition functions.
+
+Usage:
+    python transition_distribution_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+from collections import Counter
+import os
+import random
+import sys
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.tasks import GridWorldMDP, TaxiOOMDP, ChainMDP, ComboLockMDP, HanoiMDP
+from simple_rl.tasks.maze_1d.Maze1DPOMDPClass import Maze1DPOMDP
+from simple_rl.tasks.puddle.PuddleMDPClass import PuddleMDP
+from simple_rl.planning.ValueIterationClass import ValueIteration
+
+def make_mdps():
+    taxi_passengers = [{"x":4, "y":3, "dest_x":2, "dest_y":2, "in_taxi":0}]
+    return [GridWorldMDP(5, 4, goal_locs=[(5, 4)], lava_locs=[(3, 2)], walls=[(2, 2)], slip_prob=0.3),
+            TaxiOOMDP(4, 4, agent={"x":1, "y":1, "has_passenger":0}, walls=[], passengers=taxi_passengers, slip_prob=0.2),
+            ChainMDP(5),
+            ComboLockMDP([2, 1, 3], num_actions=3),
+            HanoiMDP(num_pegs=3, num_discs=2),
+            Maze1DPOMDP()]
+
+def test_matches_sampled_transitions():
+    random.seed(0)
+    num_samples = 2000
+    for mdp in make_mdps():
+        assert mdp.has_transition_distribution(), mdp
+        vi = ValueIteration(mdp, sample_rate=1)
+        states = vi.get_states()
+        for s in states[:6]:
+            distributions = mdp.batched_transition_distribution([s], mdp.get_actions())[0]
+            for a, distribution in zip(mdp.get_actions(), distributions):
+                assert abs(sum(prob for _, prob in distribution) - 1.) < 1e-9, (mdp, s, a)
+                assert len(set(s_prime for s_prime, _ in distribution)) == len(distribution), (mdp, s, a)
+                counts = Counter(mdp.get_transition_func()(s, a) for _ in range(num_samples))
+                assert set(counts) == set(s_prime for s_prime, _ in distribution), (mdp, s, a)
+                for s_prime, prob in distribution:
+                    assert abs(counts[s_prime] / float(num_samples) - prob) < 0.05, (mdp, s, a, s_prime)
+
+def test_planners_are_deterministic():
+    mdp = make_mdps()[0]
+    vi_values = []
+    for seed in range(3):
+        random.seed(seed)
+        vi = ValueIteration(mdp, sample_rate=1)
+        vi.run_vi()
+        vi_values.append([vi.get_value(s) for s in vi.get_states()])
+        for s in vi.get_states():
+            for a in vi.actions:
+                assert dict(vi.trans_dict[s][a]) == dict(mdp.transition_distribution(s, a)), (s, a)
+    assert vi_values[0] == vi_values[1] == vi_values[2]
+
+    # Both backends build the same exact model
+    expected_vi = ValueIteration(mdp, sample_rate=1, backend="dict")
+    expected_vi.run_vi()
+    for s in expected_vi.get_states():
+        assert abs(expected_vi.get_value(s) - vi.get_value(s)) < 1e-3, s
+
+def test_falls_back_to_sampling():
+    mdp = PuddleMDP()
+    assert not mdp.has_transition_distribution()
+    vi = ValueIteration(mdp, sample_rate=2)
+    assert not vi.exact_transitions
+    s = mdp.get_init_state()
+    assert len(vi._get_outcomes(s, mdp.get_actions()[0])) == 2
+
+def main():
+    tests = [test_matches_sampled_transitions, test_planners_are_deterministic, test_falls_back_to_sampling]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()
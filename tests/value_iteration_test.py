@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+'''
+value_iteration_test.py: Checks the sparse ValueIteration backend against the per-state Python one.
+
+Usage:
+    python value_iteration_test.py    (or through pytest)
+'''
+
+# Python imports.
+from __future__ import print_function
+import os
+import random
+import sys
+
+# Other imports.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from simple_rl.tasks import GridWorldMDP, TaxiOOMDP, ChainMDP, FourRoomMDP
+from simple_rl.planning.ValueIterationClass import ValueIteration
+
+def make_mdps():
+    taxi_passengers = [{"x":4, "y":3, "dest_x":2, "dest_y":2, "in_taxi":0}]
+    return [GridWorldMDP(8, 6, goal_locs=[(8, 6)], lava_locs=[(4, 2)], walls=[(3, 3), (3, 4)], slip_prob=0.0),
+            FourRoomMDP(9, 9, goal_locs=[(9, 9)]),
+            ChainMDP(8),
+            TaxiOOMDP(4, 4, agent={"x":1, "y":1, "has_passenger":0}, walls=[], passengers=taxi_passengers)]
+
+def assert_same_solution(vi, expected_vi, tolerance):
+    assert set(vi.get_states()) == set(expected_vi.get_states())
+    for s in expected_vi.get_states():
+        assert abs(vi.get_value(s) - expected_vi.get_value(s)) < tolerance, s
+        q_vals = [expected_vi.get_q_value(s, a) for a in expected_vi.actions]
+        for a, q_val in zip(vi.actions, q_vals):
+            assert abs(vi.get_q_value(s, a) - q_val) < tolerance, (s, a)
+        # Same greedy action, unless another one is within the tolerance
+        best_q_val = expected_vi.get_q_value(s, vi.policy(s))
+        assert best_q_val > max(q_vals) - 2 * tolerance, s
+
+def test_deterministic_mdps_match():
+    for mdp in make_mdps():
+        expected_vi = ValueIteration(mdp, backend="dict")
+        expected_iters, expected_val = expected_vi.run_vi()
+        for sweep in ValueIteration.SWEEPS:
+            vi = ValueIteration(mdp, sweep=sweep, block_size=5)
+            iters, val = vi.run_vi()
+            assert abs(val - expected_val) < 1e-2 and iters <= vi.max_iterations, (mdp, sweep)
+            assert_same_solution(vi, expected_vi, 1e-2)
+
+def test_stochastic_model_matches():
+    mdp = GridWorldMDP(7, 7, goal_locs=[(7, 7)], lava_locs=[(5, 5)], slip_prob=0.2)
+    random.seed(0)
+    vi = ValueIteration(mdp, delta=1e-9, max_iterations=5000, sample_rate=10)
+    vi.run_vi()
+
+    # The Python backups on the same sampled model
+    expected_vi = ValueIteration(mdp, delta=1e-9, max_iterations=5000, backend="dict")
+    expected_vi.trans_dict = vi.trans_dict
+    expected_vi.states = set(vi.get_states())
+    expected_vi.reachability_done = expected_vi.has_computed_matrix = True
+    expected_vi.run_vi()
+
+    assert_same_solution(vi, expected_vi, 1e-6)
+    for s in vi.get_states():
+        i = vi.state_index[s]
+        for a in vi.actions:
+            assert abs(vi.trans_matrices[vi.action_index[a]][i].sum() - 1.) < 1e-9
+            assert vi.reward_matrix[i, vi.action_index[a]] == mdp.get_reward_func()(s, a)
+
+def test_async_backs_up_fewer_states():
+    mdp = GridWorldMDP(15, 15, goal_locs=[(15, 15)], slip_prob=0.0)
+    jacobi_vi = ValueIteration(mdp, delta=1e-6)
+    async_vi = ValueIteration(mdp, delta=1e-6, sweep="async")
+    jacobi_vi.run_vi()
+    async_vi.run_vi()
+    assert async_vi.get_num_backups_in_recent_run() < jacobi_vi.get_num_backups_in_recent_run() / 2
+    assert_same_solution(async_vi, jacobi_vi, 1e-4)
+
+def test_plan():
+    mdp = GridWorldMDP(8, 6, goal_locs=[(8, 6)], walls=[(3, 3), (3, 4)], slip_prob=0.0)
+    vi = ValueIteration(mdp)
+    vi.run_vi()
+    action_seq, state_seq = vi.plan()
+    assert state_seq[-1].is_terminal() and len(action_seq) == (8 - 1) + (6 - 1)
+    assert abs(vi.value_func[state_seq[0]] - vi.get_value(state_seq[0])) < vi.delta
+    assert vi.policy(state_seq[0]) in vi.get_max_q_actions(state_seq[0])
+
+def main():
+    tests = [test_deterministic_mdps_match, test_stochastic_model_matches, test_async_backs_up_fewer_states, test_plan]
+    for test in tests:
+        test()
+        print("\t", test.__name__, "PASS")
+    print("\nResults:", len(tests), "/", len(tests), "passed.")
+
+if __name__ == "__main__":
+    main()